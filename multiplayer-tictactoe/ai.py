@@ -0,0 +1,47 @@
+"""Computer opponent with adjustable difficulty.
+
+The AI looks every move up in the solved tablebase, so it plays perfectly
+unless told otherwise. Lower difficulties make a deliberate mistake at a
+fixed rate: instead of a best move they play one that scores worse, when
+there is one.
+"""
+import random
+
+from game_state import SIZE
+from tablebase import get_tablebase
+
+# chance of playing a sub-optimal move, per difficulty
+DIFFICULTIES = {
+    "easy": 0.5,
+    "medium": 0.25,
+    "hard": 0.1,
+    "perfect": 0.0,
+}
+
+
+class AIPlayer:
+    """Picks moves for one side from the tablebase"""
+
+    def __init__(self, symbol="O", difficulty="perfect", tablebase=None, rng=None):
+        if difficulty not in DIFFICULTIES:
+            raise ValueError(f"unknown difficulty {difficulty!r}, expected one of {list(DIFFICULTIES)}")
+        self.symbol = symbol
+        self.difficulty = difficulty
+        self.mistake_rate = DIFFICULTIES[difficulty]
+        self.tablebase = tablebase or get_tablebase()
+        self.rng = rng or random.Random()
+
+    def choose_cell(self, state):
+        """Bit index of the cell to play in state"""
+        if self.mistake_rate and self.rng.random() < self.mistake_rate:
+            values = self.tablebase.move_values(state)
+            top = max(values.values())
+            worse = [cell for cell, value in values.items() if value < top]
+            if worse:
+                return self.rng.choice(worse)
+        return self.rng.choice(self.tablebase.best_moves(state))
+
+    def choose_move(self, state):
+        """(x, y) of the cell to play in state"""
+        cell = self.choose_cell(state)
+        return cell % SIZE, cell // SIZE
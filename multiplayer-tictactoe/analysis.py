@@ -0,0 +1,250 @@
+"""Offline analysis of 3x3 positions and games, streamed through a process pool.
+
+Reads one position or game per line and writes one JSON result per line,
+in the same order. A line is either:
+
+* a move sequence: the cells played, X first, as base-9 digits, so
+  ``40812`` is X in the centre, O top-left, X bottom-right and so on
+  (cell y * 3 + x, as in GameState);
+* a JSON object with ``moves`` (that digit string, a list of cells or a
+  list of [x, y] pairs), ``board`` (a snapshot's 3x3 rows) or ``x_mask`` and
+  ``o_mask``. An ``id`` field is copied to the result.
+
+Every position is looked up in the tablebase, so the rules are GameState's,
+the same ones singleplayer/board.Board plays by. A position gets the side
+to move, its value for that side (1, 0 or -1) and the best moves. A game
+also gets its result and every blunder: a move after which the mover's
+value is lower than it was before, such as letting a won game slip into a
+draw.
+
+Input is read in chunks of lines, and each chunk is analysed in a worker
+process. Only a few chunks per worker are in flight at once, and results
+are written as soon as the oldest chunk is done, so memory use stays the
+same however long the input is.
+
+    python analysis.py games.txt -o analysis.jsonl
+    zcat archive.txt.gz | python analysis.py --workers 8 > analysis.jsonl
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from game_state import CELLS, FULL_MASK, POPCOUNT, SIZE, WINNING_LINE, GameState
+from tablebase import O_DIGITS, UNREACHABLE, X_DIGITS, Tablebase
+
+DEFAULT_CHUNK_SIZE = 2000
+# chunks in flight per worker: enough to keep every worker busy while the
+# oldest chunk's results are being written
+CHUNKS_PER_WORKER = 2
+
+POSITIONS = tuple([cell % SIZE, cell // SIZE] for cell in range(CELLS))
+DIGITS = {str(cell): cell for cell in range(CELLS)}
+
+# each worker's own flat tablebase; a mapped file only holds canonical
+# positions, and the flat table is two list reads per lookup
+_table = None
+
+
+class AnalysisError(ValueError):
+    """A line that is not a valid position or game"""
+
+
+def parse_cells(moves):
+    """Cells of a move list given as a digit string, cells or [x, y] pairs"""
+    if isinstance(moves, str):
+        try:
+            return [DIGITS[digit] for digit in moves]
+        except KeyError as e:
+            raise AnalysisError(f"bad move {e.args[0]!r}, expected a digit 0-8") from None
+    if not isinstance(moves, list):
+        raise AnalysisError("moves must be a digit string or a list")
+    cells = []
+    for move in moves:
+        if isinstance(move, int) and 0 <= move < CELLS:
+            cells.append(move)
+        elif isinstance(move, list) and len(move) == 2 and all(isinstance(n, int) and 0 <= n < SIZE for n in move):
+            cells.append(move[1] * SIZE + move[0])
+        else:
+            raise AnalysisError(f"bad move {move!r}")
+    return cells
+
+
+def parse_line(line):
+    """(record, cells, x_mask, o_mask): cells is None for a single position"""
+    if not line.startswith("{"):
+        return {}, parse_cells(line), 0, 0
+    try:
+        data = json.loads(line)
+    except ValueError as e:
+        raise AnalysisError(f"bad JSON: {e}") from None
+    if not isinstance(data, dict):
+        raise AnalysisError("expected a JSON object")
+    record = {"id": data["id"]} if "id" in data else {}
+    if "moves" in data:
+        return record, parse_cells(data["moves"]), 0, 0
+    if "board" in data:
+        rows = data["board"]
+        if not (isinstance(rows, list) and len(rows) == SIZE
+                and all(isinstance(row, list) and len(row) == SIZE for row in rows)):
+            raise AnalysisError("board must be 3 rows of 3 cells")
+        if any(cell not in ("X", "O", "") for row in rows for cell in row):
+            raise AnalysisError('board cells must be "X", "O" or ""')
+        state = GameState.from_rows(rows)
+        return record, None, state.x_mask, state.o_mask
+    if "x_mask" in data and "o_mask" in data:
+        x_mask, o_mask = data["x_mask"], data["o_mask"]
+        if not (isinstance(x_mask, int) and isinstance(o_mask, int)
+                and 0 <= x_mask <= FULL_MASK and 0 <= o_mask <= FULL_MASK) or x_mask & o_mask:
+            raise AnalysisError("x_mask and o_mask must be disjoint 9-bit masks")
+        return record, None, x_mask, o_mask
+    raise AnalysisError("expected moves, board or x_mask and o_mask")
+
+
+def describe(record, x_mask, o_mask, values, best):
+    """Fill in record for the position, which must be reachable"""
+    if WINNING_LINE[x_mask]:
+        record["result"] = "X"
+    elif WINNING_LINE[o_mask]:
+        record["result"] = "O"
+    elif x_mask | o_mask == FULL_MASK:
+        record["result"] = "draw"
+    else:
+        index = X_DIGITS[x_mask] + O_DIGITS[o_mask]
+        record["to_move"] = "X" if POPCOUNT[x_mask] == POPCOUNT[o_mask] else "O"
+        record["value"] = values[index] - 1
+        moves = best[index]
+        record["best"] = [POSITIONS[cell] for cell in range(CELLS) if moves >> cell & 1]
+    return record
+
+
+def analyse_game(record, cells, values, best):
+    """Play cells out from the empty board, noting every blunder"""
+    x_mask = o_mask = 0
+    blunders = []
+    for ply, cell in enumerate(cells):
+        bit = 1 << cell
+        if (x_mask | o_mask) & bit:
+            raise AnalysisError(f"move {ply + 1} is on a taken cell")
+        if WINNING_LINE[x_mask] or WINNING_LINE[o_mask]:
+            raise AnalysisError(f"move {ply + 1} is after the game ended")
+        before = values[X_DIGITS[x_mask] + O_DIGITS[o_mask]] - 1
+        if ply & 1:
+            o_mask |= bit
+        else:
+            x_mask |= bit
+        # the opponent's value in the new position, turned round
+        after = 1 - values[X_DIGITS[x_mask] + O_DIGITS[o_mask]]
+        if after < before:
+            blunders.append({"ply": ply + 1, "move": POSITIONS[cell], "value_before": before, "value_after": after})
+    record["plies"] = len(cells)
+    describe(record, x_mask, o_mask, values, best)
+    record["blunders"] = blunders
+    return len(cells) + 1
+
+
+def analyse_chunk(lines, first_line):
+    """(output text, positions looked up, blunders, bad lines) for a chunk; runs in a pool worker"""
+    global _table
+    if _table is None:
+        _table = Tablebase.build()
+    values, best = _table.values, _table.best
+    out = []
+    positions = blunders = errors = 0
+    for number, line in enumerate(lines, first_line):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record, cells, x_mask, o_mask = parse_line(line)
+            record["line"] = number
+            if cells is None:
+                if values[X_DIGITS[x_mask] + O_DIGITS[o_mask]] == UNREACHABLE:
+                    raise AnalysisError("position can't come up in a game")
+                describe(record, x_mask, o_mask, values, best)
+                positions += 1
+            else:
+                positions += analyse_game(record, cells, values, best)
+                blunders += len(record["blunders"])
+        except AnalysisError as e:
+            record = {"line": number, "error": str(e)}
+            errors += 1
+        out.append(json.dumps(record, separators=(",", ":")))
+    out.append("")
+    return "\n".join(out), positions, blunders, errors
+
+
+def chunked(lines, chunk_size):
+    """(first line number, list of lines) pairs"""
+    lines = iter(lines)
+    first = 1
+    while True:
+        chunk = list(islice(lines, chunk_size))
+        if not chunk:
+            return
+        yield first, chunk
+        first += len(chunk)
+
+
+def analyse_stream(lines, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Results of analyse_chunk for each chunk of lines, in input order.
+
+    workers=0 analyses in this process; otherwise a pool of that many
+    workers (default: one per CPU) is used, with at most CHUNKS_PER_WORKER
+    chunks per worker waiting at any time.
+    """
+    chunks = chunked(lines, chunk_size)
+    if workers == 0:
+        for first, chunk in chunks:
+            yield analyse_chunk(chunk, first)
+        return
+    workers = workers or os.cpu_count() or 1
+    # spawned workers start clean, as in BotPool; each one solves its own
+    # tablebase on its first chunk
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        pending = deque()
+        for first, chunk in chunks:
+            if len(pending) >= workers * CHUNKS_PER_WORKER:
+                yield pending.popleft().result()
+            pending.append(executor.submit(analyse_chunk, chunk, first))
+        while pending:
+            yield pending.popleft().result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse 3x3 positions and games, one per line, as JSON lines")
+    parser.add_argument("input", nargs="?", default="-", help="file to read, or - for stdin (the default)")
+    parser.add_argument("-o", "--output", default="-", help="file to write, or - for stdout (the default)")
+    parser.add_argument("--workers", type=int, help="worker processes, 0 to analyse in this process "
+                                                    "(default: one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="lines per worker task")
+    args = parser.parse_args()
+
+    source = sys.stdin if args.input == "-" else open(args.input)
+    sink = sys.stdout if args.output == "-" else open(args.output, "w")
+    start = time.perf_counter()
+    lines = positions = blunders = errors = 0
+    try:
+        for text, chunk_positions, chunk_blunders, chunk_errors in analyse_stream(source, args.workers, args.chunk_size):
+            sink.write(text)
+            lines += text.count("\n")
+            positions += chunk_positions
+            blunders += chunk_blunders
+            errors += chunk_errors
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    elapsed = time.perf_counter() - start
+    print(f"{lines} lines, {positions} positions, {blunders} blunders, {errors} bad lines "
+          f"in {elapsed:.2f}s ({positions / elapsed * 60 if elapsed else 0:,.0f} positions/min)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+import asyncio
+import os
+import socket
+import sys
+
+from ai import DIFFICULTIES
+from bots import DEFAULT_DIFFICULTY, DEFAULT_THINK_DELAY, BotPool, BotSeat
+from codec import JSON, choose_codec
+from game_archive import ArchiveWriter
+from grid_state import board_kind
+from heartbeat import DEFAULT_PING_INTERVAL, DEFAULT_PING_TIMEOUT, DEFAULT_TICK, HEARTBEAT_TYPES, PONG, Heartbeats
+from hints import get_hint_service
+from lobby import Lobby
+from match_log import DEFAULT_FSYNC_INTERVAL, DEFAULT_RESTORE_TIMEOUT, MatchLog, recover
+from outbound import DEFAULT_LIMIT, DISCONNECT, POLICIES, SNAPSHOT, OutboundQueue
+from protocol import FrameDecoder, ProtocolError, decode_message, encode_message
+from room import DEFAULT_GRACE_PERIOD, Room, room_of_token
+
+
+class ClientConnection:
+    """One socket served by the event loop.
+
+    Messages go into a bounded outbox; the connection's writer task sends
+    everything queued by one handler call in a single write.
+    """
+
+    def __init__(self, reader, writer, queue_limit=DEFAULT_LIMIT, policy=SNAPSHOT):
+        self.reader = reader
+        self.writer = writer
+        self.address = writer.get_extra_info("peername")
+        self.room = None
+        self.codec = JSON
+        self.outbox = OutboundQueue(queue_limit, policy)
+        self.ready = asyncio.Event()
+        self.closing = False
+        # loop time of the last data received, for heartbeats
+        self.last_seen = 0.0
+        self.write_task = asyncio.ensure_future(self.write_loop())
+
+    def send(self, message):
+        """Queue a message for the writer task; never blocks the loop"""
+        if self.closing:
+            return
+        self.send_frame(encode_message(message, self.codec))
+
+    def send_frame(self, frame):
+        """Queue a frame that is already encoded in this connection's codec"""
+        if self.closing:
+            return
+        if not self.outbox.push(frame):
+            self.fall_behind()
+        self.ready.set()
+
+    def fall_behind(self):
+        """Apply the slow client policy once the outbox is full"""
+        policy = self.outbox.policy
+        if policy == DISCONNECT:
+            self.abort()
+        elif policy == SNAPSHOT and self.room is not None:
+            # the room's current state supersedes everything still queued
+            self.outbox.replace(encode_message(self.room.snapshot(), self.codec))
+        # DROP: the frame is simply not queued
+
+    async def write_loop(self):
+        """Flush the outbox whenever something is queued"""
+        try:
+            while True:
+                await self.ready.wait()
+                self.ready.clear()
+                if self.outbox:
+                    self.writer.write(self.outbox.drain())
+                    await self.writer.drain()
+                if self.closing and not self.outbox:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.writer.close()
+
+    def negotiate(self, data):
+        """Switch to the best codec both sides know; the welcome names it"""
+        self.codec = choose_codec(data.get("codecs", []))
+
+    def close(self):
+        """Send whatever is still queued, then close"""
+        self.closing = True
+        self.ready.set()
+
+    def abort(self):
+        """Close at once, discarding the backlog"""
+        self.closing = True
+        self.outbox.frames.clear()
+        self.writer.transport.abort()
+        self.ready.set()
+
+
+class AsyncTicTacToeServer:
+    """Multi-room server: a single event loop multiplexes every connection"""
+
+    def __init__(self, host='0.0.0.0', port=5555, max_rooms=None, backlog=1024,
+                 queue_limit=DEFAULT_LIMIT, slow_client_policy=SNAPSHOT, rating_window=None,
+                 bot_workers=None, think_delay=DEFAULT_THINK_DELAY, match_log=None,
+                 fsync_interval=DEFAULT_FSYNC_INTERVAL, archive=None, grace_period=DEFAULT_GRACE_PERIOD,
+                 ping_interval=DEFAULT_PING_INTERVAL, ping_timeout=DEFAULT_PING_TIMEOUT,
+                 restore_timeout=DEFAULT_RESTORE_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.max_rooms = max_rooms
+        self.backlog = backlog
+        # how far a client may fall behind, and what happens when it does
+        if slow_client_policy not in POLICIES:
+            raise ValueError(f"unknown slow client policy {slow_client_policy!r}")
+        self.queue_limit = queue_limit
+        self.slow_client_policy = slow_client_policy
+        self.rooms = {}
+        # players waiting for an opponent, per game mode
+        self.lobby = Lobby(rating_window=rating_window)
+        self.next_room_id = 1
+        # bot moves are worked out in worker processes, off the event loop
+        self.bot_workers = bot_workers
+        self.think_delay = think_delay
+        self.bot_pool = None
+        # how long a dropped player's seat waits for them to resume
+        self.grace_period = grace_period
+        # silent connections are pinged, then closed; None turns this off
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.heartbeats = None
+        # rooms that were open when the server last stopped come back from
+        # the log, and hold their seats for restore_timeout for their players to resume
+        self.restore_timeout = restore_timeout
+        self.match_log = None
+        if match_log is not None:
+            self.rooms, last_room_id = recover(match_log)
+            self.next_room_id = last_room_id + 1
+            self.match_log = MatchLog(match_log, fsync_interval)
+            for room in self.rooms.values():
+                room.log = self.match_log
+        # finished 3x3 games are appended here
+        self.archive = ArchiveWriter(archive) if archive is not None else None
+        for room in self.rooms.values():
+            room.archive = self.archive
+            room.grace_period = grace_period
+            room.schedule = self.schedule
+        self.loop = None
+        self.server = None
+        # set once the server is shutting down
+        self.stopping = False
+
+    def open_room(self, game_mode):
+        room = Room(self.next_room_id, game_mode)
+        self.rooms[room.room_id] = room
+        self.next_room_id += 1
+        room.archive = self.archive
+        room.grace_period = self.grace_period
+        room.schedule = self.schedule
+        if self.match_log is not None:
+            room.log = self.match_log
+            self.match_log.open_room(room.room_id, game_mode)
+        return room
+
+    def queue_player(self, conn, game_mode, rating=None):
+        """Pair conn with a waiting player in a new room, or leave it in the lobby"""
+        opponent = self.lobby.enqueue(conn, game_mode, rating)
+        if opponent is None:
+            conn.send({"type": "queued", "game_mode": game_mode})
+            return
+        room = self.open_room(game_mode)
+        # whoever waited longer hosts as X
+        for player in (opponent, conn):
+            player.room = room
+            room.add_player(player)
+
+    def open_bot_room(self, conn, game_mode, difficulty):
+        """Seat conn as X in a new room with a bot as O"""
+        if self.bot_pool is None:
+            self.bot_pool = BotPool(self.bot_workers)
+        if difficulty not in DIFFICULTIES:
+            difficulty = DEFAULT_DIFFICULTY
+        room = self.open_room(game_mode)
+        conn.room = room
+        room.add_player(conn)
+        bot = BotSeat(self.bot_pool, self.schedule, difficulty, self.think_delay, conn.codec)
+        bot.room = room
+        room.add_player(bot)
+
+    def schedule(self, delay, callback):
+        """Run a bot's or hint search's callback on the event loop after delay; safe from any thread"""
+        if self.loop.is_closed():
+            # a result worked out after the server shut down
+            return
+        self.loop.call_soon_threadsafe(self.loop.call_later, delay, callback)
+
+    def find_room(self, room_id=None):
+        """The room to watch: the one asked for, or the oldest game in progress"""
+        if room_id is not None:
+            return self.rooms.get(room_id)
+        for room in self.rooms.values():
+            if room.is_full():
+                return room
+        return None
+
+    def join(self, conn, data):
+        """Place a connection according to its first message; False if there is no room for it"""
+        game_mode, rating = "single_game", None
+        if data.get("type") == "hello":
+            conn.negotiate(data)
+            if data.get("role") == "spectator":
+                room = self.find_room(data.get("room"))
+                if room is None:
+                    conn.send({"type": "room_not_found"})
+                    return False
+                conn.room = room
+                room.add_spectator(conn)
+                return True
+            if data.get("resume") is not None and self.resume(conn, data["resume"], data.get("last_seq")):
+                return True
+            if data.get("game_mode") in self.lobby.queues:
+                game_mode = data["game_mode"]
+            if isinstance(data.get("rating"), int):
+                rating = data["rating"]
+        if self.max_rooms is not None and len(self.rooms) >= self.max_rooms:
+            conn.send({"type": "server_full"})
+            return False
+        # the AI only plays 3x3, so on other boards a bot request waits for a person
+        if data.get("opponent") == "bot" and board_kind(game_mode) is None:
+            self.open_bot_room(conn, game_mode, data.get("difficulty", DEFAULT_DIFFICULTY))
+            return True
+        self.queue_player(conn, game_mode, rating)
+        return True
+
+    def resume(self, conn, token, last_seq):
+        """Put conn back in the seat its token holds; False if the token is unknown or has expired"""
+        room = self.rooms.get(room_of_token(token))
+        if room is None:
+            return False
+        conn.room = room
+        if room.resume(conn, token, last_seq) is None:
+            conn.room = None
+            return False
+        return True
+
+    def release_room(self, conn):
+        """Take conn out of the lobby or its room
+
+        A player who drops out of a game in progress has their seat held for
+        the grace period; otherwise the room is closed.
+        """
+        if self.lobby.remove(conn):
+            return
+        room = conn.room
+        if room is None:
+            return
+        conn.room = None
+        if conn in room.spectators:
+            room.remove_spectator(conn)
+            return
+        if self.grace_period and not room.has_free_seat():
+            hold = room.suspend_player(conn)
+            self.loop.call_later(self.grace_period, self.expire_seat, room, hold)
+            return
+        room.remove_player(conn)
+        self.close_room(room)
+
+    def expire_seat(self, room, hold):
+        """The grace period is up: close the room unless the player came back"""
+        if self.rooms.get(room.room_id) is room and room.expire_seat(hold):
+            self.close_room(room)
+
+    def close_room(self, room):
+        self.rooms.pop(room.room_id, None)
+        if room.log is not None:
+            room.log.close_room(room.room_id)
+        # nothing left to watch
+        for spectator in list(room.spectators):
+            spectator.close()
+        # the remaining player goes back to the lobby for a new opponent
+        for opponent in list(room.players.values()):
+            if getattr(opponent, "is_bot", False):
+                opponent.close()
+                continue
+            opponent.room = None
+            self.queue_player(opponent, room.game_mode)
+
+    async def handle_connection(self, reader, writer):
+        """Serve one client until it disconnects"""
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = ClientConnection(reader, writer, self.queue_limit, self.slow_client_policy)
+        if self.heartbeats is not None:
+            self.heartbeats.watch(conn, self.loop.time())
+
+        decoder = FrameDecoder()
+        try:
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    break
+                conn.last_seen = self.loop.time()
+                for frame in decoder.feed(chunk):
+                    data = decode_message(frame)
+                    if data.get("type") in HEARTBEAT_TYPES:
+                        # only seen for last_seen; a ping is answered at once
+                        if data["type"] == "ping":
+                            conn.send(PONG)
+                    elif data.get("type") == "lobby_stats":
+                        conn.send({"type": "lobby_stats", **self.lobby.stats()})
+                    elif data.get("type") == "hint_stats":
+                        conn.send({"type": "hint_stats", **get_hint_service().stats()})
+                    elif conn.room is not None:
+                        conn.room.handle_message(conn, data)
+                    elif not self.lobby.is_queued(conn):
+                        # the first message (normally hello) picks a game mode or a game to watch
+                        if not self.join(conn, data):
+                            return
+        except ConnectionError:
+            # a reset is just another way of leaving
+            pass
+        except (ProtocolError, ValueError) as e:
+            print(f"Error in client handler: {e}")
+        except Exception as e:
+            # a malformed message (say a move with "position": 5) costs only this client
+            print(f"Unexpected error in client handler: {e!r}")
+        finally:
+            if self.heartbeats is not None:
+                self.heartbeats.forget(conn)
+            # on shutdown every room is left as it is, so the match log
+            # brings it back on the next start
+            if not self.stopping:
+                self.release_room(conn)
+            conn.close()
+
+    async def reap_loop(self):
+        """Each tick, ping connections that went quiet and close the ones that never answered"""
+        while True:
+            await asyncio.sleep(self.heartbeats.wheel.tick)
+            for conn in self.heartbeats.check(self.loop.time()):
+                # the handler's read then ends, and it frees the seat or lobby slot
+                conn.abort()
+
+    async def serve(self):
+        """Accept connections forever"""
+        self.loop = asyncio.get_running_loop()
+        # restored rooms are closed if their players don't resume in time
+        for room in list(self.rooms.values()):
+            holds = room.hold_seats()
+            if not holds:
+                # no seat anyone could resume
+                self.close_room(room)
+            for hold in holds:
+                self.loop.call_later(self.restore_timeout, self.expire_seat, room, hold)
+        reaper = None
+        if self.ping_interval is not None:
+            self.heartbeats = Heartbeats(self.ping_interval, self.ping_timeout, DEFAULT_TICK, self.loop.time())
+            reaper = asyncio.ensure_future(self.reap_loop())
+        self.server = await asyncio.start_server(
+            self.handle_connection, self.host, self.port, backlog=self.backlog)
+        print(f"Async server started on {self.host}:{self.port}")
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            self.stopping = True
+            if reaper is not None:
+                reaper.cancel()
+
+    def start(self):
+        """Run the event loop"""
+        try:
+            asyncio.run(self.serve())
+        finally:
+            if self.bot_pool is not None:
+                self.bot_pool.close()
+            get_hint_service().close()
+            if self.match_log is not None:
+                self.match_log.close()
+            if self.archive is not None:
+                self.archive.close()
+
+
+if __name__ == "__main__":
+    try:
+        server = AsyncTicTacToeServer(match_log=os.environ.get("TICTACTOE_MATCH_LOG"),
+                                      archive=os.environ.get("TICTACTOE_ARCHIVE"))
+        server.start()
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
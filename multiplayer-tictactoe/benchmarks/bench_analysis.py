@@ -0,0 +1,81 @@
+"""Bulk analysis throughput, and memory as the input grows.
+
+Random games are generated as move-sequence lines on the fly and fed to
+analysis.analyse_stream, so the input never exists as a whole. Each run
+reports positions per minute, and this process's peak RSS afterwards:
+with streaming it should barely move between the smallest and the
+largest input. A worker's own memory is fixed by the chunk size.
+
+    python benchmarks/bench_analysis.py
+    python benchmarks/bench_analysis.py --games 100000 1000000 --workers 0 1 4
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis import DEFAULT_CHUNK_SIZE, analyse_stream
+from game_state import WINNING_LINE
+
+
+def random_games(count, seed):
+    """Move-sequence lines of random games, one at a time"""
+    rng = random.Random(seed)
+    cells = list(range(9))
+    for _ in range(count):
+        rng.shuffle(cells)
+        x_mask = o_mask = 0
+        for ply, cell in enumerate(cells):
+            if ply & 1:
+                o_mask |= 1 << cell
+            else:
+                x_mask |= 1 << cell
+            if WINNING_LINE[x_mask] or WINNING_LINE[o_mask]:
+                break
+        yield "".join(map(str, cells[:ply + 1])) + "\n"
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, nargs="+", default=[50_000, 500_000])
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, os.cpu_count() or 1],
+                        help="pool sizes to try; 0 analyses in this process")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for workers in args.workers:
+        for games in sorted(args.games):
+            start = time.perf_counter()
+            positions = blunders = 0
+            for text, chunk_positions, chunk_blunders, _ in analyse_stream(random_games(games, args.seed), workers,
+                                                                          args.chunk_size):
+                positions += chunk_positions
+                blunders += chunk_blunders
+            elapsed = time.perf_counter() - start
+            result = {"workers": workers, "games": games, "positions": positions, "blunders": blunders,
+                      "positions_per_min": round(positions / elapsed * 60), "peak_rss_mb": round(peak_rss_mb(), 1)}
+            results.append(result)
+            print(f"workers={workers} games={games:,}: {positions:,} positions in {elapsed:.2f}s, "
+                  f"{result['positions_per_min']:,} positions/min, {blunders:,} blunders, "
+                  f"peak RSS {result['peak_rss_mb']:.1f} MB")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Game archive: bytes per game against JSON lines, and write, lookup and scan speed.
+
+Random 3x3 games are written to an archive and, for comparison, to a
+JSON-lines file with the same fields. The archive is then opened with mmap
+and read back three ways: game N at random, a time range found by binary
+search over the index, and a full scan in order.
+
+    python benchmarks/bench_archive.py
+    python benchmarks/bench_archive.py --games 1000000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_archive import ArchiveWriter, GameArchive, to_json
+from game_state import WINNING_LINE
+
+# pretend games end this often
+SECONDS_PER_GAME = 2
+
+
+def random_games(count, seed):
+    """(moves, winner, game_mode) of random games"""
+    rng = random.Random(seed)
+    cells = list(range(9))
+    for _ in range(count):
+        rng.shuffle(cells)
+        masks = [0, 0]
+        winner = "Draw"
+        for ply, cell in enumerate(cells):
+            masks[ply & 1] |= 1 << cell
+            if WINNING_LINE[masks[ply & 1]]:
+                winner = "XO"[ply & 1]
+                break
+        yield cells[:ply + 1], winner, rng.choice(("single_game", "best_of_3"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=200_000)
+    parser.add_argument("--lookups", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    start_time = 1_700_000_000
+    results = {"games": args.games}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "games.ttta")
+        writer = ArchiveWriter(path)
+        start = time.perf_counter()
+        for number, (moves, winner, game_mode) in enumerate(random_games(args.games, args.seed)):
+            writer.record(moves, winner, game_mode, ended_at=start_time + number * SECONDS_PER_GAME)
+        elapsed = time.perf_counter() - start
+        writer.close()
+        archive_bytes = os.path.getsize(path) + os.path.getsize(path + ".idx")
+        results["writes_per_sec"] = round(args.games / elapsed)
+
+        json_path = os.path.join(directory, "games.jsonl")
+        with open(json_path, "w") as f:
+            archive = GameArchive(path)
+            for game in archive:
+                f.write(json.dumps(to_json(game)) + "\n")
+            archive.close()
+        json_bytes = os.path.getsize(json_path)
+        results["bytes_per_game"] = round(archive_bytes / args.games, 2)
+        results["json_bytes_per_game"] = round(json_bytes / args.games, 2)
+        print(f"{args.games:,} games: {results['bytes_per_game']:.1f} bytes/game "
+              f"(JSON lines {results['json_bytes_per_game']:.1f}, x{json_bytes / archive_bytes:.0f}), "
+              f"{results['writes_per_sec']:,} writes/s")
+
+        start = time.perf_counter()
+        archive = GameArchive(path)
+        results["open_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        rng = random.Random(args.seed)
+        numbers = [rng.randrange(args.games) for _ in range(args.lookups)]
+        start = time.perf_counter()
+        for number in numbers:
+            archive.game(number)
+        results["lookup_us"] = round((time.perf_counter() - start) / args.lookups * 1e6, 2)
+
+        # an hour's worth of games from the middle of the archive
+        middle = start_time + args.games // 2 * SECONDS_PER_GAME
+        start = time.perf_counter()
+        in_range = sum(1 for _ in archive.between(middle, middle + 3600))
+        results["hour_query_ms"] = round((time.perf_counter() - start) * 1000, 3)
+
+        start = time.perf_counter()
+        scanned = sum(1 for _ in archive)
+        results["scan_per_sec"] = round(scanned / (time.perf_counter() - start))
+        archive.close()
+        print(f"open {results['open_ms']:.2f} ms, game N {results['lookup_us']:.2f} us, "
+              f"one hour ({in_range:,} games) {results['hour_query_ms']:.2f} ms, "
+              f"full scan {results['scan_per_sec']:,} games/s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
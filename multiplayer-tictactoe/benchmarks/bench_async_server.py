@@ -0,0 +1,177 @@
+"""Rooms/sec and move latency of the asyncio multi-room server.
+
+Starts async_server.py in a child process and opens N client connections
+from this process. Every pair of connections is seated in one room and
+plays a scripted game to the end.
+
+    python benchmarks/bench_async_server.py
+    python benchmarks/bench_async_server.py --connections 1000 5000 10000
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_server import AsyncTicTacToeServer
+from codec import JSON, get_codec
+from protocol import FrameDecoder, decode_message, encode_message
+
+# Preferred cells for each side, the first free one is played
+MOVE_ORDER = {
+    "X": [(0, 0), (1, 1), (2, 2), (0, 2), (2, 0), (0, 1), (1, 0), (1, 2), (2, 1)],
+    "O": [(1, 0), (2, 0), (0, 1), (2, 1), (1, 2), (0, 2), (1, 1), (0, 0), (2, 2)],
+}
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def run_server(port):
+    raise_fd_limit()
+    AsyncTicTacToeServer(host="127.0.0.1", port=port, backlog=4096).start()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+class BenchClient:
+    """Plays the scripted game on one connection and records move latency"""
+
+    def __init__(self, latencies, codec_name):
+        self.latencies = latencies
+        self.codec_name = codec_name
+        self.codec = JSON
+        self.symbol = None
+        self.taken = set()
+        self.sent_at = None
+        self.finished = False
+
+    async def play(self, port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        decoder = FrameDecoder()
+        # the server seats a connection once its hello arrives
+        writer.write(encode_message({"type": "hello", "codecs": [self.codec_name]}))
+        try:
+            while not self.finished:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    break
+                for frame in decoder.feed(chunk):
+                    self.on_message(decode_message(frame), writer)
+        finally:
+            writer.close()
+        return self.finished and self.symbol == "X"
+
+    def on_message(self, data, writer):
+        msg_type = data["type"]
+        if msg_type == "welcome":
+            self.codec = get_codec(data["capabilities"]["codec"])
+            self.symbol = data["symbol"]
+        elif msg_type == "start_game":
+            self.maybe_move(data["current_player"], writer)
+        elif msg_type == "update_board":
+            self.taken.add(tuple(data["position"]))
+            if data["player"] == self.symbol and self.sent_at is not None:
+                self.latencies.append(time.perf_counter() - self.sent_at)
+                self.sent_at = None
+        elif msg_type == "next_turn":
+            self.maybe_move(data["player"], writer)
+        elif msg_type in ("game_over", "game_of_3_over", "opponent_disconnected", "server_full"):
+            self.finished = True
+
+    def maybe_move(self, current_player, writer):
+        if current_player != self.symbol:
+            return
+        for cell in MOVE_ORDER[self.symbol]:
+            if cell not in self.taken:
+                self.sent_at = time.perf_counter()
+                writer.write(encode_message({"type": "move", "position": list(cell)}, self.codec))
+                return
+
+
+async def run_clients(port, connections, batch, codec_name):
+    latencies = []
+    tasks = []
+    start = time.perf_counter()
+    for first in range(0, connections, batch):
+        for _ in range(min(batch, connections - first)):
+            tasks.append(asyncio.ensure_future(BenchClient(latencies, codec_name).play(port)))
+        # let the accept queue drain before the next burst of SYNs
+        await asyncio.sleep(0)
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    rooms = sum(1 for r in results if r is True)
+    errors = sum(1 for r in results if isinstance(r, Exception))
+    return {
+        "connections": connections,
+        "codec": codec_name,
+        "rooms_completed": rooms,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "rooms_per_sec": round(rooms / elapsed, 1) if elapsed else 0.0,
+        "move_p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "move_p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "moves": len(latencies),
+    }
+
+
+def wait_for_port(port, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, nargs="+", default=[1000, 5000, 10000])
+    parser.add_argument("--port", type=int, default=5600)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--codec", choices=["json", "binary"], default="json")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    raise_fd_limit()
+
+    results = []
+    for count in args.connections:
+        count -= count % 2
+        server = multiprocessing.Process(target=run_server, args=(args.port,), daemon=True)
+        server.start()
+        try:
+            wait_for_port(args.port)
+            result = asyncio.run(run_clients(args.port, count, args.batch, args.codec))
+        finally:
+            server.terminate()
+            server.join()
+        results.append(result)
+        print(f"{result['connections']:>6} conns  {result['rooms_completed']:>5} rooms  "
+              f"{result['rooms_per_sec']:>9.1f} rooms/s  "
+              f"p50 {result['move_p50_ms']:.2f} ms  p99 {result['move_p99_ms']:.2f} ms  "
+              f"errors {result['errors']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Human-vs-bot rooms: how many one server handles per core.
+
+Starts async_server.py in a child process with a bot worker pool, then
+opens --rooms rooms at once, each a headless client playing a server bot.
+Reports games and bot moves per second, divided by the cores in use (the
+event loop plus the workers), and how long a client waits for the bot's
+reply beyond the think delay.
+
+    python benchmarks/bench_bots.py --rooms 200 --workers 2
+    python benchmarks/bench_bots.py --rooms 1000 --workers 4 --difficulty easy --think-delay 0.5
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import signal
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_server import AsyncTicTacToeServer
+from bot_client import BotClient, BotStats
+
+from bench_async_server import percentile, raise_fd_limit, wait_for_port
+
+
+class TimedClient(BotClient):
+    """Records the time from our move landing to our next turn: the bot's reply"""
+
+    def __init__(self, replies, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replies = replies
+        self.landed_at = None
+
+    def on_message(self, data):
+        if data["type"] == "update_board" and data["player"] == self.symbol:
+            self.landed_at = time.perf_counter()
+        elif data["type"] == "next_turn" and data["player"] == self.symbol and self.landed_at is not None:
+            self.replies.append(time.perf_counter() - self.landed_at)
+            self.landed_at = None
+        elif data["type"] in ("game_over", "restart_game"):
+            self.landed_at = None
+        super().on_message(data)
+
+
+def run_server(port, workers, think_delay):
+    raise_fd_limit()
+    try:
+        AsyncTicTacToeServer(host="127.0.0.1", port=port, backlog=4096,
+                             bot_workers=workers, think_delay=think_delay).start()
+    except KeyboardInterrupt:
+        pass
+
+
+async def run_rooms(args):
+    stats = BotStats()
+    replies = []
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    clients = [TimedClient(replies, stats, "127.0.0.1", args.port, games=args.games,
+                           rng=random.Random(rng.random()), opponent_bot=args.difficulty)
+               for _ in range(args.rooms)]
+    results = await asyncio.gather(*(client.run() for client in clients), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    errors = sum(1 for r in results if isinstance(r, Exception))
+    return stats, replies, elapsed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=int, default=200, help="rooms played at the same time")
+    parser.add_argument("--games", type=int, default=3, help="games per room")
+    parser.add_argument("--workers", type=int, default=1, help="bot worker processes")
+    parser.add_argument("--difficulty", default="perfect")
+    parser.add_argument("--think-delay", type=float, default=0.0, help="seconds a bot waits before moving")
+    parser.add_argument("--port", type=int, default=5603)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    raise_fd_limit()
+
+    # not a daemon: the server starts its own worker processes
+    server = multiprocessing.Process(target=run_server, args=(args.port, args.workers, args.think_delay))
+    server.start()
+    try:
+        wait_for_port(args.port)
+        # the first bot move starts the pool; keep that out of the timing
+        asyncio.run(run_rooms(argparse.Namespace(**{**vars(args), "rooms": 1, "games": 1})))
+        stats, replies, elapsed, errors = asyncio.run(run_rooms(args))
+    finally:
+        # an interrupt rather than terminate(), so the server shuts its workers down
+        os.kill(server.pid, signal.SIGINT)
+        server.join()
+
+    # the client moves too, so bot moves are the replies counted
+    cores = min(args.workers + 1, os.cpu_count() or 1)
+    games_per_sec = stats.games / elapsed
+    bot_moves_per_sec = len(replies) / elapsed
+    overhead = [reply - args.think_delay for reply in replies]
+    print(f"{args.rooms} rooms x {args.games} games vs {args.difficulty} bots, {args.workers} workers: "
+          f"{stats.games} games in {elapsed:.2f} s, errors {errors}")
+    print(f"{games_per_sec:.1f} games/s, {bot_moves_per_sec:.1f} bot moves/s, "
+          f"{bot_moves_per_sec / cores:.1f} bot moves/s per core ({cores} cores)")
+    print(f"bot reply beyond think delay: p50 {percentile(overhead, 50) * 1000:.2f} ms  "
+          f"p99 {percentile(overhead, 99) * 1000:.2f} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"rooms": args.rooms, "games": stats.games, "workers": args.workers, "cores": cores,
+                       "difficulty": args.difficulty, "think_delay": args.think_delay, "errors": errors,
+                       "elapsed_s": round(elapsed, 4), "games_per_sec": round(games_per_sec, 1),
+                       "bot_moves_per_sec": round(bot_moves_per_sec, 1),
+                       "bot_moves_per_sec_per_core": round(bot_moves_per_sec / cores, 1),
+                       "reply_overhead_p50_ms": round(percentile(overhead, 50) * 1000, 3),
+                       "reply_overhead_p99_ms": round(percentile(overhead, 99) * 1000, 3)}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Encode/decode throughput and wire size: JSON vs the binary codec.
+
+The JSON numbers use the same calls as the original server and client,
+``json.dumps(message).encode()`` and ``json.loads(data.decode())``.
+
+    python benchmarks/bench_codec.py
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from codec import BINARY, decode_payload
+
+# Roughly what one game puts on the wire
+MESSAGES = [
+    {"type": "move", "position": [1, 1], "seq": 41},
+    {"type": "update_board", "position": [2, 2], "player": "X", "seq": 42},
+    {"type": "next_turn", "player": "O", "seq": 43},
+    {"type": "start_game", "current_player": "X", "seq": 2},
+    {"type": "game_over", "winner": "X", "seq": 44},
+    {"type": "game_of_3_over", "winner": "O", "round_num": 2, "player1_wins": 1, "player2_wins": 1,
+     "seq": 44},
+    {"type": "restart_game", "current_player": "X", "round_num": 3, "seq": 45},
+    {"type": "chat_message", "player": "X", "text": "good game"},
+]
+
+
+def time_per_call(func, items, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            func(item)
+    return (time.perf_counter() - start) / (repeat * len(items))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20000)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    json_encoded = [json.dumps(m).encode() for m in MESSAGES]
+    binary_encoded = [BINARY.encode(m) for m in MESSAGES]
+
+    results = {
+        "json": {
+            "encode_ns": time_per_call(lambda m: json.dumps(m).encode(), MESSAGES, args.repeat) * 1e9,
+            "decode_ns": time_per_call(lambda b: json.loads(b.decode()), json_encoded, args.repeat) * 1e9,
+            "bytes_per_msg": sum(map(len, json_encoded)) / len(MESSAGES),
+        },
+        "binary": {
+            "encode_ns": time_per_call(BINARY.encode, MESSAGES, args.repeat) * 1e9,
+            "decode_ns": time_per_call(decode_payload, binary_encoded, args.repeat) * 1e9,
+            "bytes_per_msg": sum(map(len, binary_encoded)) / len(MESSAGES),
+        },
+    }
+
+    for name, r in results.items():
+        print(f"{name:>7}: encode {r['encode_ns']:7.0f} ns/msg ({1e9 / r['encode_ns']:>10,.0f} msg/s)  "
+              f"decode {r['decode_ns']:7.0f} ns/msg ({1e9 / r['decode_ns']:>10,.0f} msg/s)  "
+              f"{r['bytes_per_msg']:5.1f} bytes/msg")
+    j, b = results["json"], results["binary"]
+    print(f"binary vs json: encode x{j['encode_ns'] / b['encode_ns']:.1f}  "
+          f"decode x{j['decode_ns'] / b['decode_ns']:.1f}  "
+          f"size x{j['bytes_per_msg'] / b['bytes_per_msg']:.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
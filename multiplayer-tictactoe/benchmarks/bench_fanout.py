@@ -0,0 +1,95 @@
+"""Broadcast cost per room as spectators are added: encode-once vs per-recipient.
+
+Connections here are stand-ins that only collect frames, so the numbers are
+the CPU the server spends in Room.broadcast, with no sockets involved.
+
+    python benchmarks/bench_fanout.py --spectators 0 10 100 500
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from codec import BINARY, JSON
+from protocol import encode_message
+from room import Room
+
+MESSAGES = [
+    {"type": "update_board", "position": [2, 2], "player": "X"},
+    {"type": "next_turn", "player": "O"},
+    {"type": "chat_message", "player": "X", "text": "good game"},
+]
+
+
+class NullConnection:
+    """Counts queued frames instead of writing them"""
+
+    def __init__(self, codec):
+        self.codec = codec
+        self.frames = 0
+
+    def send(self, message):
+        self.send_frame(encode_message(message, self.codec))
+
+    def send_frame(self, frame):
+        self.frames += 1
+
+
+def per_recipient_broadcast(room, message):
+    """What broadcast did before: one encode per recipient"""
+    for conn in [*room.players.values(), *room.spectators]:
+        conn.send(message)
+
+
+def build_room(spectators):
+    room = Room(1)
+    room.seat(NullConnection(BINARY))
+    room.seat(NullConnection(JSON))
+    for i in range(spectators):
+        # a mix of codecs, as a real audience would have
+        room.spectators.add(NullConnection(BINARY if i % 2 else JSON))
+    return room
+
+
+def time_broadcast(broadcast, room, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message in MESSAGES:
+            broadcast(room, message)
+    return (time.perf_counter() - start) / (repeat * len(MESSAGES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--spectators", type=int, nargs="+", default=[0, 10, 100, 500])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for spectators in args.spectators:
+        room = build_room(spectators)
+        once = time_broadcast(Room.broadcast, room, args.repeat)
+        each = time_broadcast(per_recipient_broadcast, room, args.repeat)
+        recipients = spectators + 2
+        results.append({
+            "spectators": spectators,
+            "encode_once_us": once * 1e6,
+            "per_recipient_us": each * 1e6,
+            "encode_once_ns_per_recipient": once / recipients * 1e9,
+            "per_recipient_ns_per_recipient": each / recipients * 1e9,
+        })
+        print(f"{spectators:5d} spectators: encode once {once * 1e6:8.1f} us/broadcast "
+              f"({once / recipients * 1e9:6.0f} ns/recipient)  per recipient {each * 1e6:8.1f} us/broadcast "
+              f"({each / recipients * 1e9:6.0f} ns/recipient)  x{each / once:.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
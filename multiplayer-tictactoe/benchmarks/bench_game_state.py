@@ -0,0 +1,143 @@
+"""Win/draw checks: bitboard GameState vs the nested-list code it replaced.
+
+The legacy functions below are the bodies of the old
+TicTacToeServer.check_winner / is_board_full and singleplayer
+Board.grid_check / board_full, lifted out of their classes so they can run
+without a server socket or pygame.
+
+    python benchmarks/bench_game_state.py
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_state import GameState
+
+SEARCH_COORDS = [(0, -1), (-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1)]
+
+
+def legacy_check_winner(board, player):
+    for row in board:
+        if all(cell == player for cell in row):
+            return True
+    for col in range(3):
+        if all(board[row][col] == player for row in range(3)):
+            return True
+    if all(board[i][i] == player for i in range(3)):
+        return True
+    if all(board[i][2-i] == player for i in range(3)):
+        return True
+    return False
+
+
+def legacy_is_board_full(board):
+    return all(cell != '' for row in board for cell in row)
+
+
+def legacy_grid_check(grid, x, y, user):
+    def inside(x, y):
+        return x >= 0 and x < 3 and y >= 0 and y < 3
+    count = 1
+    for index, (x_coord, y_coord) in enumerate(SEARCH_COORDS):
+        if inside(x + x_coord, y + y_coord) and grid[y + y_coord][x + x_coord] == user:
+            count += 1
+            xx = x + x_coord
+            yy = y + y_coord
+            if inside(xx + x_coord, yy + y_coord) and grid[yy + y_coord][xx + x_coord] == user:
+                count += 1
+                if count == 3:
+                    break
+            if count < 3:
+                new_direction = SEARCH_COORDS[(index + 4) % 8]
+                if inside(x + new_direction[0], y + new_direction[1]) and \
+                        grid[y + new_direction[1]][x + new_direction[0]] == user:
+                    count += 1
+                    if count == 3:
+                        break
+                else:
+                    count = 1
+    return count == 3
+
+
+def legacy_board_full(grid):
+    for row in grid:
+        for value in row:
+            if value == 0:
+                return False
+    return True
+
+
+def random_positions(count, seed):
+    """(state, last move, mover) for random legal positions with 1-9 marks"""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        state = GameState()
+        cells = [(x, y) for y in range(3) for x in range(3)]
+        rng.shuffle(cells)
+        player = "X"
+        for x, y in cells[:rng.randint(1, 9)]:
+            state.place(x, y, player)
+            last = (x, y, player)
+            if state.has_won(player):
+                break
+            player = "O" if player == "X" else "X"
+        positions.append((state, last))
+    return positions
+
+
+def bench(func, args, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for a in args:
+            func(*a)
+    return (time.perf_counter() - start) / (repeat * len(args)) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--positions", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    positions = random_positions(args.positions, args.seed)
+    server_boards = [(s.to_rows(), last[2]) for s, last in positions]
+    grids = [(s.to_rows(empty=0), last[0], last[1], last[2]) for s, last in positions]
+    states = [(s, last[2]) for s, last in positions]
+
+    # the two implementations must agree before we time them
+    for (board, player), (state, _) in zip(server_boards, states):
+        assert legacy_check_winner(board, player) == state.has_won(player)
+        assert legacy_is_board_full(board) == state.is_full()
+    for grid, x, y, user in grids:
+        assert legacy_grid_check(grid, x, y, user) == GameState.from_rows(grid, empty=0).has_won(user)
+
+    results = {
+        "check_winner": bench(legacy_check_winner, server_boards, args.repeat),
+        "grid_check": bench(legacy_grid_check, grids, args.repeat),
+        "GameState.has_won": bench(GameState.has_won, states, args.repeat),
+        "is_board_full": bench(legacy_is_board_full, [(b,) for b, _ in server_boards], args.repeat),
+        "board_full": bench(legacy_board_full, [(g[0],) for g in grids], args.repeat),
+        "GameState.is_full": bench(GameState.is_full, [(s,) for s, _ in states], args.repeat),
+        "GameState.snapshot": bench(GameState.snapshot, [(s,) for s, _ in states], args.repeat),
+    }
+    for name, ns in results.items():
+        print(f"{name:>20}: {ns:8.1f} ns/call")
+    print(f"has_won vs check_winner x{results['check_winner'] / results['GameState.has_won']:.1f}, "
+          f"vs grid_check x{results['grid_check'] / results['GameState.has_won']:.1f}; "
+          f"is_full vs is_board_full x{results['is_board_full'] / results['GameState.is_full']:.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({name: round(ns, 1) for name, ns in results.items()}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Cost of a heartbeat check with a timing wheel against scanning every connection.
+
+Simulates N connections on a fake clock, one check per wheel tick. They
+arrive over the first ping interval. Most of them play and send something
+every couple of seconds; some sit idle and only answer pings; a few are
+half-open and never answer. Only the check itself is timed:
+Heartbeats.check, which looks at the wheel slots that came due, against a
+loop over every connection that applies the same rules. Both must close
+the same dead connections. Besides the time, each reports how many
+connections a check looks at on average.
+
+    python benchmarks/bench_heartbeat.py
+    python benchmarks/bench_heartbeat.py --connections 1000 10000 100000 --seconds 60
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from itertools import islice
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from heartbeat import DEFAULT_PING_INTERVAL, DEFAULT_PING_TIMEOUT, DEFAULT_TICK, PING, Heartbeats
+
+CONNECTIONS = (1000, 10000, 100000)
+
+
+class FakeConnection:
+    __slots__ = ("last_seen", "silent", "idle", "ping_due")
+
+    def __init__(self, silent, idle):
+        self.last_seen = 0.0
+        # half-open: never answers; idle: only answers pings
+        self.silent = silent
+        self.idle = idle
+        self.ping_due = False
+
+    def send(self, message):
+        if message is PING and not self.silent:
+            self.ping_due = True
+
+
+class FullScan:
+    """The same rules as Heartbeats, applied to every connection every check"""
+
+    def __init__(self, interval, timeout):
+        self.interval = interval
+        self.timeout = timeout
+        self.connections = set()
+        self.pinged = {}
+        self.due = 0
+
+    def watch(self, conn, now):
+        conn.last_seen = now
+        self.connections.add(conn)
+
+    def forget(self, conn):
+        self.connections.discard(conn)
+        self.pinged.pop(conn, None)
+
+    def check(self, now):
+        dead = []
+        self.due += len(self.connections)
+        for conn in self.connections:
+            pinged = self.pinged.get(conn)
+            if pinged is not None and conn.last_seen < pinged:
+                if now - pinged >= self.timeout:
+                    dead.append(conn)
+            elif now - conn.last_seen >= self.interval:
+                conn.send(PING)
+                self.pinged[conn] = now
+        return dead
+
+
+def simulate(watcher, connections, seconds, tick, interval):
+    """(seconds spent in check, checks, connections closed)"""
+    # arrivals are spread over the first interval
+    per_tick = max(1, int(len(connections) * tick / interval))
+    arriving = iter(connections)
+    # each player sends something every 2 s, at its own point in the cycle
+    players = [conn for conn in connections if not conn.idle and not conn.silent]
+    cycle = max(1, round(2 / tick))
+    groups = [players[phase::cycle] for phase in range(cycle)]
+    spent = 0.0
+    checks = closed = 0
+    now = 0.0
+    while now < seconds:
+        now += tick
+        for conn in islice(arriving, per_tick):
+            watcher.watch(conn, now)
+        for conn in groups[checks % cycle]:
+            conn.last_seen = now
+        for conn in connections:
+            if conn.ping_due:
+                conn.ping_due = False
+                conn.last_seen = now
+        start = time.perf_counter()
+        dead = watcher.check(now)
+        spent += time.perf_counter() - start
+        checks += 1
+        for conn in dead:
+            watcher.forget(conn)
+        closed += len(dead)
+    return spent, checks, closed
+
+
+def make_connections(count, idle, silent, seed):
+    rng = random.Random(seed)
+    connections = []
+    for _ in range(count):
+        roll = rng.random()
+        connections.append(FakeConnection(silent=roll < silent, idle=silent <= roll < silent + idle))
+    return connections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, nargs="+", default=CONNECTIONS)
+    parser.add_argument("--seconds", type=float, default=60.0, help="simulated time")
+    parser.add_argument("--interval", type=float, default=DEFAULT_PING_INTERVAL)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_PING_TIMEOUT)
+    parser.add_argument("--tick", type=float, default=DEFAULT_TICK)
+    parser.add_argument("--idle", type=float, default=0.2, help="share of connections that only answer pings")
+    parser.add_argument("--silent", type=float, default=0.01, help="share of half-open connections")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per setting; the fastest counts")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for count in args.connections:
+        row = {}
+        for name in ("wheel", "scan"):
+            best = float("inf")
+            for _ in range(args.repeat):
+                connections = make_connections(count, args.idle, args.silent, args.seed)
+                if name == "wheel":
+                    watcher = Heartbeats(args.interval, args.timeout, args.tick)
+                else:
+                    watcher = FullScan(args.interval, args.timeout)
+                spent, checks, closed = simulate(watcher, connections, args.seconds, args.tick, args.interval)
+                best = min(best, spent)
+            row[name] = {"us_per_check": round(best / checks * 1e6, 1), "looked_at": round(watcher.due / checks),
+                         "closed": closed}
+        # both must have found exactly the half-open connections
+        assert row["wheel"]["closed"] == row["scan"]["closed"], row
+        results[count] = row
+        wheel, scan = row["wheel"], row["scan"]
+        print(f"{count:>8,} connections: wheel {wheel['us_per_check']:>8,.1f} us/check ({wheel['looked_at']:>6,} looked at), "
+              f"scan {scan['us_per_check']:>8,.1f} us/check ({scan['looked_at']:>7,}), {wheel['closed']:,} closed")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Hint requests: cache hit rate and the cost of a hit vs a miss.
+
+Simulates many rooms playing random 3x3 games, each asking for a hint
+before every move, the way a client pressing H every turn would. The same
+request stream goes through two services: the real one, keyed by the
+symmetry-canonical hash, and one keyed by the raw masks, which shares
+nothing between a position and its rotations or reflections.
+
+    python benchmarks/bench_hints.py
+    python benchmarks/bench_hints.py --games 20000 --cache-size 256
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_state import GameState
+from hints import DEFAULT_CACHE_SIZE, HintService, table_hint
+
+
+class RawKeyService(HintService):
+    """A HintService whose cache key is the exact position, not its symmetry class"""
+
+    def best_moves(self, board):
+        if board.winner() is not None or board.is_full():
+            return 0, []
+        key = (board.x_mask, board.o_mask)
+        entry = self.cache.get(key)
+        if entry is None:
+            entry = table_hint(board)
+            self.cache.put(key, entry)
+        score, best = entry
+        return score, [(cell % 3, cell // 3) for cell in range(9) if best >> cell & 1]
+
+
+def request_stream(games, seed):
+    """Positions hints are asked for, one per move of each random game"""
+    rng = random.Random(seed)
+    positions = []
+    for _ in range(games):
+        state = GameState()
+        player = "X"
+        while state.winner() is None and not state.is_full():
+            positions.append(GameState(state.x_mask, state.o_mask))
+            x, y = rng.choice([(x, y) for y in range(3) for x in range(3) if state.is_free(x, y)])
+            state.place(x, y, player)
+            player = "O" if player == "X" else "X"
+    return positions
+
+
+def serve(service, positions):
+    """Seconds per request over the whole stream, and per hit and per miss"""
+    hit_time = miss_time = 0.0
+    clock = time.perf_counter
+    for board in positions:
+        misses = service.cache.misses
+        start = clock()
+        service.best_moves(board)
+        elapsed = clock() - start
+        if service.cache.misses != misses:
+            miss_time += elapsed
+        else:
+            hit_time += elapsed
+    stats = service.cache.stats()
+    return {
+        **stats,
+        "hit_us": round(hit_time / max(stats["hits"], 1) * 1e6, 2),
+        "miss_us": round(miss_time / max(stats["misses"], 1) * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=5000)
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    positions = request_stream(args.games, args.seed)
+    results = {"requests": len(positions)}
+    for name, service_class in (("canonical", HintService), ("raw", RawKeyService)):
+        result = results[name] = serve(service_class(cache_size=args.cache_size), positions)
+        print(f"{name:>9} key: {result['hit_rate']:.1%} hit rate, {result['size']} entries, "
+              f"{result['evictions']} evictions; hit {result['hit_us']:.1f} us, miss {result['miss_us']:.1f} us")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Join latency: connect-to-welcome and connect-to-first-move, per server.
+
+Pairs of players join one after another. For each pair it records how long
+each player waits between connecting and getting its welcome, and how long
+it takes from the second player connecting until X's opening move comes
+back from the server. Both players of a pair connect before either waits:
+the async server only welcomes a player once the lobby has matched it.
+
+    python benchmarks/bench_join.py
+    python benchmarks/bench_join.py --server thread --games 200
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_server import AsyncTicTacToeServer
+from protocol import FrameDecoder, decode_message, encode_message
+from server import TicTacToeServer
+
+from bench_async_server import percentile, wait_for_port
+
+
+def run_server(kind, port):
+    # both servers log every connection
+    sys.stdout = open(os.devnull, "w")
+    # each X leaves for good, so O should be told at once; and no pings
+    options = {"host": "127.0.0.1", "port": port, "grace_period": 0, "ping_interval": None}
+    if kind == "thread":
+        TicTacToeServer(**options).start()
+    else:
+        AsyncTicTacToeServer(**options).start()
+
+
+class Player:
+    """A blocking client that can wait for a given message type"""
+
+    def __init__(self, port, codec):
+        self.sock = socket.create_connection(("127.0.0.1", port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.decoder = FrameDecoder()
+        self.messages = deque()
+        self.sock.sendall(encode_message({"type": "hello", "codecs": [codec]}))
+
+    def wait_for(self, *types):
+        while True:
+            while self.messages:
+                message = self.messages.popleft()
+                if message["type"] in types:
+                    return message
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("server closed the connection")
+            self.messages.extend(decode_message(frame) for frame in self.decoder.feed(chunk))
+
+    def send(self, message):
+        self.sock.sendall(encode_message(message))
+
+    def close(self):
+        self.sock.close()
+
+
+def connect(port, codec):
+    """A new player and the time it connected"""
+    start = time.perf_counter()
+    return Player(port, codec), start
+
+
+def seat(port, codec, player, start):
+    """Wait for player's welcome, reconnecting while the server is full.
+
+    Returns the seated player, when it connected, its seconds to welcome,
+    and the retries.
+    """
+    retries = 0
+    while player.wait_for("welcome", "server_full")["type"] != "welcome":
+        # the threaded server may not have freed the last pair's seats yet
+        player.close()
+        retries += 1
+        time.sleep(0.001)
+        player, start = connect(port, codec)
+    return player, start, time.perf_counter() - start, retries
+
+
+def play_opening(port, codec):
+    x, x_start = connect(port, codec)
+    o, o_start = connect(port, codec)
+    x, _, x_join, x_retries = seat(port, codec, x, x_start)
+    o, o_start, o_join, o_retries = seat(port, codec, o, o_start)
+    x.wait_for("start_game")
+    x.send({"type": "move", "position": [1, 1]})
+    x.wait_for("update_board")
+    first_move = time.perf_counter() - o_start
+    x.close()
+    o.wait_for("opponent_disconnected")
+    o.close()
+    return [x_join, o_join], first_move, x_retries + o_retries
+
+
+def bench(kind, port, games, codec):
+    server = multiprocessing.Process(target=run_server, args=(kind, port), daemon=True)
+    server.start()
+    try:
+        wait_for_port(port)
+        joins, first_moves, retries = [], [], 0
+        for _ in range(games):
+            join_times, first_move, game_retries = play_opening(port, codec)
+            joins.extend(join_times)
+            first_moves.append(first_move)
+            retries += game_retries
+    finally:
+        server.terminate()
+        server.join()
+    return {
+        "server": kind,
+        "games": games,
+        "codec": codec,
+        "join_p50_ms": round(percentile(joins, 50) * 1000, 3),
+        "join_p99_ms": round(percentile(joins, 99) * 1000, 3),
+        "first_move_p50_ms": round(percentile(first_moves, 50) * 1000, 3),
+        "first_move_p99_ms": round(percentile(first_moves, 99) * 1000, 3),
+        "retries": retries,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--server", choices=["thread", "async", "both"], default="both")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--port", type=int, default=5601)
+    parser.add_argument("--codec", choices=["json", "binary"], default="binary")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    kinds = ["thread", "async"] if args.server == "both" else [args.server]
+    results = []
+    for offset, kind in enumerate(kinds):
+        result = bench(kind, args.port + offset, args.games, args.codec)
+        results.append(result)
+        print(f"{kind:>6}: join p50 {result['join_p50_ms']:.2f} ms  p99 {result['join_p99_ms']:.2f} ms  "
+              f"connect-to-first-move p50 {result['first_move_p50_ms']:.2f} ms  "
+              f"p99 {result['first_move_p99_ms']:.2f} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
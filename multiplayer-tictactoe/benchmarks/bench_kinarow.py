@@ -0,0 +1,155 @@
+"""Win check per move on big k-in-a-row boards: full scan vs lines through the move vs run lengths.
+
+Random games are played out to the first win or a full board, and each
+one is replayed on three boards that differ only in how they answer "did
+that move win?":
+
+* scan: test every k-long line on the board, as a check_winner written for
+  N x N would;
+* lines: test the k-long lines through the last move (as KBoard.wins_at);
+* runs: GridState itself, which keeps run lengths per direction and reads
+  two neighbours per direction.
+
+Each board is timed against a fourth that places marks and checks nothing,
+and the difference is reported as the cost of the check per move.
+
+    python benchmarks/bench_kinarow.py
+    python benchmarks/bench_kinarow.py --board 15x5 --board 19x5 --board 19x7
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from grid_state import GridState
+from kboard import get_geometry
+
+BOARDS = ("15x5", "19x5")
+
+
+def random_games(size, k, count, seed):
+    """Move orders (cells) of random games, cut at the winning move"""
+    rng = random.Random(seed)
+    games = []
+    for _ in range(count):
+        cells = list(range(size * size))
+        rng.shuffle(cells)
+        state = GridState(size, k)
+        for moves, cell in enumerate(cells, 1):
+            state.place(cell % size, cell // size, "X" if moves % 2 else "O")
+            if state.won:
+                break
+        games.append(cells[:moves])
+    return games
+
+
+class MaskState(GridState):
+    """A GridState that only keeps the masks; subclasses add a win check"""
+
+    def place(self, x, y, player):
+        size = self.size
+        if not (0 <= x < size and 0 <= y < size):
+            return False
+        cell = y * size + x
+        bit = 1 << cell
+        if (self.x_mask | self.o_mask) & bit:
+            return False
+        if player == "X":
+            mask = self.x_mask = self.x_mask | bit
+        else:
+            mask = self.o_mask = self.o_mask | bit
+        self.moves += 1
+        if self.won is None and self.check(mask, cell):
+            self.won = player
+        return True
+
+    def check(self, mask, cell):
+        return False
+
+
+class ScanState(MaskState):
+    def __init__(self, size, k):
+        super().__init__(size, k)
+        self.lines = get_geometry(size, k).lines
+
+    def check(self, mask, cell):
+        for line in self.lines:
+            if mask & line == line:
+                return True
+        return False
+
+
+class LinesState(MaskState):
+    def __init__(self, size, k):
+        super().__init__(size, k)
+        self.lines_through = get_geometry(size, k).lines_through
+
+    def check(self, mask, cell):
+        for line in self.lines_through[cell]:
+            if mask & line == line:
+                return True
+        return False
+
+
+def replay(board_class, size, k, games):
+    """Number of games that ended in a win"""
+    wins = 0
+    for game in games:
+        state = board_class(size, k)
+        for ply, cell in enumerate(game):
+            player = "O" if ply & 1 else "X"
+            state.place(cell % size, cell // size, player)
+            if state.has_won(player):
+                wins += 1
+    return wins
+
+
+# the baseline first: the check costs are measured against it
+METHODS = {"none": MaskState, "scan": ScanState, "lines": LinesState, "runs": GridState}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--board", action="append", help=f"SIZExK, repeatable (default: {' '.join(BOARDS)})")
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5, help="replays per method; the fastest counts")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.board or BOARDS:
+        size, k = (int(part) for part in name.split("x"))
+        games = random_games(size, k, args.games, args.seed)
+        moves = sum(len(game) for game in games)
+        board = results[name] = {"games": len(games), "moves": moves}
+        best = dict.fromkeys(METHODS, float("inf"))
+        wins = {}
+        for _ in range(args.repeat):
+            for method, board_class in METHODS.items():
+                start = time.perf_counter()
+                wins[method] = replay(board_class, size, k, games)
+                best[method] = min(best[method], time.perf_counter() - start)
+        # every real check must find the same wins
+        assert wins["scan"] == wins["lines"] == wins["runs"], wins
+        base = best["none"] / moves * 1e9
+        board["place_ns"] = round(base, 1)
+        for method in ("scan", "lines", "runs"):
+            board[f"{method}_check_ns"] = round(best[method] / moves * 1e9 - base, 1)
+        print(f"{size}x{size} k={k}: {len(games)} games, {moves} moves, placing a mark {base:,.0f} ns; "
+              f"win check per move: scan {board['scan_check_ns']:,.0f} ns, "
+              f"lines {board['lines_check_ns']:,.0f} ns, runs {board['runs_check_ns']:,.0f} ns "
+              f"(x{board['scan_check_ns'] / board['runs_check_ns']:.0f} vs scan, "
+              f"x{board['lines_check_ns'] / board['runs_check_ns']:.1f} vs lines)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Lobby matching cost as the number of waiting players grows.
+
+Fills the lobby with players spread far enough apart in rating that none of
+them can be paired with each other, then times newcomers who each match one
+of them. Every matched player is replaced so the queue depth stays put.
+A share of the waiting players also leave the queue along the way, as
+players who give up waiting would.
+
+    python benchmarks/bench_lobby.py --waiting 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lobby import GAME_MODES, Lobby
+
+WINDOW = 100
+
+
+def bench(waiting, matches, cancel_rate, seed):
+    rng = random.Random(seed)
+    lobby = Lobby(rating_window=WINDOW)
+    # slot i waits at rating i * 3 * WINDOW, out of reach of every other slot
+    slots = []
+    for i in range(waiting):
+        conn = ("waiting", i, 0)
+        slots.append(conn)
+        lobby.enqueue(conn, GAME_MODES[i % len(GAME_MODES)], i * 3 * WINDOW)
+
+    elapsed = 0.0
+    for n in range(matches):
+        i = rng.randrange(waiting)
+        mode = GAME_MODES[i % len(GAME_MODES)]
+        rating = i * 3 * WINDOW
+        if rng.random() < cancel_rate:
+            # the waiting player gives up and someone else takes the slot
+            lobby.remove(slots[i])
+            slots[i] = ("waiting", i, n + 1)
+            lobby.enqueue(slots[i], mode, rating)
+        start = time.perf_counter()
+        opponent = lobby.enqueue(("newcomer", n), mode, rating + WINDOW // 2)
+        elapsed += time.perf_counter() - start
+        assert opponent == slots[i]
+        slots[i] = ("waiting", i, n + 1)
+        lobby.enqueue(slots[i], mode, rating)
+
+    stats = lobby.stats()
+    return {
+        "waiting": waiting,
+        "matches": matches,
+        "enqueue_to_match_us": round(elapsed / matches * 1e6, 3),
+        "queue_depth": stats["queue_depth"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--waiting", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--matches", type=int, default=50000)
+    parser.add_argument("--cancel-rate", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for waiting in args.waiting:
+        result = bench(waiting, args.matches, args.cancel_rate, args.seed)
+        results.append(result)
+        print(f"{waiting:>7} waiting: {result['enqueue_to_match_us']:6.2f} us from enqueue to match  "
+              f"depth {result['queue_depth']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Moves per second through Room with the match log off and at each durability setting.
+
+Rooms play random 3x3 games through handle_message, exactly as the server
+drives them, with connections that drop what they are sent. The same games
+are replayed with no log, a log the OS is left to flush, group commits at
+a few fsync intervals, and an fsync after every record. The log file is
+then recovered to check that replay rebuilds every room.
+
+    python benchmarks/bench_match_log.py
+    python benchmarks/bench_match_log.py --moves 20000 --interval 0.005 --interval 0.05
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from codec import JSON
+from match_log import MatchLog, recover
+from room import Room
+
+INTERVALS = (0.01, 0.1)
+
+
+class NullConnection:
+    codec = JSON
+
+    def send(self, message):
+        pass
+
+    def send_frame(self, frame):
+        pass
+
+
+def random_moves(count, rooms, seed):
+    """(room index, cell) pairs that make legal random games, rooms interleaved"""
+    rng = random.Random(seed)
+    boards = [Room(index) for index in range(rooms)]
+    for room in boards:
+        room.seat(NullConnection())
+        room.seat(NullConnection())
+        room.started = True
+    moves = []
+    while len(moves) < count:
+        index = rng.randrange(rooms)
+        room = boards[index]
+        if room.game_over:
+            room.handle_restart()
+            moves.append((index, None))
+            continue
+        x, y = rng.choice([(x, y) for y in range(3) for x in range(3) if room.is_valid_move(x, y)])
+        room.apply_move(x, y, room.current_player)
+        moves.append((index, (x, y)))
+    return moves
+
+
+def play(moves, rooms, log):
+    """Seconds to push moves through fresh rooms, and the rooms"""
+    boards = []
+    for index in range(rooms):
+        room = Room(index + 1, "best_of_3")
+        room.log = log
+        if log is not None:
+            log.open_room(room.room_id, room.game_mode)
+        room.add_player(NullConnection())
+        room.add_player(NullConnection())
+        boards.append(room)
+    start = time.perf_counter()
+    for index, position in moves:
+        room = boards[index]
+        if position is None:
+            room.handle_message(room.players["X"], {"type": "restart"})
+        else:
+            player = room.current_player
+            room.handle_message(room.players[player], {"type": "move", "position": position, "seq": room.seq})
+    return time.perf_counter() - start, boards
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--moves", type=int, default=20000)
+    parser.add_argument("--rooms", type=int, default=100)
+    parser.add_argument("--interval", type=float, action="append",
+                        help=f"group-commit fsync interval in seconds, repeatable (default: {INTERVALS})")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per setting; the fastest counts")
+    parser.add_argument("--fsync-moves", type=int, default=2000,
+                        help="moves for the fsync-every-record run, which is far slower")
+    parser.add_argument("--dir", help="where to put the log (default: a temporary directory)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    moves = random_moves(args.moves, args.rooms, args.seed)
+    settings = [("no log", False, args.moves), ("no fsync", None, args.moves)]
+    settings += [(f"fsync every {interval * 1000:g} ms", interval, args.moves) for interval in args.interval or INTERVALS]
+    settings.append(("fsync every record", 0, min(args.fsync_moves, args.moves)))
+
+    results = {}
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        for name, interval, count in settings:
+            path = os.path.join(directory, "matches.log")
+            best = float("inf")
+            for _ in range(args.repeat):
+                if os.path.exists(path):
+                    os.remove(path)
+                log = None if interval is False else MatchLog(path, interval)
+                elapsed, rooms = play(moves[:count], args.rooms, log)
+                if log is not None:
+                    log.close()
+                best = min(best, elapsed)
+            result = results[name] = {"moves": count, "moves_per_sec": round(count / best)}
+            line = f"{name:>20}: {count / best:>10,.0f} moves/s"
+            if log is not None:
+                result.update(log.stats())
+                restored, _ = recover(path)
+                # replay must land every room exactly where play left it
+                for room in rooms:
+                    assert restored[room.room_id].snapshot()["board"] == room.snapshot()["board"]
+                    assert restored[room.room_id].round_num == room.round_num
+                line += f", {log.records:,} records, {log.syncs:,} fsyncs"
+            print(line)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""MCTS playouts per second, from one worker process up to N.
+
+    python benchmarks/bench_mcts.py
+    python benchmarks/bench_mcts.py --board 7x5 --max-workers 8 --budget 2
+
+Root parallelisation needs no shared state, so playouts/sec should grow
+close to linearly with workers until they outnumber the cores. Each pool
+is warmed up first so process start-up is not counted.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kboard import KBoard
+from mcts import MCTSEngine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--board", default="5x4", help="SIZExK")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds per search")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    size, k = (int(part) for part in args.board.split("x"))
+    board = KBoard(size, k)
+
+    print(f"{size}x{size} k={k}, {args.budget}s per search, {os.cpu_count()} cores")
+    results = []
+    base_rate = None
+    for workers in range(1, args.max_workers + 1):
+        engine = MCTSEngine(workers, seed=args.seed)
+        try:
+            engine.search(board, time_budget=0.05)
+            result = engine.search(board, time_budget=args.budget)
+        finally:
+            engine.close()
+        rate = result.playouts / result.elapsed
+        base_rate = base_rate or rate
+        print(f"{workers:>3} workers: {result.playouts:>9} playouts, {rate:>11,.0f}/s, "
+              f"x{rate / base_rate:.2f}, move {result.move}")
+        results.append({"workers": workers, "playouts": result.playouts,
+                        "playouts_per_sec": round(rate), "speedup": round(rate / base_rate, 3)})
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"board": args.board, "budget": args.budget, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
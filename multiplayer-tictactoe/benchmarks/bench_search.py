@@ -0,0 +1,81 @@
+"""Alpha-beta search speed: nodes per second and time to reach each depth.
+
+    python benchmarks/bench_search.py
+    python benchmarks/bench_search.py --budget 5 --board 5x4
+
+Each board is searched from the empty position under the time budget. The
+3x3 board is also checked against the tablebase: the search must find the
+same value and a best move for every sampled position.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kboard import KBoard
+from search import SearchEngine, board_from_state
+from tablebase import get_tablebase
+
+from bench_game_state import random_positions
+
+BOARDS = ("3x3", "4x3", "4x4", "5x4")
+
+
+def check_against_tablebase(positions, seed):
+    """Number of sampled 3x3 positions where search and tablebase disagree"""
+    table = get_tablebase()
+    engine = SearchEngine(time_budget=60)
+    checked = mismatches = 0
+    for state, _ in random_positions(positions, seed):
+        if state.winner() or state.is_full():
+            continue
+        result = engine.search(board_from_state(state))
+        sign = (result.score > 0) - (result.score < 0)
+        if sign != table.value(state) or result.move not in table.best_moves(state):
+            mismatches += 1
+        checked += 1
+    return checked, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--board", action="append", help=f"SIZExK, repeatable (default: {' '.join(BOARDS)})")
+    parser.add_argument("--budget", type=float, default=2.0, help="seconds per board")
+    parser.add_argument("--tt-size", type=int, default=1 << 18)
+    parser.add_argument("--positions", type=int, default=500, help="3x3 positions to check against the tablebase")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.board or BOARDS:
+        size, k = (int(part) for part in name.split("x"))
+        engine = SearchEngine(tt_size=args.tt_size)
+        result = engine.search(KBoard(size, k), time_budget=args.budget)
+        rate = result.nodes / result.elapsed if result.elapsed else 0.0
+        print(f"{size}x{size} k={k}: depth {result.depth}{' (solved)' if result.solved else ''}, "
+              f"move {result.move}, score {result.score}, {result.nodes} nodes, "
+              f"{rate:,.0f} nodes/s, TT hit rate {engine.table.hit_rate():.1%}")
+        for depth, elapsed, nodes in result.depth_times:
+            print(f"    depth {depth:>2}: {elapsed * 1000:9.1f} ms {nodes:>9} nodes")
+        results[name] = {
+            "depth": result.depth, "solved": result.solved, "move": result.move, "score": result.score,
+            "nodes": result.nodes, "nodes_per_sec": round(rate), "tt_hit_rate": round(engine.table.hit_rate(), 4),
+            "time_to_depth_ms": {depth: round(elapsed * 1000, 2) for depth, elapsed, _ in result.depth_times},
+        }
+
+    checked, mismatches = check_against_tablebase(args.positions, args.seed)
+    print(f"3x3 check: {checked} positions, {mismatches} disagree with the tablebase")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"boards": results, "tablebase_check": {"checked": checked, "mismatches": mismatches}},
+                      f, indent=2)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
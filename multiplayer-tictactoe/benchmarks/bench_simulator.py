@@ -0,0 +1,110 @@
+"""Batch simulator throughput against playing games one at a time.
+
+    python benchmarks/bench_simulator.py
+    python benchmarks/bench_simulator.py --games 10000000 --x-policy greedy --o-policy tablebase
+
+Two baselines play random games one move at a time, the way the game
+itself does. The first is the original singleplayer code: the nested-list
+grid and Board.grid_check / board_full from before the bitboard, as lifted
+into bench_game_state.py. The second is today's singleplayer Board,
+which plays on a GameState, with one get_mouse_input call per move; it is
+skipped without pygame. The batch is compared against both.
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_state import CELLS, SIZE
+from simulator import DEFAULT_BATCH, simulate
+
+from bench_game_state import legacy_board_full, legacy_grid_check
+from microbench import load_singleplayer_board
+
+
+def original_games_per_sec(games, seed):
+    """Random games through the original singleplayer move path: list grid, probing win check"""
+    rng = random.Random(seed)
+    devnull = open(os.devnull, "w")
+    start = time.perf_counter()
+    # the original grid_check printed after every move too
+    with contextlib.redirect_stdout(devnull):
+        for _ in range(games):
+            grid = [[0 for x in range(3)] for y in range(3)]
+            cells = list(range(CELLS))
+            rng.shuffle(cells)
+            user = "X"
+            for cell in cells:
+                x, y = cell % SIZE, cell // SIZE
+                if grid[y][x] == 0:
+                    grid[y][x] = user
+                    if legacy_grid_check(grid, x, y, user):
+                        print(user, 'is the winner')
+                        break
+                    print('no winner')
+                    if legacy_board_full(grid):
+                        break
+                user = "O" if user == "X" else "X"
+    return games / (time.perf_counter() - start)
+
+
+def baseline_games_per_sec(games, seed):
+    """Random games through singleplayer Board.get_mouse_input; None without pygame"""
+    singleplayer_board = load_singleplayer_board()
+    if singleplayer_board is None:
+        return None
+    rng = random.Random(seed)
+    devnull = open(os.devnull, "w")
+    start = time.perf_counter()
+    # get_mouse_input prints after every move
+    with contextlib.redirect_stdout(devnull):
+        for _ in range(games):
+            board = singleplayer_board.Board()
+            cells = list(range(CELLS))
+            rng.shuffle(cells)
+            user = "X"
+            for cell in cells:
+                board.get_mouse_input(cell % SIZE, cell // SIZE, user)
+                if board.gameover:
+                    break
+                user = "O" if user == "X" else "X"
+    return games / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH)
+    parser.add_argument("--x-policy", choices=["random", "greedy", "tablebase"], default="random")
+    parser.add_argument("--o-policy", choices=["random", "greedy", "tablebase"], default="random")
+    parser.add_argument("--baseline-games", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stats = simulate(args.games, args.x_policy, args.o_policy, args.batch, args.seed)
+    rate = args.games / (time.perf_counter() - start)
+    print(f"{args.x_policy} X vs {args.o_policy} O: {args.games} games, {rate:,.0f} games/s")
+    print(f"X {stats['x_wins'] / args.games:.1%}, O {stats['o_wins'] / args.games:.1%}, "
+          f"draw {stats['draws'] / args.games:.1%}, mean length {stats['mean_length']:.2f}")
+
+    original = original_games_per_sec(args.baseline_games, args.seed)
+    print(f"one at a time, original list board: {original:,.0f} games/s, batch is x{rate / original:.0f}")
+    baseline = baseline_games_per_sec(args.baseline_games, args.seed)
+    if baseline is not None:
+        print(f"one at a time, bitboard Board: {baseline:,.0f} games/s, batch is x{rate / baseline:.0f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"games_per_sec": round(rate), "original_games_per_sec": round(original),
+                       "baseline_games_per_sec": baseline and round(baseline), "stats": stats}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Tablebase build and open time, and the cost of one AI move.
+
+    python benchmarks/bench_tablebase.py
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai import DIFFICULTIES, AIPlayer
+from game_state import GameState
+from tablebase import Tablebase
+from tablebase_file import MappedTablebase, tablebase_entries, write_tablebase_file
+
+from bench_game_state import random_positions
+
+
+def play(x_player, o_player):
+    """One game between two AIs; returns 'X', 'O' or 'Draw'"""
+    state = GameState()
+    players = {"X": x_player, "O": o_player}
+    player = "X"
+    while True:
+        x, y = players[player].choose_move(state)
+        state.place(x, y, player)
+        if state.has_won(player):
+            return player
+        if state.is_full():
+            return "Draw"
+        player = "O" if player == "X" else "X"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    start = time.perf_counter()
+    table = Tablebase.build()
+    build_ms = (time.perf_counter() - start) * 1000
+
+    # only positions where the game is still going have a move to pick
+    states = [s for s, _ in random_positions(2000, args.seed) if not s.winner() and not s.is_full()]
+
+    def move_time(tablebase):
+        player = AIPlayer("X", "perfect", tablebase, rng)
+        start = time.perf_counter()
+        for state in states:
+            player.choose_cell(state)
+        return (time.perf_counter() - start) / len(states) * 1e9
+
+    move_ns = move_time(table)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tablebase.ttb")
+        write_tablebase_file(path, 3, 3, tablebase_entries(table))
+        file_bytes = os.path.getsize(path)
+        start = time.perf_counter()
+        mapped = MappedTablebase.open(path)
+        open_ms = (time.perf_counter() - start) * 1000
+        mapped_move_ns = move_time(mapped)
+        mapped.close()
+
+    # every difficulty as X against a perfect O
+    outcomes = {}
+    for difficulty in DIFFICULTIES:
+        x_player = AIPlayer("X", difficulty, table, rng)
+        o_player = AIPlayer("O", "perfect", table, rng)
+        tally = {"X": 0, "O": 0, "Draw": 0}
+        for _ in range(args.games):
+            tally[play(x_player, o_player)] += 1
+        outcomes[difficulty] = tally
+
+    print(f"build {build_ms:.1f} ms, {table.reachable()} reachable positions")
+    print(f"file: {mapped.count} canonical positions, {file_bytes} bytes, opened in {open_ms:.2f} ms")
+    print(f"AI move: {move_ns:.0f} ns in memory, {mapped_move_ns:.0f} ns from the file")
+    for difficulty, tally in outcomes.items():
+        print(f"{difficulty:>8} X vs perfect O: {tally}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"build_ms": round(build_ms, 2), "open_ms": round(open_ms, 3), "file_bytes": file_bytes,
+                       "reachable": table.reachable(), "move_ns": round(move_ns, 1),
+                       "mapped_move_ns": round(mapped_move_ns, 1), "outcomes": outcomes}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Ultimate tic-tac-toe: legal-move generation and random playouts per second.
+
+Compares UltimateState's per-board masks and precomputed move tables with
+the straightforward 9x9 list-of-lists version below, which works out which
+small boards are closed and scans the grid for every call. Both must agree
+on every sampled position before anything is timed.
+
+    python benchmarks/bench_ultimate.py
+    python benchmarks/bench_ultimate.py --positions 5000 --playouts 50000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_state import WIN_LINES
+from ultimate import POSITIONS, UltimateState, playout
+
+LINES = [[cell for cell in range(9) if line >> cell & 1] for line in WIN_LINES]
+
+
+def naive_board_status(grid, board):
+    """'X' or 'O' if that player won the small board, 'full', or None if still open"""
+    left, top = board % 3 * 3, board // 3 * 3
+    cells = [grid[top + cell // 3][left + cell % 3] for cell in range(9)]
+    for a, b, c in LINES:
+        if cells[a] and cells[a] == cells[b] == cells[c]:
+            return cells[a]
+    return "full" if all(cells) else None
+
+
+def naive_legal_moves(grid, last_move):
+    """(x, y) moves, working everything out from the grid"""
+    status = [naive_board_status(grid, board) for board in range(9)]
+    forced = None
+    if last_move is not None:
+        x, y = last_move
+        forced = y % 3 * 3 + x % 3
+        if status[forced] is not None:
+            forced = None
+    return [(x, y) for y in range(9) for x in range(9)
+            if not grid[y][x] and status[y // 3 * 3 + x // 3] is None
+            and (forced is None or y // 3 * 3 + x // 3 == forced)]
+
+
+def naive_winner(grid):
+    big = [naive_board_status(grid, board) for board in range(9)]
+    for a, b, c in LINES:
+        if big[a] in ("X", "O") and big[a] == big[b] == big[c]:
+            return big[a]
+    return None
+
+
+def naive_playout(grid, last_move, player, rng):
+    grid = [list(row) for row in grid]
+    while True:
+        moves = naive_legal_moves(grid, last_move)
+        if not moves:
+            return None
+        x, y = last_move = moves[int(rng.random() * len(moves))]
+        grid[y][x] = player
+        if naive_winner(grid):
+            return player
+        player = "O" if player == "X" else "X"
+
+
+def random_positions(count, seed):
+    """Unfinished UltimateStates from random games, 0 to 60 moves in"""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        state = UltimateState()
+        for _ in range(rng.randint(0, 60)):
+            moves = state.legal_moves()
+            if not moves:
+                break
+            state.play(rng.choice(moves), state.to_move())
+            if state.won:
+                break
+        if state.won is None and not state.is_full():
+            positions.append(state)
+    return positions
+
+
+def timed(func, args, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for a in args:
+            func(*a)
+    return (time.perf_counter() - start) / (repeat * len(args))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--positions", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--playouts", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    positions = random_positions(args.positions, args.seed)
+    grids = [(state.to_rows(), state.last_move) for state in positions]
+    for state, (grid, last_move) in zip(positions, grids):
+        assert sorted(POSITIONS[move] for move in state.legal_moves()) == sorted(naive_legal_moves(grid, last_move))
+
+    bitboard_ns = timed(UltimateState.legal_moves, [(state,) for state in positions], args.repeat) * 1e9
+    naive_ns = timed(naive_legal_moves, grids, max(1, args.repeat // 10)) * 1e9
+    print(f"legal moves: bitboard {bitboard_ns:,.0f} ns, naive {naive_ns:,.0f} ns per position "
+          f"(x{naive_ns / bitboard_ns:.0f})")
+
+    rng = random.Random(args.seed)
+    start_state = UltimateState()
+    start = time.perf_counter()
+    results = [playout(start_state, rng) for _ in range(args.playouts)]
+    bitboard_rate = args.playouts / (time.perf_counter() - start)
+    naive_games = max(1, args.playouts // 50)
+    empty = start_state.to_rows()
+    start = time.perf_counter()
+    for _ in range(naive_games):
+        naive_playout(empty, None, "X", rng)
+    naive_rate = naive_games / (time.perf_counter() - start)
+    outcome = {symbol: results.count(symbol) / len(results) for symbol in ("X", "O", None)}
+    print(f"playouts from the empty board: bitboard {bitboard_rate:,.0f}/s, naive {naive_rate:,.0f}/s "
+          f"(x{bitboard_rate / naive_rate:.0f}); X {outcome['X']:.1%}, O {outcome['O']:.1%}, "
+          f"draw {outcome[None]:.1%}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"legal_moves_ns": round(bitboard_ns, 1), "naive_legal_moves_ns": round(naive_ns, 1),
+                       "playouts_per_sec": round(bitboard_rate, 1), "naive_playouts_per_sec": round(naive_rate, 1),
+                       "x_win_rate": round(outcome["X"], 4), "o_win_rate": round(outcome["O"], 4),
+                       "draw_rate": round(outcome[None], 4)}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
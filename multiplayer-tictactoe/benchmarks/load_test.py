@@ -0,0 +1,117 @@
+"""Load test: N concurrent games played by headless bots.
+
+Starts async_server.py in a child process (or targets --host/--port with
+--no-server) and plays N games at once, two BotClients each, with the
+given think time and chat rate. Reports moves/sec, games/sec and latency
+percentiles for move -> update_board and connect -> start_game.
+
+    python benchmarks/load_test.py --games 1000
+    python benchmarks/load_test.py --games 500 --rounds 5 --think-ms 50 --chat-rate 0.5 --json load.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_client import BotClient, BotStats
+from lobby import GAME_MODES
+
+from bench_async_server import percentile, raise_fd_limit, run_server, wait_for_port
+
+
+def latency_summary(samples):
+    return {
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p90_ms": round(percentile(samples, 90) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3) if samples else 0.0,
+        "samples": len(samples),
+    }
+
+
+async def run_bots(args):
+    stats = BotStats()
+    rng = random.Random(args.seed)
+    tasks = []
+    start = time.perf_counter()
+    for first in range(0, args.games * 2, args.batch):
+        for _ in range(min(args.batch, args.games * 2 - first)):
+            bot = BotClient(stats, args.host, args.port, args.game_mode, args.rounds,
+                            args.think_ms / 1000.0, args.chat_rate, args.codec,
+                            random.Random(rng.random()))
+            tasks.append(asyncio.ensure_future(bot.run()))
+        # let the accept queue drain before the next burst of SYNs
+        await asyncio.sleep(0)
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    stats.errors = sum(1 for r in results if isinstance(r, Exception))
+    return {
+        "games_requested": args.games * args.rounds,
+        "concurrent_games": args.games,
+        "game_mode": args.game_mode,
+        "codec": args.codec,
+        "think_ms": args.think_ms,
+        "chat_rate": args.chat_rate,
+        "elapsed_s": round(elapsed, 4),
+        "games": stats.games,
+        "moves": stats.moves,
+        "chats": stats.chats,
+        "errors": stats.errors,
+        "games_per_sec": round(stats.games / elapsed, 1) if elapsed else 0.0,
+        "moves_per_sec": round(stats.moves / elapsed, 1) if elapsed else 0.0,
+        "move_to_update_board": latency_summary(stats.move_latencies),
+        "connect_to_start_game": latency_summary(stats.start_latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=1000, help="games played at the same time")
+    parser.add_argument("--rounds", type=int, default=1, help="games each pair plays in a row")
+    parser.add_argument("--game-mode", choices=GAME_MODES, default="single_game")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="mean time a bot thinks per move")
+    parser.add_argument("--chat-rate", type=float, default=0.0, help="chat messages per second per bot")
+    parser.add_argument("--codec", choices=["json", "binary"], default="binary")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5602)
+    parser.add_argument("--no-server", action="store_true", help="use a server that is already running")
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    raise_fd_limit()
+
+    server = None
+    if not args.no_server:
+        server = multiprocessing.Process(target=run_server, args=(args.port,), daemon=True)
+        server.start()
+    try:
+        wait_for_port(args.port)
+        result = asyncio.run(run_bots(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.join()
+
+    move, start = result["move_to_update_board"], result["connect_to_start_game"]
+    print(f"{result['games']} games, {result['moves']} moves, {result['chats']} chats "
+          f"in {result['elapsed_s']:.2f} s  errors {result['errors']}")
+    print(f"{result['games_per_sec']:.1f} games/s  {result['moves_per_sec']:.1f} moves/s")
+    print(f"move -> update_board   p50 {move['p50_ms']:.2f} ms  p90 {move['p90_ms']:.2f} ms  "
+          f"p99 {move['p99_ms']:.2f} ms")
+    print(f"connect -> start_game  p50 {start['p50_ms']:.2f} ms  p90 {start['p90_ms']:.2f} ms  "
+          f"p99 {start['p99_ms']:.2f} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
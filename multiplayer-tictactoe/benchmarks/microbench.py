@@ -0,0 +1,289 @@
+"""Microbenchmarks for the game logic and protocol hot paths.
+
+Each case is timed with timeit: the loop count is calibrated once, then the
+fastest of --repeat runs is kept, so numbers are comparable between runs on
+the same machine. Results are written as JSON (ns per operation), and
+--baseline compares against an earlier run and exits non-zero if any case
+got slower by more than --threshold.
+
+    python benchmarks/microbench.py --json baseline.json
+    # ... change something ...
+    python benchmarks/microbench.py --baseline baseline.json --threshold 0.10
+
+Cases that need pygame (singleplayer/board.py) are skipped when it is not
+installed.
+"""
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import platform
+import random
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from board import Board
+from codec import BINARY, JSON
+from game_state import GameState
+from protocol import FrameDecoder, decode_message, encode_message
+from room import Room
+
+from bench_fanout import NullConnection
+from bench_game_state import random_positions
+
+# X wins on the diagonal after five moves
+SCRIPTED_GAME = [((0, 0), "X"), ((1, 0), "O"), ((1, 1), "X"), ((2, 0), "O"), ((2, 2), "X")]
+
+BROADCAST_MESSAGES = [
+    {"type": "update_board", "position": [2, 2], "player": "X"},
+    {"type": "next_turn", "player": "O"},
+    {"type": "game_over", "winner": "X"},
+    {"type": "chat_message", "player": "X", "text": "good game"},
+]
+
+
+def seated_room(codecs=(BINARY, JSON)):
+    room = Room(1)
+    for codec in codecs:
+        room.add_player(NullConnection(codec))
+    return room
+
+
+def room_cases(positions):
+    """Room.check_winner / is_valid_move / is_board_full (the server's checks)"""
+    rooms = []
+    rng = random.Random(len(positions))
+    for state, (_, _, player) in positions[:64]:
+        room = Room(1)
+        room.board = state.copy()
+        rooms.append((room, rng.randrange(3), rng.randrange(3), player))
+
+    def check_winner():
+        for room, _, _, player in rooms:
+            room.check_winner(player)
+
+    def is_valid_move():
+        for room, x, y, _ in rooms:
+            room.is_valid_move(x, y)
+
+    def is_board_full():
+        for room, _, _, _ in rooms:
+            room.is_board_full()
+
+    n = len(rooms)
+    return {
+        "server.check_winner": (check_winner, n),
+        "server.is_valid_move": (is_valid_move, n),
+        "server.is_board_full": (is_board_full, n),
+    }
+
+
+def client_board_cases():
+    """board.Board.get_mouse_input and clear_board, as the client drives them"""
+    board = Board()
+    cells = [(x, y) for y in range(3) for x in range(3)]
+
+    def fill_and_clear():
+        player = "X"
+        for x, y in cells:
+            board.get_mouse_input(x, y, player)
+            player = "O" if player == "X" else "X"
+        board.clear_board()
+
+    def clear_board():
+        board.clear_board()
+
+    return {
+        "client.get_mouse_input": (fill_and_clear, len(cells)),
+        "client.clear_board": (clear_board, 1),
+    }
+
+
+def load_singleplayer_board():
+    """The singleplayer/board.py module, or None if pygame can't load it"""
+    path = os.path.join(ROOT, "singleplayer", "board.py")
+    spec = importlib.util.spec_from_file_location("singleplayer_board", path)
+    singleplayer_board = importlib.util.module_from_spec(spec)
+    cwd = os.getcwd()
+    try:
+        # the module loads its images relative to the working directory
+        os.chdir(ROOT)
+        spec.loader.exec_module(singleplayer_board)
+    except (ImportError, RuntimeError, OSError) as e:
+        print(f"skipping singleplayer cases: {e}")
+        return None
+    finally:
+        os.chdir(cwd)
+    return singleplayer_board
+
+
+def singleplayer_cases(positions):
+    """singleplayer Board.grid_check and board_full; needs pygame"""
+    singleplayer_board = load_singleplayer_board()
+    if singleplayer_board is None:
+        return {}
+
+    boards = []
+    for state, (x, y, player) in positions[:64]:
+        board = singleplayer_board.Board()
+        board.state = state.copy()
+        boards.append((board, x, y, player))
+    devnull = open(os.devnull, "w")
+
+    def grid_check():
+        # grid_check prints the winner
+        with contextlib.redirect_stdout(devnull):
+            for board, x, y, player in boards:
+                board.grid_check(x, y, player)
+
+    def board_full():
+        for board, _, _, _ in boards:
+            board.board_full()
+
+    return {
+        "singleplayer.grid_check": (grid_check, len(boards)),
+        "singleplayer.board_full": (board_full, len(boards)),
+    }
+
+
+def protocol_cases():
+    """Room.broadcast encoding, and the client's receive_messages decode loop"""
+    room = seated_room()
+    stream = {
+        codec.name: b"".join(encode_message(dict(m, seq=i), codec) for i, m in enumerate(BROADCAST_MESSAGES))
+        for codec in (JSON, BINARY)
+    }
+
+    def broadcast():
+        for message in BROADCAST_MESSAGES:
+            room.broadcast(message)
+
+    def receive(codec_name):
+        data = stream[codec_name]
+
+        def run():
+            decoder = FrameDecoder()
+            for frame in decoder.feed(data):
+                decode_message(frame)
+        return run
+
+    def encode(codec):
+        def run():
+            for message in BROADCAST_MESSAGES:
+                encode_message(message, codec)
+        return run
+
+    n = len(BROADCAST_MESSAGES)
+    return {
+        "protocol.broadcast": (broadcast, n),
+        "protocol.encode_json": (encode(JSON), n),
+        "protocol.encode_binary": (encode(BINARY), n),
+        "protocol.receive_json": (receive("json"), n),
+        "protocol.receive_binary": (receive("binary"), n),
+    }
+
+
+def game_cases():
+    """A whole game through Room.handle_message, then a restart"""
+    room = seated_room()
+    players = {symbol: conn for symbol, conn in room.players.items()}
+
+    def full_game():
+        for (x, y), symbol in SCRIPTED_GAME:
+            room.handle_message(players[symbol], {"type": "move", "position": [x, y]})
+        room.handle_message(players["X"], {"type": "restart"})
+
+    def state_game():
+        state = GameState()
+        for (x, y), symbol in SCRIPTED_GAME:
+            state.place(x, y, symbol)
+            state.has_won(symbol)
+            state.is_full()
+
+    return {
+        "game.room_full_game": (full_game, 1),
+        "game.state_full_game": (state_game, 1),
+    }
+
+
+def collect_cases(seed):
+    positions = random_positions(256, seed)
+    random.Random(seed).shuffle(positions)
+    cases = {}
+    cases.update(room_cases(positions))
+    cases.update(client_board_cases())
+    cases.update(singleplayer_cases(positions))
+    cases.update(protocol_cases())
+    cases.update(game_cases())
+    return cases
+
+
+def time_case(func, ops, repeat):
+    """Fastest of repeat runs, in ns per operation"""
+    timer = timeit.Timer(func)
+    loops, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=loops))
+    return best / (loops * ops) * 1e9
+
+
+def compare(results, baseline, threshold):
+    """Print the change for each case; returns the names that regressed"""
+    regressed = []
+    for name, ns in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:>28}: {ns:10.1f} ns/op  (new)")
+            continue
+        change = ns / before - 1.0
+        flag = ""
+        if change > threshold:
+            regressed.append(name)
+            flag = "  REGRESSED"
+        print(f"{name:>28}: {ns:10.1f} ns/op  baseline {before:10.1f}  {change:+7.1%}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="results file from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed slowdown against the baseline, as a fraction")
+    args = parser.parse_args()
+
+    cases = {name: case for name, case in collect_cases(args.seed).items() if args.filter in name}
+    results = {}
+    for name, (func, ops) in cases.items():
+        results[name] = round(time_case(func, ops, args.repeat), 2)
+
+    regressed = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressed = compare(results, baseline.get("results", baseline), args.threshold)
+    else:
+        for name, ns in results.items():
+            print(f"{name:>28}: {ns:10.1f} ns/op")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": results,
+            }, f, indent=2)
+
+    if regressed:
+        print(f"{len(regressed)} case(s) regressed by more than {args.threshold:.0%}: {', '.join(regressed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
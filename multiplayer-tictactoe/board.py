@@ -1,10 +1,13 @@
+from game_state import GameState
+
 class Board:
     def __init__(self):
-        self.grid_matrix = [["" for x in range(3)] for y in range(3)]
+        # Marks are kept as bitmasks; grid_matrix is a view built on demand
+        self.state = GameState()
         self.switch_user = False
         self.gameover = False
         self.y_offset = 0  # This will be set by the client
-        
+
         # Define grid lines
         self.gridlines = [
             # Vertical lines
@@ -14,35 +17,44 @@ class Board:
             ((0, 200), (600, 200)),
             ((0, 400), (600, 400))
         ]
-    
+
+    @property
+    def grid_matrix(self):
+        """The board as a 3x3 nested list of "X", "O" and "" """
+        return self.state.to_rows()
+
+    @grid_matrix.setter
+    def grid_matrix(self, rows):
+        self.state = GameState.from_rows(rows)
+
     def get_cell_val(self, x, y):
         """Get the value of a cell"""
         if 0 <= x < 3 and 0 <= y < 3:
-            return self.grid_matrix[y][x]
+            return self.state.get(x, y)
         return None
-    
+
     def set_cell_val(self, x, y, val):
         """Set the value of a cell"""
         if 0 <= x < 3 and 0 <= y < 3:
-            self.grid_matrix[y][x] = val
+            self.state.clear_cell(x, y)
+            if val:
+                self.state.place(x, y, val)
             return True
         return False
-    
+
     def get_mouse_input(self, x, y, user):
         """Handle mouse input and update board"""
-        if 0 <= x < 3 and 0 <= y < 3:
-            if self.grid_matrix[y][x] == "":
-                self.grid_matrix[y][x] = user
-                self.switch_user = True
-                return True
+        if self.state.place(x, y, user):
+            self.switch_user = True
+            return True
         return False
-    
+
     def clear_board(self):
         """Reset the board"""
-        self.grid_matrix = [["" for x in range(3)] for y in range(3)]
+        self.state.clear()
         self.switch_user = False
         self.gameover = False
-    
+
     def board_full(self):
         """Check if board is full"""
-        return all(cell != "" for row in self.grid_matrix for cell in row) 
\ No newline at end of file
+        return self.state.is_full()
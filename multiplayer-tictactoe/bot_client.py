@@ -0,0 +1,249 @@
+"""Headless client that plays over the network protocol without pygame.
+
+A BotClient connects, queues for a game mode and plays random legal moves
+after an optional think time, chatting now and then. Given a player with
+a ``choose_cell(state)`` method (ai.AIPlayer for 3x3, mcts.MCTSPlayer for
+gomoku too) it plays that player's moves instead, worked out in a thread
+so the event loop keeps running. It speaks the same
+messages as client.py (``move``, ``restart``, ``chat_message``,
+``game_mode``) and records timings into a shared BotStats, which is what
+the load test in benchmarks/load_test.py reports on.
+
+Run on its own, it hosts one AI opponent on a server:
+
+    python bot_client.py --ai mcts --budget 1.0 --games 10
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from codec import JSON, get_codec
+from game_state import SIZE
+from grid_state import GridState, board_from_snapshot, board_kind, new_board
+from heartbeat import PONG
+from lobby import GAME_MODES
+from mcts import MCTSPlayer
+from ultimate import POSITIONS, ULTIMATE_MODE, UltimateState
+from protocol import FrameDecoder, decode_message, encode_message
+
+CHAT_LINES = ["gl hf", "nice move", "hmm", "gg", "one more?"]
+
+
+class BotStats:
+    """Counters and latency samples shared by every bot in a run"""
+
+    def __init__(self):
+        self.moves = 0
+        self.games = 0
+        self.chats = 0
+        self.errors = 0
+        # seconds from sending a move to seeing its update_board
+        self.move_latencies = []
+        # seconds from connecting to the first start_game
+        self.start_latencies = []
+
+
+class BotClient:
+    """Plays ``games`` games on one connection, then hangs up"""
+
+    def __init__(self, stats, host="127.0.0.1", port=5555, game_mode="single_game", games=1,
+                 think_time=0.0, chat_rate=0.0, codec="binary", rng=None, player=None, opponent_bot=None):
+        self.stats = stats
+        self.host = host
+        self.port = port
+        self.game_mode = game_mode
+        self.games = games
+        self.think_time = think_time
+        # chat messages per second, sent at random intervals while playing
+        self.chat_rate = chat_rate
+        self.codec_name = codec
+        self.rng = rng or random.Random()
+        self.player = player
+        # a difficulty: ask the server for an AI opponent instead of queueing
+        self.opponent_bot = opponent_bot
+
+        self.writer = None
+        self.codec = JSON
+        self.symbol = None
+        self.board = new_board(game_mode)
+        # the mode the room is playing, which sets the board size
+        self.room_mode = game_mode
+        self.seq = 0
+        self.games_played = 0
+        self.connected_at = None
+        self.started = False
+        self.move_sent_at = None
+        self.turn_task = None
+        self.done = asyncio.Event()
+
+    async def run(self):
+        """Connect and play until the last game is over or the server hangs up"""
+        self.connected_at = time.perf_counter()
+        reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        hello = {"type": "hello", "codecs": [self.codec_name], "game_mode": self.game_mode}
+        if self.opponent_bot is not None:
+            hello.update(opponent="bot", difficulty=self.opponent_bot)
+        self.send(hello)
+        chatter = asyncio.ensure_future(self.chat_loop()) if self.chat_rate > 0 else None
+        decoder = FrameDecoder()
+        try:
+            while not self.done.is_set():
+                chunk = await reader.read(65536)
+                if not chunk:
+                    break
+                for frame in decoder.feed(chunk):
+                    self.on_message(decode_message(frame))
+        finally:
+            for task in (chatter, self.turn_task):
+                if task is not None:
+                    task.cancel()
+            self.writer.close()
+            try:
+                # so the server sees us leave before run() returns
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+        return self.games_played
+
+    def send(self, message):
+        self.writer.write(encode_message(message, self.codec))
+
+    def on_message(self, data):
+        msg_type = data["type"]
+        if "seq" in data:
+            self.seq = data["seq"]
+
+        if msg_type == "welcome":
+            self.codec = get_codec(data["capabilities"]["codec"])
+            self.symbol = data["symbol"]
+            self.apply_snapshot(data["state"])
+            if self.symbol == "X":
+                # the host picks the game mode, as client.py does
+                self.send({"type": "game_mode", "game_mode": self.game_mode})
+        elif msg_type == "snapshot":
+            self.apply_snapshot(data)
+            self.take_turn(data["current_player"])
+        elif msg_type == "start_game":
+            if not self.started:
+                self.started = True
+                self.stats.start_latencies.append(time.perf_counter() - self.connected_at)
+            self.take_turn(data["current_player"])
+        elif msg_type == "update_board":
+            x, y = data["position"]
+            self.board.place(x, y, data["player"])
+            if data["player"] == self.symbol and self.move_sent_at is not None:
+                self.stats.move_latencies.append(time.perf_counter() - self.move_sent_at)
+                self.stats.moves += 1
+                self.move_sent_at = None
+        elif msg_type == "next_turn":
+            self.take_turn(data["player"])
+        elif msg_type in ("game_over", "game_of_3_over"):
+            self.game_finished()
+        elif msg_type == "update_game_mode":
+            # the room starts over on a new board when the kind of board changes
+            if board_kind(data["game_mode"]) != board_kind(self.room_mode):
+                self.board = new_board(data["game_mode"])
+            self.room_mode = data["game_mode"]
+        elif msg_type == "restart_game":
+            self.board.clear()
+            self.take_turn(data["current_player"])
+        elif msg_type in ("opponent_disconnected", "server_full", "room_not_found"):
+            self.done.set()
+        elif msg_type == "ping":
+            self.send(PONG)
+
+    def apply_snapshot(self, snapshot):
+        self.room_mode = snapshot["game_mode"]
+        self.board = board_from_snapshot(snapshot)
+
+    def game_finished(self):
+        self.games_played += 1
+        if self.symbol == "X":
+            self.stats.games += 1
+        if self.games_played >= self.games:
+            self.done.set()
+        elif self.symbol == "X":
+            self.send({"type": "restart"})
+
+    def take_turn(self, current_player):
+        """Schedule a move if it is our turn"""
+        if current_player != self.symbol or self.done.is_set():
+            return
+        if self.turn_task is not None and not self.turn_task.done():
+            return
+        self.turn_task = asyncio.ensure_future(self.play_move())
+
+    async def play_move(self):
+        if self.think_time > 0:
+            await asyncio.sleep(self.rng.uniform(0.5, 1.5) * self.think_time)
+        if isinstance(self.board, UltimateState):
+            moves = [POSITIONS[move] for move in self.board.legal_moves()]
+        else:
+            occupied = self.board.occupied()
+            size = self.board.size if isinstance(self.board, GridState) else SIZE
+            moves = [(i % size, i // size) for i in range(size * size) if not occupied >> i & 1]
+        if not moves:
+            return
+        if self.player is not None and plays(self.player, self.room_mode):
+            board = self.board.copy()
+            cell = await asyncio.get_running_loop().run_in_executor(None, self.player.choose_cell, board)
+            position = [cell % size, cell // size]
+        else:
+            position = list(self.rng.choice(moves))
+        self.move_sent_at = time.perf_counter()
+        self.send({"type": "move", "position": position, "seq": self.seq})
+
+    async def chat_loop(self):
+        while not self.done.is_set():
+            await asyncio.sleep(self.rng.expovariate(self.chat_rate))
+            if self.symbol is not None:
+                self.send({"type": "chat_message", "text": self.rng.choice(CHAT_LINES)})
+                self.stats.chats += 1
+
+
+def plays(player, game_mode):
+    """Whether an AI player knows game_mode: MCTS plays every k-in-a-row board, the tablebase AI only 3x3"""
+    kind = board_kind(game_mode)
+    if isinstance(player, MCTSPlayer):
+        return kind != ULTIMATE_MODE
+    return kind is None
+
+
+def make_player(name, budget, workers):
+    """AI for --ai; None plays random moves"""
+    if name == "mcts":
+        return MCTSPlayer(time_budget=budget, workers=workers)
+    if name in ("easy", "medium", "hard", "perfect"):
+        from ai import AIPlayer
+        return AIPlayer(difficulty=name)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play games against a server as a bot")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--game-mode", choices=GAME_MODES, default="single_game")
+    parser.add_argument("--games", type=int, default=1)
+    parser.add_argument("--ai", choices=["random", "easy", "medium", "hard", "perfect", "mcts"], default="random")
+    parser.add_argument("--budget", type=float, default=0.5, help="seconds per MCTS move")
+    parser.add_argument("--workers", type=int, default=1, help="processes per MCTS search")
+    args = parser.parse_args()
+
+    player = make_player(args.ai, args.budget, args.workers)
+    if player is not None and not plays(player, args.game_mode):
+        # rather than quietly playing random moves
+        parser.error(f"--ai {args.ai} can't play {args.game_mode}")
+    stats = BotStats()
+    bot = BotClient(stats, args.host, args.port, args.game_mode, args.games, player=player)
+    try:
+        played = asyncio.run(bot.run())
+    finally:
+        if hasattr(player, "close"):
+            player.close()
+    print(f"played {played} games, {stats.moves} moves")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""AI opponents that take a seat in a room like a connected player.
+
+A BotSeat stands in for a connection: the room seats it, broadcasts to it
+and takes its moves through handle_message like anyone else's. It never
+decodes what it is sent; after each broadcast it looks at the room, and
+if it is its turn it hands the board to a BotPool.
+
+The pool works moves out in worker processes, so a slow search never holds
+up the server's network thread or other rooms. The finished move is passed
+back through the ``schedule(delay, callback)`` function the server gives
+the bot, which runs the callback on the server's own thread or event loop
+once the think delay is up. A move tagged with an old sequence number is
+refused by the room, so a result that arrives after a restart does nothing.
+"""
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ai import DIFFICULTIES, AIPlayer
+from codec import JSON
+from game_state import SIZE, GameState
+
+DEFAULT_DIFFICULTY = "perfect"
+# seconds between the bot's turn starting and its move, so it doesn't answer instantly
+DEFAULT_THINK_DELAY = 0.5
+
+# one AIPlayer per difficulty in each worker process
+_players = {}
+
+
+def compute_move(difficulty, x_mask, o_mask, seed):
+    """Cell for the side to move; runs in a pool worker"""
+    player = _players.get(difficulty)
+    if player is None:
+        player = _players[difficulty] = AIPlayer(difficulty=difficulty)
+    player.rng.seed(seed)
+    return player.choose_cell(GameState(x_mask, o_mask))
+
+
+class BotPool:
+    """Worker processes shared by every bot on a server"""
+
+    def __init__(self, workers=None):
+        # spawned, not forked: a forked worker would inherit the server's
+        # client sockets and keep them open after the server closes them
+        self.executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+        self.rng = random.Random()
+
+    def submit(self, difficulty, state):
+        """Future for the bot's move in state"""
+        return self.executor.submit(compute_move, difficulty, state.x_mask, state.o_mask,
+                                    self.rng.getrandbits(32))
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+class BotSeat:
+    """A bot player, seated in a room through the connection interface"""
+    is_bot = True
+
+    def __init__(self, pool, schedule, difficulty=DEFAULT_DIFFICULTY, think_delay=DEFAULT_THINK_DELAY, codec=JSON):
+        if difficulty not in DIFFICULTIES:
+            raise ValueError(f"unknown difficulty {difficulty!r}, expected one of {list(DIFFICULTIES)}")
+        self.pool = pool
+        self.schedule = schedule
+        self.difficulty = difficulty
+        self.think_delay = think_delay
+        # sharing the opponent's codec means broadcasts are encoded once
+        self.codec = codec
+        self.room = None
+        self.address = ("bot", difficulty)
+        self.closed = False
+        # the room seq the outstanding move was asked for
+        self.pending = None
+
+    def send(self, message):
+        # the bot reads the room directly
+        pass
+
+    def send_frame(self, frame):
+        """Called once per broadcast: check whether it is our move"""
+        room = self.room
+        if self.closed or room is None or self.pending == room.seq:
+            return
+        if room.game_over or not room.started or room.current_player != room.player_symbols.get(self):
+            return
+        if not isinstance(room.board, GameState):
+            # the AI only knows the 3x3 game
+            return
+        seq = self.pending = room.seq
+        asked_at = time.monotonic()
+        future = self.pool.submit(self.difficulty, room.board)
+
+        def done(future):
+            # on a pool thread: hand back to the server for the rest
+            if future.cancelled():
+                return
+            delay = max(0.0, self.think_delay - (time.monotonic() - asked_at))
+            self.schedule(delay, lambda: self.play(future, seq))
+
+        future.add_done_callback(done)
+
+    def play(self, future, seq):
+        """Make the worked-out move; runs on the server's thread or loop"""
+        if self.closed or self.room is None or future.cancelled() or future.exception() is not None:
+            return
+        cell = future.result()
+        self.room.handle_message(self, {"type": "move", "position": [cell % SIZE, cell // SIZE], "seq": seq})
+
+    def close(self):
+        self.closed = True
+        self.room = None
@@ -1,10 +1,14 @@
 import pygame
 import socket
-import json
 import threading
 import sys
 import os
+import random
+import time
 from board import Board
+from codec import JSON, SUPPORTED_CODECS, get_codec
+from heartbeat import PONG
+from protocol import FrameDecoder, decode_message, encode_message
 import math
 from chat import ChatWindow
 
@@ -66,7 +70,20 @@ class NetworkGame:
         self.game_over = False
         self.winner = None
         self.client = None
+        # chat is sent from the chat window's thread, so whole frames go out under a lock
+        self.send_lock = threading.Lock()
+        # JSON until the server's welcome names a better codec
+        self.codec = JSON
+        # sequence number of the last state update applied from the server
+        self.seq = 0
+        self.awaiting_snapshot = False
         self.connected = False
+        # what the server gave us to get our seat back if the connection drops
+        self.host = None
+        self.resume_token = None
+        self.resume_grace = 0
+        # set when we close the connection ourselves, so we don't try to resume
+        self.leaving = False
         self.waiting_for_opponent = True
         self.animation_timer = 0
         self.winning_cells = []
@@ -84,12 +101,30 @@ class NetworkGame:
         self.pending_messages = []
 
 
-    def connect_to_server(self, host):
-        """Connect to the game server"""
+    def connect_to_server(self, host, spectate=None, bot=None):
+        """Connect to the game server; spectate is a room id, or "" for any game.
+
+        bot is a difficulty: play the server's AI instead of waiting for a person.
+        """
+        self.host = host
         try:
             self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.client.connect((host, PORT))
+            # moves are tiny; don't let Nagle hold them back
+            self.client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             self.connected = True
+            # Offer the compact codecs first; the server picks one
+            # the lobby pairs us with someone who wants the same game mode
+            hello = {"type": "hello", "codecs": SUPPORTED_CODECS, "game_mode": self.game_mode}
+            if spectate is not None:
+                # watch a game instead of taking a seat
+                hello["role"] = "spectator"
+                if spectate.isdigit():
+                    hello["room"] = int(spectate)
+            elif bot is not None:
+                hello["opponent"] = "bot"
+                hello["difficulty"] = bot
+            self.send_message(hello)
             # Start thread to handle server messages
             thread = threading.Thread(target=self.receive_messages)
             thread.daemon = True
@@ -99,6 +134,11 @@ class NetworkGame:
             print(f"Connection error: {e}")
             return False
     
+    def send_message(self, message):
+        """Send one framed message to the server"""
+        with self.send_lock:
+            self.client.sendall(encode_message(message, self.codec))
+
     ####### chat related methods #########
     def open_chat_window(self):
         """Open the chat window in a separate thread"""
@@ -119,10 +159,10 @@ class NetworkGame:
         """Send chat message to server"""
         if self.connected and text:
             try:
-                self.client.send(json.dumps({
+                self.send_message({
                     "type": "chat_message",
                     "text": text
-                }).encode())
+                })
             except Exception as e:
                 print(f"Error sending chat message: {e}")
                 self.connected = False
@@ -130,158 +170,252 @@ class NetworkGame:
     ####### end chat related methods #########
 
     def receive_messages(self):
-        """Handle messages from server"""
-        buffer = ""
+        """Handle messages from server, resuming our seat if the connection drops"""
+        while True:
+            self.read_messages()
+            if self.leaving or self.resume_token is None:
+                break
+            if not self.reconnect():
+                # let the game loop end
+                self.waiting_for_opponent = False
+                break
+
+    def reconnect(self):
+        """Connect again and ask for our seat back, until the server's grace period is up"""
+        # the server resets our seat once the grace period is up
+        deadline = time.monotonic() + self.resume_grace
+        # waiting is started short and doubled, and jittered so that clients
+        # cut off together don't all come back at the same moment
+        delay = 0.5
+        while not self.leaving and time.monotonic() < deadline:
+            time.sleep(random.uniform(0.5, 1.5) * delay)
+            delay = min(delay * 2, 8)
+            try:
+                sock = socket.create_connection((self.host, PORT), timeout=5)
+            except OSError:
+                continue
+            self.client.close()
+            sock.settimeout(None)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.client = sock
+            self.codec = JSON
+            self.connected = True
+            print("Reconnected, resuming the game")
+            self.send_message({"type": "hello", "codecs": SUPPORTED_CODECS, "game_mode": self.game_mode,
+                               "resume": self.resume_token, "last_seq": self.seq})
+            return True
+        return False
+
+    def read_messages(self):
+        """Apply messages from the server until the connection closes"""
+        decoder = FrameDecoder()
         while self.connected:
             try:
-                chunk = self.client.recv(1024).decode()
+                chunk = self.client.recv(4096)
                 if not chunk:
                     break
 
-                buffer += chunk
-                
-                # Process all complete messages in the buffer
-                while buffer:
+                # A chunk may hold several messages or only part of one
+                for frame in decoder.feed(chunk):
                     try:
-                        # Find the end of the first JSON object
-                        json_end = buffer.find("}")
-                        if json_end == -1:
-                            # No complete JSON object found, wait for more data
-                            break
-                            
-                        # Extract the complete JSON object (plus closing brace)
-                        json_end += 1
-                        message = buffer[:json_end]
-                        buffer = buffer[json_end:]  # Remove processed message from buffer
-                        
-                        # Try to parse the JSON
-                        data = json.loads(message)
-                        
-                        # Process the message based on its type
-                        if data["type"] == "symbol":
-                            self.player_symbol = data["symbol"]
-                            # Update chat window if it exists
-                            if self.chat_window:
-                                self.chat_window.set_player_symbol(self.player_symbol)
-                        
-                        elif data["type"] == "chat_message":
-                            # If chat window exists, add the message
-                            if self.chat_window:
-                                self.chat_window.add_message(data["player"], data["text"])
-                            else:
-                                # Store message for when chat window is opened
-                                self.pending_messages.append(data)
-                        
-                        elif data["type"] == "start_game":
-                            self.waiting_for_opponent = False
-                            self.current_player = data["current_player"]
-                            # Automatically open chat window when game starts
-                            self.open_chat_window()
-                        
-                        elif data["type"] == "update_board":
-                            x, y = data["position"]
-                            player = data["player"]
-                            self.board.grid_matrix[y][x] = player
-                            if sounds_loaded:
-                                sound = x_sound if player == "X" else o_sound
-                                sound.play()
-                        
-                        elif data["type"] == "next_turn":
-                            self.current_player = data["player"]
-                        
-                        elif data["type"] == "update_game_mode":
-                            # Update local game mode to match server's
-                            self.game_mode = data["game_mode"]
-                            print(f"Game mode set to: {self.game_mode}")
-                        
-                        elif data["type"] == "game_over":
-                            self.game_over = True
-                            self.winner = data["winner"]
-                            if sounds_loaded:
-                                if self.winner == "Draw":
-                                    draw_sound.play()
-                                else:
-                                    victory_sound.play()
-                        
-                        elif data["type"] == "restart_game":
-                            self.board.clear_board()
-                            self.game_over = False
-                            self.winner = None
-                            self.current_player = data["current_player"]
-                            self.winning_cells = []
-                            
-                            # If round_num is in the data, update it (for best-of-3 mode)
-                            if "round_num" in data:
-                                self.round_num = data["round_num"]
-                            
-                            # Reset any flags that might be active
-                            self.show_current_score = False
-                            self.show_final_winner = False
-                        
-                        elif data["type"] == "opponent_disconnected":
-                            self.waiting_for_opponent = True
-                            self.board.clear_board()
-                            self.game_over = False
-                            self.winner = None
-                        
-                        elif data["type"] == "server_full":
-                            print("Server is full!")
-                            self.connected = False
-                            break
-        
-                        elif data["type"] == "game_of_3_over":
-                            self.show_current_score = True
-                            self.game_over = True
-                            self.winner = data["winner"]
-                            if sounds_loaded:
-                                if self.winner == "Draw":
-                                    draw_sound.play()
-                                else:
-                                    victory_sound.play()
-                            self.round_num = data["round_num"]
-                            self.player1_wins = data["player1_wins"]
-                            self.player2_wins = data["player2_wins"]
-                            # Display a hint to press SPACE to continue to next round
-                            print("Press SPACE to continue to the next round")
-                            
-        
-                        elif data["type"] == "restart_game_of_3":
-                            self.round_num = data["round_num"]
-                            self.player1_wins = data["player1_wins"]
-                            self.player2_wins = data["player2_wins"]
-                            self.show_final_winner = True
-                            self.game_over = True
-                            # Do NOT call request_restart() here, we'll wait for user input
-                            
-                        elif data["type"] == "current_score":
-                            # We change current score when drawing the screen
-                            self.show_current_score = True
-                            
-                    except json.JSONDecodeError:
-                        # If we can't parse the JSON yet, we might have an incomplete message
-                        # Put the processed part back in the buffer and wait for more data
-                        break
+                        self.process_message(decode_message(frame))
                     except Exception as e:
                         print(f"Error processing message: {e}")
-                        # Continue to the next message
-                        continue
 
             except Exception as e:
                 print(f"Connection error: {e}")
-                self.connected = False
                 break
 
         print("Connection to server lost")
+        if not self.leaving and self.resume_token is not None:
+            # keep the game screen up while we try to get our seat back
+            self.waiting_for_opponent = True
         self.connected = False
 
+    def check_sequence(self, data):
+        """Decide whether a state update applies on top of what we have"""
+        seq = data["seq"]
+        if data["type"] == "snapshot":
+            self.seq = seq
+            self.awaiting_snapshot = False
+            return True
+        if self.awaiting_snapshot or seq <= self.seq:
+            # stale or duplicate, or covered by the snapshot we asked for
+            return False
+        if seq != self.seq + 1:
+            # we missed an update: ask for the full state rather than guess
+            self.awaiting_snapshot = True
+            self.send_message({"type": "resync"})
+            return False
+        self.seq = seq
+        return True
+
+    def process_message(self, data):
+        """Update game state from one server message"""
+        if "seq" in data and not self.check_sequence(data):
+            return
+
+        if data["type"] == "welcome":
+            # Everything about the room we just joined, in one message
+            self.codec = get_codec(data["capabilities"]["codec"])
+            self.player_symbol = data["symbol"]
+            self.resume_token = data.get("resume_token")
+            self.resume_grace = data["capabilities"].get("resume_grace", 0)
+            # Update chat window if it exists
+            if self.chat_window:
+                self.chat_window.set_player_symbol(self.player_symbol)
+            if self.player_symbol is None:
+                # spectating: the game may be well under way already
+                self.waiting_for_opponent = False
+            # a resumed seat gets the updates it missed instead, if the server still has them
+            if "state" in data:
+                self.process_message(data["state"])
+
+        elif data["type"] == "chat_message":
+            # If chat window exists, add the message
+            if self.chat_window:
+                self.chat_window.add_message(data["player"], data["text"])
+            else:
+                # Store message for when chat window is opened
+                self.pending_messages.append(data)
+
+        elif data["type"] == "snapshot":
+            # Full state: on join, or after we asked for a resync
+            self.board.grid_matrix = data["board"]
+            self.current_player = data["current_player"]
+            self.game_mode = data["game_mode"]
+            self.round_num = data["round_num"]
+            self.player1_wins = data["player1_wins"]
+            self.player2_wins = data["player2_wins"]
+            self.game_over = data["game_over"]
+            self.winner = data["winner"]
+
+        elif data["type"] == "start_game":
+            self.waiting_for_opponent = False
+            self.current_player = data["current_player"]
+            # Automatically open chat window when game starts
+            self.open_chat_window()
+
+        elif data["type"] == "update_board":
+            x, y = data["position"]
+            player = data["player"]
+            self.board.set_cell_val(x, y, player)
+            if sounds_loaded:
+                sound = x_sound if player == "X" else o_sound
+                sound.play()
+
+        elif data["type"] == "next_turn":
+            self.current_player = data["player"]
+
+        elif data["type"] == "update_game_mode":
+            # Update local game mode to match server's
+            self.game_mode = data["game_mode"]
+            print(f"Game mode set to: {self.game_mode}")
+
+        elif data["type"] == "game_over":
+            self.game_over = True
+            self.winner = data["winner"]
+            if sounds_loaded:
+                if self.winner == "Draw":
+                    draw_sound.play()
+                else:
+                    victory_sound.play()
+
+        elif data["type"] == "restart_game":
+            self.board.clear_board()
+            self.game_over = False
+            self.winner = None
+            self.current_player = data["current_player"]
+            self.winning_cells = []
+
+            # If round_num is in the data, update it (for best-of-3 mode)
+            if "round_num" in data:
+                self.round_num = data["round_num"]
+
+            # Reset any flags that might be active
+            self.show_current_score = False
+            self.show_final_winner = False
+
+        elif data["type"] == "opponent_reconnecting":
+            # the board stays as it is; the game goes on when they are back
+            if data["player"] != self.player_symbol:
+                print(f"Opponent lost connection, holding the game for {data['grace']} seconds")
+                self.waiting_for_opponent = True
+
+        elif data["type"] == "opponent_disconnected":
+            self.waiting_for_opponent = True
+            self.board.clear_board()
+            self.game_over = False
+            self.winner = None
+
+        elif data["type"] == "server_full":
+            print("Server is full!")
+            self.resume_token = None
+            self.connected = False
+            return
+
+        elif data["type"] == "room_not_found":
+            print("No game to watch!")
+            self.connected = False
+            return
+
+        elif data["type"] == "game_of_3_over":
+            self.show_current_score = True
+            self.game_over = True
+            self.winner = data["winner"]
+            if sounds_loaded:
+                if self.winner == "Draw":
+                    draw_sound.play()
+                else:
+                    victory_sound.play()
+            self.round_num = data["round_num"]
+            self.player1_wins = data["player1_wins"]
+            self.player2_wins = data["player2_wins"]
+            # Display a hint to press SPACE to continue to next round
+            print("Press SPACE to continue to the next round")
+
+
+        elif data["type"] == "restart_game_of_3":
+            self.round_num = data["round_num"]
+            self.player1_wins = data["player1_wins"]
+            self.player2_wins = data["player2_wins"]
+            self.show_final_winner = True
+            self.game_over = True
+            # Do NOT call request_restart() here, we'll wait for user input
+
+        elif data["type"] == "current_score":
+            # We change current score when drawing the screen
+            self.show_current_score = True
+
+        elif data["type"] == "hint":
+            if data.get("busy"):
+                print("No hint right now, try again in a moment")
+            elif data["moves"]:
+                cells = ", ".join(f"({x}, {y})" for x, y in data["moves"])
+                print(f"Hint for {data['player']}: play {cells}")
+
+        elif data["type"] == "ping":
+            # the server closes connections that stop answering
+            self.send_message(PONG)
+
+
     def send_move(self, x, y):
         """Send move to server"""
         if self.connected and not self.game_over and self.current_player == self.player_symbol:
             try:
-                self.client.send(json.dumps({
+                self.send_message({
                     "type": "move",
-                    "position": [x, y]
-                }).encode())
+                    "position": [x, y],
+                    "seq": self.seq
+                })
+            except:
+                self.connected = False
+
+    def request_hint(self):
+        """Ask the server for the best moves in the current position"""
+        if self.connected and not self.game_over:
+            try:
+                self.send_message({"type": "hint_request"})
             except:
                 self.connected = False
 
@@ -289,9 +423,9 @@ class NetworkGame:
         """Send game mode to server"""
         if self.connected:
             try:
-                self.client.send(json.dumps({
+                self.send_message({
                     "type": "game_mode",
-                    "game_mode": self.game_mode}).encode())
+                    "game_mode": self.game_mode})
             except:
                 self.connected = False
 
@@ -302,9 +436,9 @@ class NetworkGame:
                 # Reset local state flags immediately to prevent visual issues
                 self.show_final_winner = False
                 
-                self.client.send(json.dumps({
+                self.send_message({
                     "type": "restart"
-                }).encode())
+                })
             except:
                 self.connected = False
     
@@ -312,9 +446,9 @@ class NetworkGame:
         """Request current score from server"""
         if self.connected:
             try:
-                self.client.send(json.dumps({
+                self.send_message({
                     "type": "current_score"
-                }).encode())
+                })
             except:
                 self.connected = False
 
@@ -340,7 +474,7 @@ class NetworkGame:
         # Draw pieces
         for y in range(3):
             for x in range(3):
-                piece = self.board.grid_matrix[y][x]
+                piece = self.board.get_cell_val(x, y)
                 if piece:
                     img = play_x if piece == "X" else play_o
                     self.surface.blit(img, (x * 200, y * 200 + self.board.y_offset))
@@ -494,7 +628,7 @@ class NetworkGame:
                         pos = pygame.mouse.get_pos()
                         x = pos[0] // 200
                         y = (pos[1] - self.board.y_offset) // 200
-                        if 0 <= x < 3 and 0 <= y < 3 and not self.board.grid_matrix[y][x]:
+                        if 0 <= x < 3 and 0 <= y < 3 and not self.board.get_cell_val(x, y):
                             self.send_move(x, y)
 
                 if event.type == pygame.KEYDOWN:
@@ -507,6 +641,8 @@ class NetworkGame:
                         self.show_final_winner = False
                     elif event.key == pygame.K_ESCAPE and self.game_over:
                         running = False
+                    elif event.key == pygame.K_h:
+                        self.request_hint()
 
                 # when a round in best of 3 is finished, we show the current score
                 if self.show_current_score and not self.show_final_winner:
@@ -545,6 +681,7 @@ class NetworkGame:
             if not self.connected and not self.waiting_for_opponent:
                 running = False
         
+        self.leaving = True
         if self.client:
             # Clean up chat window when client disconnects
             if self.chat_window:
@@ -563,10 +700,16 @@ def main():
     if len(sys.argv) > 1:
         game_mode = sys.argv[1]
     
+    # Watch instead of play: TICTACTOE_SPECTATE=<room id>, or empty for any game
+    spectate = os.environ.get('TICTACTOE_SPECTATE')
+    # Play the server's AI: TICTACTOE_BOT=easy, medium, hard or perfect
+    bot = os.environ.get('TICTACTOE_BOT')
+
     game = NetworkGame()
-    if game.connect_to_server(host):
-        game.game_mode = game_mode
-        game.send_game_mode()
+    game.game_mode = game_mode
+    if game.connect_to_server(host, spectate, bot):
+        if spectate is None:
+            game.send_game_mode()
         game.run()
     else:
         print("Failed to connect to server")
@@ -0,0 +1,236 @@
+"""Message codecs: how a message dict becomes the payload of one frame.
+
+Two codecs are available:
+
+* ``json`` - the original encoding, always understood by both sides.
+* ``binary`` - a ``struct`` layout per message type. The first byte is a
+  message type id and the rest are the fields packed as small integers,
+  so a move is 3 bytes instead of ~35.
+
+The payload says which codec made it. JSON always starts with ``{`` and
+binary ids never use that byte, so a receiver can decode any frame
+without knowing what the sender picked. Negotiation only decides what a
+peer *sends*: the client lists its codecs in a ``hello`` message and the
+server names the one it will use in the ``capabilities`` of its
+``welcome`` (``capabilities["codec"]``).
+Anything the binary layouts cannot represent, e.g. a message with an extra
+field, goes out as JSON behind the ``JSON_FALLBACK`` id.
+"""
+import json
+import struct
+
+JSON_START = ord("{")
+JSON_FALLBACK = 0
+
+SYMBOL_IDS = {None: 0, "X": 1, "O": 2, "Draw": 3}
+SYMBOLS = {v: k for k, v in SYMBOL_IDS.items()}
+MODE_IDS = {"single_game": 0, "best_of_3": 1, "gomoku": 2, "ultimate": 3}
+MODES = {v: k for k, v in MODE_IDS.items()}
+
+# field kind -> (struct format, pack converter, unpack converter)
+# pack converters return a tuple of struct values; unpack converters get a
+# single value, or a tuple when the kind takes several struct slots
+_KINDS = {
+    "player": ("B", lambda v: (SYMBOL_IDS[v],), SYMBOLS.__getitem__),
+    "mode": ("B", lambda v: (MODE_IDS[v],), MODES.__getitem__),
+    "bool": ("B", lambda v: (1 if v else 0,), bool),
+    "u8": ("B", lambda v: (v,), None),
+    "u16": ("H", lambda v: (v,), None),
+    "u32": ("I", lambda v: (v,), None),
+    "pos": ("BB", tuple, list),
+    "board": ("HH", lambda v: board_to_masks(v), lambda v: masks_to_board(*v)),
+}
+
+
+class JsonCodec:
+    """The original text encoding"""
+    name = "json"
+
+    def encode(self, message):
+        return json.dumps(message, separators=(",", ":")).encode()
+
+    def decode(self, payload):
+        return json.loads(bytes(payload))
+
+
+class _Layout:
+    """Packing rule for one message type with one exact set of fields.
+
+    A ``text`` field, if any, must come last and takes the rest of the payload.
+    """
+
+    def __init__(self, type_id, msg_type, fields):
+        self.type_id = type_id
+        self.msg_type = msg_type
+        self.size = len(fields) + 1
+        self.text_key = None
+        if fields and fields[-1][1] == "text":
+            self.text_key = fields[-1][0]
+            fields = fields[:-1]
+        self.packers = [(key, _KINDS[kind][1]) for key, kind in fields]
+        self.unpackers = []
+        fmt = "!B"
+        offset = 1
+        for key, kind in fields:
+            width = len(_KINDS[kind][0])
+            self.unpackers.append((key, offset, offset + width, _KINDS[kind][2]))
+            fmt += _KINDS[kind][0]
+            offset += width
+        self.struct = struct.Struct(fmt)
+
+    def pack(self, message):
+        values = [self.type_id]
+        for key, convert in self.packers:
+            values += convert(message[key])
+        packed = self.struct.pack(*values)
+        if self.text_key is not None:
+            text = message[self.text_key]
+            if not isinstance(text, str):
+                raise TypeError(f"{self.text_key} must be a string")
+            packed += text.encode()
+        return packed
+
+    def unpack(self, payload):
+        try:
+            values = self.struct.unpack_from(payload)
+        except struct.error:
+            raise ValueError(f"{self.msg_type} payload is {len(payload)} bytes, expected {self.struct.size}") from None
+        message = {"type": self.msg_type}
+        for key, start, end, convert in self.unpackers:
+            if end - start > 1:
+                message[key] = convert(values[start:end])
+            elif convert is None:
+                message[key] = values[start]
+            else:
+                message[key] = convert(values[start])
+        if self.text_key is not None:
+            message[self.text_key] = bytes(payload[self.struct.size:]).decode()
+        return message
+
+
+def _row_cells(x_bits, o_bits):
+    return tuple("X" if x_bits >> i & 1 else "O" if o_bits >> i & 1 else '' for i in range(3))
+
+
+# every possible 3-cell row, in both directions
+_ROWS = {(x_bits, o_bits): _row_cells(x_bits, o_bits)
+         for x_bits in range(8) for o_bits in range(8) if not x_bits & o_bits}
+_ROW_BITS = {cells: bits for bits, cells in _ROWS.items()}
+
+
+def board_to_masks(board):
+    """Nested 3x3 board of 'X'/'O'/'' to a pair of 9-bit masks"""
+    x_mask = o_mask = 0
+    for y, row in enumerate(board):
+        x_bits, o_bits = _ROW_BITS[tuple(row)]
+        x_mask |= x_bits << 3 * y
+        o_mask |= o_bits << 3 * y
+    return x_mask, o_mask
+
+
+def masks_to_board(x_mask, o_mask):
+    """Inverse of board_to_masks"""
+    return [list(_ROWS[(x_mask >> 3 * y & 7, o_mask >> 3 * y & 7)]) for y in range(3)]
+
+
+class BinaryCodec:
+    """Fixed struct layouts for every message type, JSON for anything else"""
+    name = "binary"
+
+    def __init__(self):
+        self.by_type = {}
+        self.by_id = {}
+
+    def register(self, type_id, msg_type, *fields):
+        """Add a layout; a type may have several with different field sets"""
+        if type_id in self.by_id or type_id in (JSON_FALLBACK, JSON_START):
+            raise ValueError(f"type id {type_id} is reserved or already in use")
+        layout = _Layout(type_id, msg_type, fields)
+        self.by_id[type_id] = layout
+        self.by_type[(msg_type, layout.size)] = layout
+        return layout
+
+    def encode(self, message):
+        layout = self.by_type.get((message.get("type"), len(message)))
+        if layout is not None:
+            try:
+                return layout.pack(message)
+            except (KeyError, TypeError, ValueError, struct.error):
+                pass
+        return bytes((JSON_FALLBACK,)) + json.dumps(message, separators=(",", ":")).encode()
+
+    def decode(self, payload):
+        if not payload:
+            raise ValueError("empty binary message")
+        type_id = payload[0]
+        if type_id == JSON_FALLBACK:
+            return json.loads(bytes(payload[1:]))
+        try:
+            layout = self.by_id[type_id]
+        except KeyError:
+            raise ValueError(f"unknown binary message id {type_id}")
+        return layout.unpack(payload)
+
+
+JSON = JsonCodec()
+BINARY = BinaryCodec()
+# client -> server
+BINARY.register(1, "move", ("position", "pos"))
+BINARY.register(2, "restart")
+BINARY.register(3, "game_mode", ("game_mode", "mode"))
+BINARY.register(4, "current_score")
+BINARY.register(5, "chat_message", ("text", "text"))
+BINARY.register(6, "move", ("position", "pos"), ("seq", "u32"))
+BINARY.register(7, "resync")
+BINARY.register(8, "hint_request")
+# either way: heartbeats
+BINARY.register(9, "ping")
+BINARY.register(10, "pong")
+# server -> client; state changes carry the room's sequence number
+BINARY.register(20, "symbol", ("symbol", "player"))
+BINARY.register(21, "start_game", ("current_player", "player"), ("seq", "u32"))
+BINARY.register(22, "update_board", ("position", "pos"), ("player", "player"), ("seq", "u32"))
+BINARY.register(23, "next_turn", ("player", "player"), ("seq", "u32"))
+BINARY.register(24, "update_game_mode", ("game_mode", "mode"), ("seq", "u32"))
+BINARY.register(25, "game_over", ("winner", "player"), ("seq", "u32"))
+BINARY.register(26, "game_of_3_over", ("winner", "player"), ("round_num", "u8"),
+                ("player1_wins", "u8"), ("player2_wins", "u8"), ("seq", "u32"))
+BINARY.register(27, "restart_game", ("current_player", "player"), ("round_num", "u8"), ("seq", "u32"))
+BINARY.register(28, "restart_game_of_3", ("round_num", "u8"), ("player1_wins", "u8"),
+                ("player2_wins", "u8"), ("seq", "u32"))
+BINARY.register(29, "current_score", ("player1_wins", "u8"), ("player2_wins", "u8"),
+                ("round_num", "u8"))
+BINARY.register(30, "chat_message", ("player", "player"), ("text", "text"))
+BINARY.register(31, "opponent_disconnected", ("seq", "u32"))
+BINARY.register(32, "server_full")
+BINARY.register(33, "update_game_mode", ("game_mode", "mode"))
+BINARY.register(34, "snapshot", ("board", "board"), ("current_player", "player"),
+                ("game_mode", "mode"), ("round_num", "u8"), ("player1_wins", "u8"),
+                ("player2_wins", "u8"), ("game_over", "bool"), ("winner", "player"),
+                ("seq", "u32"))
+
+CODECS = {JSON.name: JSON, BINARY.name: BINARY}
+# preferred first
+SUPPORTED_CODECS = [BINARY.name, JSON.name]
+
+
+def get_codec(name):
+    """Look up a codec by name, falling back to JSON"""
+    return CODECS.get(name, JSON)
+
+
+def choose_codec(offered):
+    """Pick the best codec from the list a client offered"""
+    for name in SUPPORTED_CODECS:
+        if name in offered:
+            return CODECS[name]
+    return JSON
+
+
+def decode_payload(payload):
+    """Decode a payload produced by any codec"""
+    if not payload:
+        raise ValueError("empty payload")
+    if payload[0] == JSON_START:
+        return JSON.decode(payload)
+    return BINARY.decode(payload)
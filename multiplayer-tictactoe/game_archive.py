@@ -0,0 +1,285 @@
+"""Archive of finished 3x3 games: a few bytes each, with an index for random access.
+
+An archive is two files. ``PATH`` holds the games back to back, and
+``PATH.idx`` holds one fixed-width entry per game. Both start with an
+8-byte header: magic b"TTTA" or b"TTTI", format version (u16), 2 bytes
+reserved. All integers are little-endian.
+
+A game record is:
+
+    flags    u8: move count (bits 0-3), result (bits 4-5: 0 draw, 1 X,
+             2 O), game mode (bits 6-7: 0 single_game, 1 best_of_3)
+    moves    the cells played, X first, as the base-9 number
+             sum(cell * 9**i), in as few bytes as the move count needs
+             (4 for a full board)
+    score    best_of_3 only: round_num, player1_wins, player2_wins (u8 each)
+
+so a single game takes 1 to 5 bytes. An index entry is the time the game
+ended (u32 unix seconds) and the offset of its record (u64). Times never go
+down from one entry to the next, so the index is sorted by time. The reader
+mmaps both files: game N is one entry read and one record decoded, a time
+range is two binary searches over the index, and iterating reads records
+in order straight from the mapping, so nothing is loaded up front.
+
+The writer appends the record before its index entry. If the server dies
+in between, the next writer cuts the data file back to the last indexed
+game.
+
+    python game_archive.py games.ttta
+    python game_archive.py games.ttta --game 120
+    python game_archive.py games.ttta --since 2026-10-01 --until 2026-10-08
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from game_state import CELLS, SIZE
+
+DATA_MAGIC = b"TTTA"
+INDEX_MAGIC = b"TTTI"
+VERSION = 1
+HEADER = struct.Struct("<4sH2x")
+ENTRY = struct.Struct("<IQ")
+
+RESULT_IDS = {"Draw": 0, "X": 1, "O": 2}
+RESULTS = {v: k for k, v in RESULT_IDS.items()}
+# only the 3x3 modes are archived
+MODE_IDS = {"single_game": 0, "best_of_3": 1}
+MODES = {v: k for k, v in MODE_IDS.items()}
+# bytes needed for the base-9 number of n moves
+MOVE_BYTES = tuple(((9 ** n - 1).bit_length() + 7) // 8 for n in range(CELLS + 1))
+
+Game = namedtuple("Game", ["number", "ended_at", "game_mode", "winner", "moves",
+                           "round_num", "player1_wins", "player2_wins"])
+
+
+def encode_game(moves, winner, game_mode, round_num=1, player1_wins=0, player2_wins=0):
+    """Record bytes for a game given its cells in play order"""
+    number = 0
+    for cell in reversed(moves):
+        number = number * 9 + cell
+    mode = MODE_IDS[game_mode]
+    record = bytes([len(moves) | RESULT_IDS[winner] << 4 | mode << 6])
+    record += number.to_bytes(MOVE_BYTES[len(moves)], "little")
+    if game_mode == "best_of_3":
+        record += bytes(min(n, 255) for n in (round_num, player1_wins, player2_wins))
+    return record
+
+
+def decode_game(buffer, offset):
+    """(game_mode, winner, moves, round_num, player1_wins, player2_wins) for the record at offset"""
+    flags = buffer[offset]
+    count = flags & 15
+    end = offset + 1 + MOVE_BYTES[count]
+    number = int.from_bytes(buffer[offset + 1:end], "little")
+    moves = []
+    for _ in range(count):
+        number, cell = divmod(number, 9)
+        moves.append(cell)
+    game_mode = MODES[flags >> 6]
+    if game_mode == "best_of_3":
+        round_num, player1_wins, player2_wins = buffer[end:end + 3]
+    else:
+        round_num, player1_wins, player2_wins = 1, 0, 0
+    return game_mode, RESULTS[flags >> 4 & 3], moves, round_num, player1_wins, player2_wins
+
+
+def record_size(flags):
+    return 1 + MOVE_BYTES[flags & 15] + (3 if flags >> 6 == MODE_IDS["best_of_3"] else 0)
+
+
+def check_header(data, magic, path):
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path}: too short to be a game archive")
+    found, version = HEADER.unpack_from(data)
+    if found != magic:
+        raise ValueError(f"{path}: not a game archive")
+    if version != VERSION:
+        raise ValueError(f"{path}: archive format version {version}, expected {VERSION}")
+
+
+class ArchiveWriter:
+    """Appends finished games to an archive, creating it if needed"""
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.data = open(path, "a+b")
+        self.index = open(self.index_path, "a+b")
+        self.last_time = 0
+        self.recover()
+
+    def recover(self):
+        """Write the headers of a new archive, or drop anything after the last whole index entry"""
+        data_size = self.data.seek(0, os.SEEK_END)
+        index_size = self.index.seek(0, os.SEEK_END)
+        if data_size == 0 and index_size == 0:
+            self.data.write(HEADER.pack(DATA_MAGIC, VERSION))
+            self.index.write(HEADER.pack(INDEX_MAGIC, VERSION))
+            self.flush()
+            return
+        self.data.seek(0)
+        check_header(self.data.read(HEADER.size), DATA_MAGIC, self.path)
+        self.index.seek(0)
+        check_header(self.index.read(HEADER.size), INDEX_MAGIC, self.index_path)
+
+        entries = (index_size - HEADER.size) // ENTRY.size
+        index_end = HEADER.size + entries * ENTRY.size
+        data_end = HEADER.size
+        if entries:
+            self.index.seek(index_end - ENTRY.size)
+            self.last_time, offset = ENTRY.unpack(self.index.read(ENTRY.size))
+            self.data.seek(offset)
+            data_end = offset + record_size(self.data.read(1)[0])
+        self.index.truncate(index_end)
+        self.data.truncate(data_end)
+
+    def record(self, moves, winner, game_mode, round_num=1, player1_wins=0, player2_wins=0, ended_at=None):
+        """Append one finished game; moves are cells in play order"""
+        if ended_at is None:
+            ended_at = time.time()
+        # keep the index sorted even if the clock steps back
+        self.last_time = max(self.last_time, int(ended_at))
+        offset = self.data.seek(0, os.SEEK_END)
+        self.data.write(encode_game(moves, winner, game_mode, round_num, player1_wins, player2_wins))
+        # the record has to be in the file before an entry points at it
+        self.data.flush()
+        self.index.write(ENTRY.pack(self.last_time, offset))
+        self.index.flush()
+
+    def flush(self):
+        self.data.flush()
+        self.index.flush()
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+
+class GameArchive:
+    """Read-only view of an archive, memory-mapped"""
+
+    def __init__(self, path):
+        self.path = path
+        self.maps = []
+        # index first: the writer adds a record before its entry, so every
+        # entry mapped here points into the data mapped after it
+        self.index = self.map(path + ".idx", INDEX_MAGIC)
+        self.data = self.map(path, DATA_MAGIC)
+        # a torn last entry is not a game yet
+        self.count = (len(self.index) - HEADER.size) // ENTRY.size
+
+    def map(self, path, magic):
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        check_header(buffer, magic, path)
+        self.maps.append(buffer)
+        return buffer
+
+    def __len__(self):
+        return self.count
+
+    def entry(self, number):
+        """(ended_at, offset) of game number"""
+        return ENTRY.unpack_from(self.index, HEADER.size + number * ENTRY.size)
+
+    def game(self, number):
+        """Game number, counting from 0"""
+        if not 0 <= number < self.count:
+            raise IndexError(f"game {number} not in archive of {self.count}")
+        ended_at, offset = self.entry(number)
+        return Game(number, ended_at, *decode_game(self.data, offset))
+
+    def __getitem__(self, number):
+        return self.game(number)
+
+    def games(self, first=0, stop=None):
+        """Games first to stop - 1, decoded one at a time in order"""
+        stop = self.count if stop is None else min(stop, self.count)
+        for number in range(first, stop):
+            yield self.game(number)
+
+    def __iter__(self):
+        return self.games()
+
+    def find_time(self, ended_at):
+        """Number of the first game that ended at or after ended_at (unix seconds)"""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.entry(middle)[0] < ended_at:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def between(self, start, end):
+        """Games that ended in [start, end), as unix seconds"""
+        return self.games(self.find_time(start), self.find_time(end))
+
+    def close(self):
+        self.data = self.index = None
+        for buffer in self.maps:
+            buffer.close()
+        self.maps = []
+
+
+def to_json(game):
+    return {
+        "game": game.number,
+        "ended_at": datetime.fromtimestamp(game.ended_at, timezone.utc).isoformat(),
+        "game_mode": game.game_mode,
+        "winner": game.winner,
+        "moves": [[cell % SIZE, cell // SIZE] for cell in game.moves],
+        "round_num": game.round_num,
+        "player1_wins": game.player1_wins,
+        "player2_wins": game.player2_wins,
+    }
+
+
+def parse_time(text):
+    """Unix seconds from a number or an ISO date/time (UTC unless it says otherwise)"""
+    try:
+        return float(text)
+    except ValueError:
+        moment = datetime.fromisoformat(text)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return moment.timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print games from an archive as JSON lines")
+    parser.add_argument("path")
+    parser.add_argument("--game", type=int, help="just this game number")
+    parser.add_argument("--since", help="games that ended at or after this time (unix seconds or ISO)")
+    parser.add_argument("--until", help="games that ended before this time")
+    args = parser.parse_args()
+
+    archive = GameArchive(args.path)
+    try:
+        if args.game is not None:
+            games = [archive.game(args.game)]
+        elif args.since is not None or args.until is not None:
+            start = parse_time(args.since) if args.since is not None else 0
+            end = parse_time(args.until) if args.until is not None else float("inf")
+            games = archive.between(start, end)
+        else:
+            first = archive.entry(0)[0] if len(archive) else None
+            last = archive.entry(len(archive) - 1)[0] if len(archive) else None
+            print(json.dumps({"games": len(archive), "first": first, "last": last,
+                              "bytes": len(archive.data) + len(archive.index)}))
+            return
+        for game in games:
+            print(json.dumps(to_json(game)))
+    finally:
+        archive.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Bitboard game state shared by the servers, the client and singleplayer.
+
+Each player's marks are a 9-bit mask, bit ``y * 3 + x`` for cell (x, y).
+Winning is a lookup in a 512-entry table built once from the 8 line masks,
+and a full board is a popcount of 9.
+"""
+from collections import namedtuple
+
+SIZE = 3
+CELLS = SIZE * SIZE
+FULL_MASK = (1 << CELLS) - 1
+
+# rows, columns, then the two diagonals
+WIN_LINES = (
+    0b000000111, 0b000111000, 0b111000000,
+    0b001001001, 0b010010010, 0b100100100,
+    0b100010001, 0b001010100,
+)
+
+# POPCOUNT[mask] and WINNING_LINE[mask] for every 9-bit mask
+POPCOUNT = bytes(bin(mask).count("1") for mask in range(1 << CELLS))
+WINNING_LINE = tuple(next((line for line in WIN_LINES if mask & line == line), 0)
+                     for mask in range(1 << CELLS))
+
+Snapshot = namedtuple("Snapshot", ["x_mask", "o_mask"])
+
+
+def cell_index(x, y):
+    """Bit position of cell (x, y)"""
+    return y * SIZE + x
+
+
+def is_win(mask):
+    """Check if a player's mask covers a full line"""
+    return WINNING_LINE[mask] != 0
+
+
+class GameState:
+    """Marks of both players on a 3x3 board"""
+    __slots__ = ("x_mask", "o_mask")
+
+    def __init__(self, x_mask=0, o_mask=0):
+        self.x_mask = x_mask
+        self.o_mask = o_mask
+
+    @classmethod
+    def from_rows(cls, rows, empty=''):
+        """Build a state from a nested list such as a grid_matrix"""
+        state = cls()
+        for y, row in enumerate(rows):
+            for x, cell in enumerate(row):
+                if cell != empty:
+                    state.place(x, y, cell)
+        return state
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        return cls(snapshot.x_mask, snapshot.o_mask)
+
+    def snapshot(self):
+        """Immutable copy, cheap enough to take on every move"""
+        return Snapshot(self.x_mask, self.o_mask)
+
+    def copy(self):
+        return GameState(self.x_mask, self.o_mask)
+
+    def mask(self, player):
+        """Mask of the given player's marks"""
+        return self.x_mask if player == "X" else self.o_mask
+
+    def occupied(self):
+        return self.x_mask | self.o_mask
+
+    def get(self, x, y, empty=''):
+        """Symbol at (x, y), or empty"""
+        bit = 1 << (y * SIZE + x)
+        if self.x_mask & bit:
+            return "X"
+        if self.o_mask & bit:
+            return "O"
+        return empty
+
+    def is_free(self, x, y):
+        return 0 <= x < SIZE and 0 <= y < SIZE and not (self.x_mask | self.o_mask) >> (y * SIZE + x) & 1
+
+    def place(self, x, y, player):
+        """Mark (x, y) for player; False if the cell is off the board or taken"""
+        if not self.is_free(x, y):
+            return False
+        bit = 1 << (y * SIZE + x)
+        if player == "X":
+            self.x_mask |= bit
+        else:
+            self.o_mask |= bit
+        return True
+
+    def clear_cell(self, x, y):
+        keep = FULL_MASK ^ (1 << (y * SIZE + x))
+        self.x_mask &= keep
+        self.o_mask &= keep
+
+    def clear(self):
+        self.x_mask = 0
+        self.o_mask = 0
+
+    def has_won(self, player):
+        return WINNING_LINE[self.x_mask if player == "X" else self.o_mask] != 0
+
+    def winning_cells(self, player):
+        """Cells of the line player completed, as (x, y) pairs"""
+        line = WINNING_LINE[self.mask(player)]
+        return [(i % SIZE, i // SIZE) for i in range(CELLS) if line >> i & 1]
+
+    def winner(self):
+        """'X', 'O' or None"""
+        if WINNING_LINE[self.x_mask]:
+            return "X"
+        if WINNING_LINE[self.o_mask]:
+            return "O"
+        return None
+
+    def move_count(self):
+        return POPCOUNT[self.x_mask | self.o_mask]
+
+    def is_full(self):
+        return POPCOUNT[self.x_mask | self.o_mask] == CELLS
+
+    def to_move(self):
+        """Whose turn it is, assuming X always opens"""
+        return "X" if POPCOUNT[self.x_mask] == POPCOUNT[self.o_mask] else "O"
+
+    def to_rows(self, empty=''):
+        """Nested list form, as sent in snapshots and drawn by the UIs"""
+        return [[self.get(x, y, empty) for x in range(SIZE)] for y in range(SIZE)]
+
+    def __eq__(self, other):
+        return isinstance(other, GameState) and self.x_mask == other.x_mask and self.o_mask == other.o_mask
+
+    def __repr__(self):
+        return f"GameState(x_mask={self.x_mask:#011b}, o_mask={self.o_mask:#011b})"
@@ -0,0 +1,207 @@
+"""N x N boards with k in a row to win, for the server's bigger game modes.
+
+GameState's win table only covers 3x3, and testing every k-long line
+through the last move (KBoard.wins_at) gets slower as k grows. A GridState
+instead keeps run lengths: for each player and each of the 4 directions,
+every run of that player's marks has its length stored at both of its end
+cells. A new mark can only join the run ending next to it on either side,
+so its run is ``before + 1 + after`` read from its two neighbours, and only
+the two new end cells are written. The win check is therefore a few list
+reads per direction, the same for k = 3 as for gomoku's 5.
+
+Run lengths live on a padded grid, cell ``(y + 1) * (size + 1) + x + 1``,
+with an empty border column and rows so that a neighbour off the board
+reads as a run of 0 without any bounds checks. x_mask / o_mask use the
+usual ``y * size + x`` bits, as in GameState and KBoard, and the interface
+the room relies on (is_free, place, has_won, is_full, to_rows, clear) is
+GameState's.
+"""
+from game_state import GameState
+from ultimate import ULTIMATE_MODE, UltimateState
+
+# game mode -> (size, k) for the modes not played on a 3x3 GameState
+GRID_MODES = {
+    "gomoku": (15, 5),
+}
+
+PLAYERS = ("X", "O")
+# (dx, dy) of the four line directions, in the order runs are kept
+DIRECTIONS = ((1, 0), (0, 1), (1, 1), (-1, 1))
+
+
+def board_kind(game_mode):
+    """What a mode is played on: (size, k) for a GridState, ULTIMATE_MODE, or None for 3x3"""
+    if game_mode == ULTIMATE_MODE:
+        return ULTIMATE_MODE
+    return GRID_MODES.get(game_mode)
+
+
+def new_board(game_mode):
+    """Empty board for a game mode"""
+    if game_mode == ULTIMATE_MODE:
+        return UltimateState()
+    if game_mode in GRID_MODES:
+        return GridState(*GRID_MODES[game_mode])
+    return GameState()
+
+
+def board_from_snapshot(snapshot):
+    """The board a room snapshot describes, for clients to play on"""
+    game_mode = snapshot["game_mode"]
+    if game_mode == ULTIMATE_MODE:
+        return UltimateState.from_rows(snapshot["board"], snapshot.get("last_move"))
+    if game_mode in GRID_MODES:
+        return GridState.from_rows(snapshot["board"], GRID_MODES[game_mode][1])
+    return GameState.from_rows(snapshot["board"])
+
+
+class GridState:
+    """Marks of both players on an N x N board where k in a row wins"""
+    __slots__ = ("size", "k", "width", "x_mask", "o_mask", "runs", "moves", "won", "win_move")
+
+    def __init__(self, size=15, k=5):
+        if not 1 <= k <= size <= 255:
+            raise ValueError(f"need 1 <= k <= size <= 255, got size={size} k={k}")
+        self.size = size
+        self.k = k
+        self.width = size + 1
+        self.clear()
+
+    @classmethod
+    def from_rows(cls, rows, k, empty=''):
+        """Build a state from a nested list, such as a snapshot's board"""
+        state = cls(len(rows), k)
+        for y, row in enumerate(rows):
+            for x, cell in enumerate(row):
+                if cell != empty:
+                    state.place(x, y, cell)
+        return state
+
+    def clear(self):
+        self.x_mask = 0
+        self.o_mask = 0
+        cells = (self.size + 2) * self.width + 1
+        # runs[player] is (across, down, diagonal, anti-diagonal), each indexed by padded cell
+        self.runs = [tuple(bytearray(cells) for _ in DIRECTIONS) for _ in PLAYERS]
+        self.moves = 0
+        self.won = None
+        # (x, y) of the move that won
+        self.win_move = None
+
+    def copy(self):
+        state = GridState.__new__(GridState)
+        state.size, state.k, state.width = self.size, self.k, self.width
+        state.x_mask, state.o_mask = self.x_mask, self.o_mask
+        state.runs = [tuple(bytearray(runs) for runs in player) for player in self.runs]
+        state.moves, state.won, state.win_move = self.moves, self.won, self.win_move
+        return state
+
+    def mask(self, player):
+        """Mask of the given player's marks"""
+        return self.x_mask if player == "X" else self.o_mask
+
+    def occupied(self):
+        return self.x_mask | self.o_mask
+
+    def get(self, x, y, empty=''):
+        """Symbol at (x, y), or empty"""
+        bit = 1 << (y * self.size + x)
+        if self.x_mask & bit:
+            return "X"
+        if self.o_mask & bit:
+            return "O"
+        return empty
+
+    def is_free(self, x, y):
+        size = self.size
+        return 0 <= x < size and 0 <= y < size and not (self.x_mask | self.o_mask) >> (y * size + x) & 1
+
+    def place(self, x, y, player):
+        """Mark (x, y) for player and update the runs through it; False if off the board or taken"""
+        size = self.size
+        if not (0 <= x < size and 0 <= y < size):
+            return False
+        bit = 1 << (y * size + x)
+        if (self.x_mask | self.o_mask) & bit:
+            return False
+        if player == "X":
+            self.x_mask |= bit
+            across, down, diagonal, anti = self.runs[0]
+        else:
+            self.o_mask |= bit
+            across, down, diagonal, anti = self.runs[1]
+        self.moves += 1
+
+        # per direction: the runs ending just before and just after the cell
+        # join up through it, and the new length goes on the two outer ends.
+        # A marked neighbour is always an end, since its run stops at this cell.
+        # Written out four times: this is the hot path, and a loop costs ~30%
+        width = self.width
+        cell = (y + 1) * width + x + 1
+        before, after = across[cell - 1], across[cell + 1]
+        longest = across[cell - before] = across[cell + after] = before + 1 + after
+        before, after = down[cell - width], down[cell + width]
+        length = down[cell - before * width] = down[cell + after * width] = before + 1 + after
+        if length > longest:
+            longest = length
+        step = width + 1
+        before, after = diagonal[cell - step], diagonal[cell + step]
+        length = diagonal[cell - before * step] = diagonal[cell + after * step] = before + 1 + after
+        if length > longest:
+            longest = length
+        step = width - 1
+        before, after = anti[cell - step], anti[cell + step]
+        length = anti[cell - before * step] = anti[cell + after * step] = before + 1 + after
+        if length > longest:
+            longest = length
+
+        if longest >= self.k and self.won is None:
+            self.won = player
+            self.win_move = (x, y)
+        return True
+
+    def has_won(self, player):
+        return self.won == player
+
+    def winner(self):
+        """'X', 'O' or None"""
+        return self.won
+
+    def winning_cells(self, player):
+        """Cells of the run that won, as (x, y) pairs"""
+        if self.won != player:
+            return []
+        mask = self.mask(player)
+        size = self.size
+        won_x, won_y = self.win_move
+        for dx, dy in DIRECTIONS:
+            cells = [(won_x, won_y)]
+            for sign in (-1, 1):
+                x, y = won_x + sign * dx, won_y + sign * dy
+                while 0 <= x < size and 0 <= y < size and mask >> (y * size + x) & 1:
+                    cells.append((x, y))
+                    x, y = x + sign * dx, y + sign * dy
+            if len(cells) >= self.k:
+                return sorted(cells, key=lambda cell: (cell[1], cell[0]))
+        return []
+
+    def move_count(self):
+        return self.moves
+
+    def is_full(self):
+        return self.moves == self.size * self.size
+
+    def to_move(self):
+        """Whose turn it is, assuming X always opens"""
+        return "X" if bin(self.x_mask).count("1") == bin(self.o_mask).count("1") else "O"
+
+    def to_rows(self, empty=''):
+        """Nested list form, as sent in snapshots"""
+        return [[self.get(x, y, empty) for x in range(self.size)] for y in range(self.size)]
+
+    def __eq__(self, other):
+        return (isinstance(other, GridState) and (self.size, self.k) == (other.size, other.k)
+                and self.x_mask == other.x_mask and self.o_mask == other.o_mask)
+
+    def __repr__(self):
+        return f"GridState(size={self.size}, k={self.k}, moves={self.moves})"
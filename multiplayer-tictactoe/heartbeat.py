@@ -0,0 +1,142 @@
+"""Application-level heartbeats, so dead connections are found and closed.
+
+A peer that vanishes without a FIN or RST (a pulled cable, a NAT that
+forgot the mapping, a laptop put to sleep) leaves a half-open connection:
+the server's recv just waits, and the player's seat stays taken. To find
+those, the server pings any connection it hasn't heard from for
+``interval`` seconds, and gives up on one that is still silent
+``timeout`` seconds after the ping. Anything the peer sends counts, not just
+a pong, so a client that is playing is never pinged at all.
+
+Every connection has one deadline, kept in a TimingWheel: the time it
+should next be pinged, or given up on. Hearing from a connection only
+stamps ``last_seen``. The deadline is moved when it comes due, so a busy
+connection costs one wheel entry per interval, not one per message. Each
+check only looks at the wheel slots whose time has passed. Its cost
+depends on how many deadlines are due, not on how many connections are
+open.
+"""
+import math
+
+PING = {"type": "ping"}
+PONG = {"type": "pong"}
+HEARTBEAT_TYPES = ("ping", "pong")
+
+# seconds of silence before a ping, and then before giving up
+DEFAULT_PING_INTERVAL = 15.0
+DEFAULT_PING_TIMEOUT = 10.0
+# seconds per wheel slot: deadlines fire up to this late
+DEFAULT_TICK = 0.5
+
+
+class TimingWheel:
+    """Keys filed by deadline into a ring of slots, one per ``tick`` seconds.
+
+    The ring covers ``span`` seconds. A deadline further out than that still
+    works, but it is looked at (and left) every time round the ring until
+    it is due.
+    """
+
+    def __init__(self, tick, span, now=0.0):
+        if tick <= 0:
+            raise ValueError("tick must be positive")
+        self.tick = tick
+        self.slots = [{} for _ in range(math.ceil(span / tick) + 1)]
+        # key -> the slot it is in
+        self.where = {}
+        # number of the next tick to expire
+        self.current = int(now // tick)
+
+    def __len__(self):
+        return len(self.where)
+
+    def __contains__(self, key):
+        return key in self.where
+
+    def schedule(self, key, deadline):
+        """File key to come due at deadline, replacing any deadline it had"""
+        self.cancel(key)
+        tick = max(int(deadline // self.tick), self.current)
+        slot = self.slots[tick % len(self.slots)]
+        slot[key] = tick
+        self.where[key] = slot
+
+    def cancel(self, key):
+        slot = self.where.pop(key, None)
+        if slot is not None:
+            del slot[key]
+
+    def expire(self, now):
+        """Remove and return the keys whose deadline is before the current tick of now"""
+        end = int(now // self.tick)
+        size = len(self.slots)
+        expired = []
+        # after a stall longer than the ring, one lap visits every slot
+        for tick in range(max(self.current, end - size), end):
+            slot = self.slots[tick % size]
+            if not slot:
+                continue
+            due = [key for key, key_tick in slot.items() if key_tick <= tick]
+            for key in due:
+                del slot[key]
+                del self.where[key]
+            expired.extend(due)
+        self.current = max(self.current, end)
+        return expired
+
+
+class Heartbeats:
+    """Pings idle connections and names the ones that stopped answering.
+
+    A connection needs ``send`` and a ``last_seen`` time, which its reader
+    updates whenever data arrives. The caller supplies the clock readings,
+    so it decides which clock and which lock.
+    """
+
+    def __init__(self, interval=DEFAULT_PING_INTERVAL, timeout=DEFAULT_PING_TIMEOUT, tick=DEFAULT_TICK, now=0.0):
+        if interval <= 0 or timeout <= 0:
+            raise ValueError("ping interval and timeout must be positive")
+        self.interval = interval
+        self.timeout = timeout
+        self.wheel = TimingWheel(tick, max(interval, timeout), now)
+        # connection -> when it was sent a ping it hasn't answered yet
+        self.pinged = {}
+        # deadlines looked at, over all checks
+        self.due = 0
+        self.pings = 0
+        self.reaped = 0
+
+    def watch(self, conn, now):
+        """Start watching a new connection"""
+        conn.last_seen = now
+        self.wheel.schedule(conn, now + self.interval)
+
+    def forget(self, conn):
+        """Stop watching a connection that has closed"""
+        self.wheel.cancel(conn)
+        self.pinged.pop(conn, None)
+
+    def check(self, now):
+        """Ping connections that have gone quiet; return those that never answered"""
+        dead = []
+        expired = self.wheel.expire(now)
+        self.due += len(expired)
+        for conn in expired:
+            pinged = self.pinged.pop(conn, None)
+            if pinged is not None and conn.last_seen < pinged:
+                # nothing since the ping, and its timeout is up
+                dead.append(conn)
+            elif now - conn.last_seen >= self.interval:
+                conn.send(PING)
+                self.pings += 1
+                self.pinged[conn] = now
+                self.wheel.schedule(conn, now + self.timeout)
+            else:
+                # heard from since this deadline was set
+                self.wheel.schedule(conn, conn.last_seen + self.interval)
+        self.reaped += len(dead)
+        return dead
+
+    def stats(self):
+        return {"watched": len(self.wheel), "due": self.due, "pings": self.pings, "reaped": self.reaped,
+                "interval": self.interval, "timeout": self.timeout}
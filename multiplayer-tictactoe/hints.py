@@ -0,0 +1,247 @@
+"""Best-move hints for a room's position, cached across every room.
+
+A hint is worked out once per position up to symmetry. The board is keyed
+by KBoard's canonical Zobrist hash, which is the same for all 8 rotations
+and reflections of a position, and the analysis is done on that canonical
+image: the tablebase on 3x3, a short alpha-beta search on bigger boards.
+What gets stored is the score and the best moves in canonical cells, so a
+cached entry serves every symmetric copy; the moves are turned back
+through the symmetry on the way out.
+
+The cache is a bounded LRU shared by all rooms in the process, so the
+common openings that thousands of rooms reach are answered without a
+lookup or search of their own. stats() reports hits, misses and
+evictions.
+
+A search takes a good part of a second of CPU, so request() never runs one
+on the server's thread. A cache miss on a big board goes to a pool of
+worker processes, as bot moves do in bots.BotPool, and the reply comes
+back through the server's ``schedule(delay, callback)``. Rooms asking
+about the same position share one search, and once ``max_pending``
+positions are being searched, further misses are turned away.
+"""
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from game_state import GameState
+from grid_state import GridState
+from kboard import KBoard
+from search import SearchEngine
+from tablebase import get_tablebase
+
+DEFAULT_CACHE_SIZE = 1 << 16
+# seconds of search for a hint on a board too big for the tablebase
+DEFAULT_TIME_BUDGET = 0.05
+# positions searched at once before more misses are turned away
+DEFAULT_MAX_PENDING = 16
+
+# each pool worker's own search engine
+_engine = None
+
+
+class HintCache:
+    """Least-recently-used map with a fixed number of entries"""
+
+    def __init__(self, capacity=DEFAULT_CACHE_SIZE):
+        if capacity < 1:
+            raise ValueError("hint cache capacity must be at least 1")
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+def permute(mask, permutation):
+    """mask with every cell moved to permutation[cell]"""
+    image = 0
+    cell = 0
+    while mask:
+        if mask & 1:
+            image |= 1 << permutation[cell]
+        mask >>= 1
+        cell += 1
+    return image
+
+
+def search_hint(size, k, x_mask, o_mask, time_budget):
+    """(score, mask of best cells) for a canonical position; runs in a pool worker"""
+    global _engine
+    if _engine is None:
+        _engine = SearchEngine()
+    result = _engine.search(KBoard(size, k, x_mask, o_mask), time_budget=time_budget)
+    return result.score, 1 << result.move
+
+
+def table_hint(state):
+    """(score, mask of best cells) for a 3x3 GameState, from the tablebase"""
+    table = get_tablebase()
+    best = 0
+    for cell in table.best_moves(state):
+        best |= 1 << cell
+    return table.value(state), best
+
+
+class HintService:
+    """Answers hint requests for GameState and GridState boards"""
+
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE, time_budget=DEFAULT_TIME_BUDGET, workers=None,
+                 max_pending=DEFAULT_MAX_PENDING):
+        self.cache = HintCache(cache_size)
+        self.time_budget = time_budget
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor = None
+        # cache key -> replies waiting for that position's search
+        self.searching = {}
+        self.refused = 0
+
+    def locate(self, board):
+        """(size, k, cache key, symmetry, geometry) for board, or None if it can't be analysed"""
+        if isinstance(board, GameState):
+            size, k = 3, 3
+        elif isinstance(board, GridState):
+            size, k = board.size, board.k
+        else:
+            return None
+        position = KBoard(size, k, board.x_mask, board.o_mask)
+        key, symmetry = position.canonical()
+        return size, k, (size, k, key), symmetry, position.geometry
+
+    def canonical(self, board, symmetry, geometry):
+        """(x_mask, o_mask) of board turned into its canonical image"""
+        permutation = geometry.permutations[symmetry]
+        return permute(board.x_mask, permutation), permute(board.o_mask, permutation)
+
+    def moves(self, entry, size, symmetry, geometry):
+        """(score, [(x, y), ...]) for a cache entry, turned back to the board asked about"""
+        score, best = entry
+        inverse = geometry.inverses[symmetry]
+        cells = sorted(inverse[cell] for cell in range(geometry.cells) if best >> cell & 1)
+        return score, [(cell % size, cell // size) for cell in cells]
+
+    def best_moves(self, board):
+        """(score, [(x, y), ...]) for the side to move, or None if the board can't be analysed.
+
+        The score is from the mover's point of view: 1, 0 or -1 on 3x3,
+        and the search score on bigger boards, where a forced win or loss
+        in n moves is +/-(search.WIN - n). A miss on a big board is searched
+        here and now, so this is for offline use; servers call request().
+        """
+        located = self.locate(board)
+        if located is None:
+            return None
+        if board.winner() is not None or board.is_full():
+            return 0, []
+        size, k, key, symmetry, geometry = located
+        entry = self.cache.get(key)
+        if entry is None:
+            x_mask, o_mask = self.canonical(board, symmetry, geometry)
+            if (size, k) == (3, 3):
+                entry = table_hint(GameState(x_mask, o_mask))
+            else:
+                entry = search_hint(size, k, x_mask, o_mask, self.time_budget)
+            self.cache.put(key, entry)
+        return self.moves(entry, size, symmetry, geometry)
+
+    def request(self, board, reply, schedule):
+        """Answer with reply(analysis), analysis being what best_moves returns.
+
+        Anything that needs no search is answered before this returns. A
+        search runs in the pool, and its reply goes through
+        schedule(delay, callback), so it runs on the server's thread or
+        loop. Returns False, without replying, if too many searches are
+        already waiting.
+        """
+        located = self.locate(board)
+        if located is None or schedule is None or board.winner() is not None or board.is_full():
+            # nothing to search, or no server to hand a result back to
+            reply(self.best_moves(board))
+            return True
+        size, k, key, symmetry, geometry = located
+        if (size, k) == (3, 3) or key in self.cache.entries:
+            reply(self.best_moves(board))
+            return True
+
+        def answer(entry):
+            reply(None if entry is None else self.moves(entry, size, symmetry, geometry))
+
+        waiting = self.searching.get(key)
+        if waiting is not None:
+            waiting.append(answer)
+            return True
+        if len(self.searching) >= self.max_pending:
+            self.refused += 1
+            return False
+        self.cache.misses += 1
+        self.searching[key] = [answer]
+        if self.executor is None:
+            # spawned, as in BotPool, so workers don't inherit client sockets
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        future = self.executor.submit(search_hint, size, k, *self.canonical(board, symmetry, geometry),
+                                      self.time_budget)
+
+        def done(future):
+            # on a pool thread: hand back to the server for the rest
+            if not future.cancelled():
+                schedule(0, lambda: self.finish(key, future))
+
+        future.add_done_callback(done)
+        return True
+
+    def finish(self, key, future):
+        """Cache a finished search and answer everyone waiting on it; runs on the server's thread"""
+        entry = None
+        if future.exception() is None:
+            entry = future.result()
+            self.cache.put(key, entry)
+        for answer in self.searching.pop(key, ()):
+            answer(entry)
+
+    def stats(self):
+        return {**self.cache.stats(), "searching": len(self.searching), "refused": self.refused}
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+        self.searching.clear()
+
+
+_shared = None
+
+
+def get_hint_service():
+    """The process-wide hint service, shared by every room"""
+    global _shared
+    if _shared is None:
+        _shared = HintService()
+    return _shared
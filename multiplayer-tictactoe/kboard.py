@@ -0,0 +1,190 @@
+"""N x N boards where k marks in a row win.
+
+The bit layout is the one game_state uses (bit ``y * size + x`` in one mask
+per player), so a 3x3 GameState's masks can be handed over unchanged.
+Everything that only depends on (size, k) lives in a shared Geometry:
+
+* every k-long line, and for each cell the lines through it, so a win can
+  be checked incrementally from the last move alone;
+* the 8 symmetries of the square as cell permutations;
+* Zobrist keys, pre-permuted per symmetry, so a board keeps the hashes of
+  all 8 of its images up to date with one XOR each per move. The smallest
+  of them is a key shared by every symmetric copy of the position.
+"""
+import random
+from functools import lru_cache
+
+PLAYERS = ("X", "O")
+
+# the 8 symmetries of the square as (x, y) -> (x', y') for a board of side n
+SYMMETRIES = (
+    lambda x, y, n: (x, y),
+    lambda x, y, n: (n - 1 - y, x),
+    lambda x, y, n: (n - 1 - x, n - 1 - y),
+    lambda x, y, n: (y, n - 1 - x),
+    lambda x, y, n: (n - 1 - x, y),
+    lambda x, y, n: (x, n - 1 - y),
+    lambda x, y, n: (y, x),
+    lambda x, y, n: (n - 1 - y, n - 1 - x),
+)
+
+
+class Geometry:
+    """Lines, symmetries and hash keys for one (size, k)"""
+
+    def __init__(self, size, k):
+        if not 1 <= k <= size:
+            raise ValueError(f"need 1 <= k <= size, got size={size} k={k}")
+        self.size = size
+        self.k = k
+        self.cells = size * size
+        self.full_mask = (1 << self.cells) - 1
+
+        self.lines = []
+        for y in range(size):
+            for x in range(size):
+                for dx, dy in ((1, 0), (0, 1), (1, 1), (1, -1)):
+                    end_x, end_y = x + dx * (k - 1), y + dy * (k - 1)
+                    if 0 <= end_x < size and 0 <= end_y < size:
+                        self.lines.append(sum(1 << ((y + dy * i) * size + x + dx * i) for i in range(k)))
+        self.lines_through = [tuple(line for line in self.lines if line >> cell & 1)
+                              for cell in range(self.cells)]
+
+        # permutations[s][cell] is where symmetry s sends cell
+        self.permutations = []
+        for symmetry in SYMMETRIES:
+            permutation = []
+            for cell in range(self.cells):
+                x, y = symmetry(cell % size, cell // size, size)
+                permutation.append(y * size + x)
+            self.permutations.append(tuple(permutation))
+        self.inverses = []
+        for permutation in self.permutations:
+            inverse = [0] * self.cells
+            for cell, image in enumerate(permutation):
+                inverse[image] = cell
+            self.inverses.append(tuple(inverse))
+
+        # fixed seed so keys, and anything keyed by them, match between runs
+        rng = random.Random(size * 1000 + k)
+        keys = [[rng.getrandbits(64) for _ in range(self.cells)] for _ in PLAYERS]
+        self.symmetric_keys = [
+            [tuple(keys[p][permutation[cell]] for permutation in self.permutations)
+             for cell in range(self.cells)]
+            for p in range(len(PLAYERS))
+        ]
+
+        # cells nearest the centre first, a good default move order
+        centre = (size - 1) / 2
+        self.centre_order = sorted(range(self.cells),
+                                   key=lambda c: abs(c % size - centre) + abs(c // size - centre))
+
+
+@lru_cache(maxsize=None)
+def get_geometry(size, k):
+    return Geometry(size, k)
+
+
+class KBoard:
+    """Marks on an N x N board, with X to move first and undo support"""
+    __slots__ = ("geometry", "x_mask", "o_mask", "hashes", "history")
+
+    def __init__(self, size=3, k=3, x_mask=0, o_mask=0):
+        self.geometry = get_geometry(size, k)
+        self.x_mask = 0
+        self.o_mask = 0
+        self.hashes = (0,) * len(SYMMETRIES)
+        self.history = []
+        for cell in range(self.geometry.cells):
+            if x_mask >> cell & 1:
+                self._set(cell, 0)
+            elif o_mask >> cell & 1:
+                self._set(cell, 1)
+
+    @property
+    def size(self):
+        return self.geometry.size
+
+    @property
+    def k(self):
+        return self.geometry.k
+
+    def _set(self, cell, p):
+        """Toggle player p's mark on cell, keeping all 8 hashes in step"""
+        if p == 0:
+            self.x_mask ^= 1 << cell
+        else:
+            self.o_mask ^= 1 << cell
+        keys = self.geometry.symmetric_keys[p][cell]
+        self.hashes = tuple(h ^ key for h, key in zip(self.hashes, keys))
+
+    def occupied(self):
+        return self.x_mask | self.o_mask
+
+    def move_count(self):
+        return bin(self.x_mask | self.o_mask).count("1")
+
+    def to_move(self):
+        """'X' or 'O', assuming X always opens"""
+        return "X" if bin(self.x_mask).count("1") == bin(self.o_mask).count("1") else "O"
+
+    def free_cells(self):
+        free = self.geometry.full_mask ^ (self.x_mask | self.o_mask)
+        return [cell for cell in range(self.geometry.cells) if free >> cell & 1]
+
+    def is_full(self):
+        return self.x_mask | self.o_mask == self.geometry.full_mask
+
+    def play(self, cell):
+        """Mark cell for the side to move; False if it is off the board or taken"""
+        if not 0 <= cell < self.geometry.cells or (self.x_mask | self.o_mask) >> cell & 1:
+            return False
+        self._set(cell, 0 if self.to_move() == "X" else 1)
+        self.history.append(cell)
+        return True
+
+    def undo(self):
+        """Take back the last move played"""
+        cell = self.history.pop()
+        self._set(cell, 0 if self.x_mask >> cell & 1 else 1)
+        return cell
+
+    def wins_at(self, cell):
+        """Whether the mark on cell completes a line, checking only lines through it"""
+        mask = self.x_mask if self.x_mask >> cell & 1 else self.o_mask
+        for line in self.geometry.lines_through[cell]:
+            if mask & line == line:
+                return True
+        return False
+
+    def winner(self):
+        """'X', 'O' or None, checking every line"""
+        for line in self.geometry.lines:
+            if self.x_mask & line == line:
+                return "X"
+            if self.o_mask & line == line:
+                return "O"
+        return None
+
+    def canonical(self):
+        """(key, symmetry) for the smallest of the 8 symmetric hashes"""
+        hashes = self.hashes
+        key = min(hashes)
+        return key, hashes.index(key)
+
+    def copy(self):
+        board = KBoard(self.size, self.k)
+        board.x_mask, board.o_mask = self.x_mask, self.o_mask
+        board.hashes = self.hashes
+        board.history = list(self.history)
+        return board
+
+    def __repr__(self):
+        rows = []
+        for y in range(self.size):
+            row = ""
+            for x in range(self.size):
+                bit = 1 << (y * self.size + x)
+                row += "X" if self.x_mask & bit else "O" if self.o_mask & bit else "."
+            rows.append(row)
+        return f"KBoard(size={self.size}, k={self.k})\n" + "\n".join(rows)
@@ -0,0 +1,138 @@
+"""Matchmaking: per-mode FIFO queues of players waiting for an opponent.
+
+Like Room, the lobby does no I/O. The server enqueues a connection and gets
+back the opponent it was paired with, if any, then seats both in a new room.
+
+Without a rating window each game mode has a single FIFO, so a match is one
+popleft. With ``rating_window`` set, waiting players are also bucketed by
+``rating // rating_window``; a newcomer only looks at the heads of its own
+bucket and the two next to it, which keeps matching O(1) however many
+players are waiting. Players who leave the queue are only flagged, and get
+skipped when they reach the head of their bucket.
+"""
+import time
+from collections import deque
+
+from grid_state import GRID_MODES
+from ultimate import ULTIMATE_MODE
+
+GAME_MODES = ("single_game", "best_of_3", *GRID_MODES, ULTIMATE_MODE)
+DEFAULT_RATING = 1500
+
+# how many recent waits the time-to-match figures are computed over
+STATS_WINDOW = 1024
+
+
+class Ticket:
+    """One waiting player"""
+    __slots__ = ("conn", "game_mode", "rating", "enqueued_at", "active")
+
+    def __init__(self, conn, game_mode, rating, enqueued_at):
+        self.conn = conn
+        self.game_mode = game_mode
+        self.rating = rating
+        self.enqueued_at = enqueued_at
+        self.active = True
+
+
+class Lobby:
+    """Pairs up waiting players of the same game mode, oldest first"""
+
+    def __init__(self, game_modes=GAME_MODES, rating_window=None):
+        if rating_window is not None and rating_window <= 0:
+            raise ValueError("rating_window must be positive")
+        self.rating_window = rating_window
+        # game mode -> rating bucket -> tickets, oldest first
+        self.queues = {mode: {} for mode in game_modes}
+        self.depth = dict.fromkeys(game_modes, 0)
+        self.tickets = {}
+        self.matches = 0
+        self.waits = deque(maxlen=STATS_WINDOW)
+
+    def is_queued(self, conn):
+        return conn in self.tickets
+
+    def bucket(self, rating):
+        if self.rating_window is None:
+            return 0
+        return rating // self.rating_window
+
+    def enqueue(self, conn, game_mode, rating=None):
+        """Queue conn, or pair it at once; returns the opponent's connection or None"""
+        buckets = self.queues.get(game_mode)
+        if buckets is None:
+            raise ValueError(f"unknown game mode {game_mode!r}")
+        if rating is None:
+            rating = DEFAULT_RATING
+        now = time.perf_counter()
+
+        opponent = self.find_opponent(buckets, rating)
+        if opponent is not None:
+            del self.tickets[opponent.conn]
+            self.depth[game_mode] -= 1
+            self.matches += 1
+            self.waits.append(now - opponent.enqueued_at)
+            return opponent.conn
+
+        ticket = Ticket(conn, game_mode, rating, now)
+        buckets.setdefault(self.bucket(rating), deque()).append(ticket)
+        self.tickets[conn] = ticket
+        self.depth[game_mode] += 1
+        return None
+
+    def find_opponent(self, buckets, rating):
+        """Take the longest-waiting player within the rating window"""
+        home = self.bucket(rating)
+        keys = (home,) if self.rating_window is None else (home - 1, home, home + 1)
+        best = None
+        for key in keys:
+            queue = buckets.get(key)
+            if queue is None:
+                continue
+            # players who left are dropped once they reach the front
+            while queue and not queue[0].active:
+                queue.popleft()
+            if not queue:
+                del buckets[key]
+                continue
+            head = queue[0]
+            if self.rating_window is not None and abs(head.rating - rating) > self.rating_window:
+                continue
+            if best is None or head.enqueued_at < best[1].enqueued_at:
+                best = (key, head)
+        if best is None:
+            return None
+        key, ticket = best
+        queue = buckets[key]
+        queue.popleft()
+        if not queue:
+            del buckets[key]
+        return ticket
+
+    def remove(self, conn):
+        """Take conn out of the queue if it is waiting"""
+        ticket = self.tickets.pop(conn, None)
+        if ticket is None:
+            return False
+        ticket.active = False
+        self.depth[ticket.game_mode] -= 1
+        return True
+
+    def stats(self):
+        """Queue depth per game mode and time-to-match over recent matches"""
+        waits = sorted(self.waits)
+        if waits:
+            time_to_match = {
+                "mean_ms": round(sum(waits) / len(waits) * 1000, 3),
+                "p50_ms": round(waits[len(waits) // 2] * 1000, 3),
+                "p99_ms": round(waits[min(len(waits) - 1, len(waits) * 99 // 100)] * 1000, 3),
+                "max_ms": round(waits[-1] * 1000, 3),
+            }
+        else:
+            time_to_match = {}
+        return {
+            "queue_depth": dict(self.depth),
+            "waiting": len(self.tickets),
+            "matches": self.matches,
+            "time_to_match": time_to_match,
+        }
@@ -0,0 +1,264 @@
+"""Write-ahead log of every room's moves, so matches survive a server restart.
+
+Rooms report each change to the log as it happens (opened, game mode set,
+move accepted, restart, board reset by a disconnect, seat taken or given
+up, closed). Each report is one fixed 8-byte record:
+
+    room id (u32), kind (u8), then three u8 fields: the game mode for
+    OPEN and MODE, x, y and the player (1 = X, 2 = O) for MOVE, the
+    player for SEAT and LEAVE, unused otherwise. A LAST_ROOM record
+    carries the highest room id opened so far in place of a room id.
+
+Records are written to the file as they come in, so a crash of the server
+process never loses an accepted move. fsync, which is what makes them
+survive the machine going down too, is group-committed: a background
+thread syncs whatever was written in the last ``fsync_interval`` seconds
+with one call. An interval of 0 syncs after every record, and None never
+syncs and leaves it to the OS.
+
+On start-up, recover() replays the log through the same Room methods the
+live game uses, which rebuilds the board, turn, round and best-of-3 score
+of every room that was still open. A torn last record, left by a crash in
+the middle of a write, is cut off. The log is then compacted to the
+records of those open rooms, so it only grows with the games in progress,
+behind a LAST_ROOM record: room ids keep counting up from where they were,
+so a closed room's id is never handed out again.
+
+Resume tokens aren't written to the log. Each one is an HMAC of the room
+id and how many seats the room has handed out, keyed by a secret kept next
+to the log in ``PATH.key``, so replaying the SEAT records gives every seat
+that was taken when the server stopped its token back, and as room ids are
+never reused, no token is ever issued twice. A new log gets a new secret.
+Players get back in with the token from their welcome, as after any
+dropped connection.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import struct
+import threading
+
+from codec import MODE_IDS, MODES
+from room import Room
+
+RECORD = struct.Struct("<IBBBB")
+OPEN, MODE, MOVE, RESTART, RESET, CLOSE, SEAT, LEAVE, LAST_ROOM = range(1, 10)
+PLAYER_IDS = {"X": 1, "O": 2}
+PLAYERS = {1: "X", 2: "O"}
+
+# seconds between syncs: up to this much play can be lost if the machine dies
+DEFAULT_FSYNC_INTERVAL = 0.1
+# records read per chunk when replaying
+REPLAY_CHUNK = 4096
+KEY_SIZE = 32
+# seconds a seat restored from the log waits for its player, whatever the grace period
+DEFAULT_RESTORE_TIMEOUT = 120
+
+
+def load_key(path, renew=False):
+    """The secret that resume tokens for the log at path are made with, created on first use or renewed"""
+    key_path = path + ".key"
+    if not renew:
+        try:
+            with open(key_path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+    key = secrets.token_bytes(KEY_SIZE)
+    temp = key_path + ".tmp"
+    fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        os.write(fd, key)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(temp, key_path)
+    return key
+
+
+def seat_token(key, room_id, seating):
+    """Resume token for the seating'th seat a room hands out"""
+    digest = hmac.new(key, f"{room_id}.{seating}".encode(), hashlib.sha256).digest()
+    return f"{room_id}." + base64.urlsafe_b64encode(digest[:16]).rstrip(b"=").decode()
+
+
+class MatchLog:
+    """Append-only record of room changes, synced to disk in groups"""
+
+    def __init__(self, path, fsync_interval=DEFAULT_FSYNC_INTERVAL):
+        if fsync_interval is not None and fsync_interval < 0:
+            raise ValueError("fsync_interval must be None, 0 or positive")
+        self.path = path
+        self.fsync_interval = fsync_interval
+        # O_APPEND: every record is a single write at the end of the file
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        # an empty log has no tokens out, so it starts over with a new secret
+        self.key = load_key(path, renew=os.fstat(self.fd).st_size == 0)
+        self.records = 0
+        self.syncs = 0
+        # set when a record has been written since the last sync
+        self.dirty = False
+        self.stopped = threading.Event()
+        self.flusher = None
+        if fsync_interval:
+            self.flusher = threading.Thread(target=self.flush_loop, daemon=True)
+            self.flusher.start()
+
+    def append(self, room_id, kind, a=0, b=0, c=0):
+        os.write(self.fd, RECORD.pack(room_id, kind, a, b, c))
+        self.records += 1
+        if self.fsync_interval == 0:
+            os.fsync(self.fd)
+            self.syncs += 1
+        else:
+            self.dirty = True
+
+    def flush_loop(self):
+        """Sync once per interval if anything was written; runs on its own thread"""
+        while not self.stopped.wait(self.fsync_interval):
+            self.sync()
+
+    def sync(self):
+        if self.dirty:
+            # cleared first: a record written during the fsync marks the log
+            # dirty again and is covered by the next one
+            self.dirty = False
+            os.fsync(self.fd)
+            self.syncs += 1
+
+    # what a Room reports
+
+    def open_room(self, room_id, game_mode):
+        self.append(room_id, OPEN, MODE_IDS[game_mode])
+
+    def game_mode(self, room_id, game_mode):
+        self.append(room_id, MODE, MODE_IDS[game_mode])
+
+    def move(self, room_id, x, y, player):
+        self.append(room_id, MOVE, x, y, PLAYER_IDS[player])
+
+    def restart(self, room_id):
+        self.append(room_id, RESTART)
+
+    def reset(self, room_id):
+        self.append(room_id, RESET)
+
+    def close_room(self, room_id):
+        self.append(room_id, CLOSE)
+
+    def seat(self, room_id, player, seating):
+        """Record a seat being taken; returns its resume token"""
+        self.append(room_id, SEAT, PLAYER_IDS[player])
+        return seat_token(self.key, room_id, seating)
+
+    def leave(self, room_id, player):
+        self.append(room_id, LEAVE, PLAYER_IDS[player])
+
+    def stats(self):
+        return {"records": self.records, "syncs": self.syncs, "fsync_interval": self.fsync_interval}
+
+    def close(self):
+        self.stopped.set()
+        if self.flusher is not None:
+            self.flusher.join()
+        if self.fsync_interval is not None:
+            self.sync()
+        os.close(self.fd)
+
+
+def read_records(path):
+    """(room_id, kind, a, b, c) for every whole record in the file, streamed"""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(RECORD.size * REPLAY_CHUNK)
+            whole = len(chunk) - len(chunk) % RECORD.size
+            yield from RECORD.iter_unpack(chunk[:whole])
+            if len(chunk) < RECORD.size * REPLAY_CHUNK:
+                return
+
+
+def apply_record(rooms, key, room_id, kind, a, b, c):
+    """Replay one record onto rooms, with key for the tokens; False if it doesn't fit what came before"""
+    if kind == LAST_ROOM:
+        # read by recover
+        return True
+    if kind == OPEN:
+        if room_id in rooms or a not in MODES:
+            return False
+        rooms[room_id] = Room(room_id, MODES[a])
+        return True
+    room = rooms.get(room_id)
+    if room is None:
+        return False
+    if kind == MOVE:
+        player = PLAYERS.get(c)
+        if player is None or room.game_over or player != room.current_player or not room.is_valid_move(a, b):
+            return False
+        room.apply_move(a, b, player)
+    elif kind == MODE:
+        if a not in MODES:
+            return False
+        room.set_game_mode(MODES[a])
+    elif kind == RESTART:
+        room.handle_restart()
+    elif kind == RESET:
+        room.reset_board()
+    elif kind == SEAT:
+        if a not in PLAYERS:
+            return False
+        room.seatings += 1
+        room.tokens[PLAYERS[a]] = seat_token(key, room_id, room.seatings)
+    elif kind == LEAVE:
+        if a not in PLAYERS:
+            return False
+        room.tokens.pop(PLAYERS[a], None)
+    elif kind == CLOSE:
+        del rooms[room_id]
+    else:
+        return False
+    return True
+
+
+def recover(path):
+    """(rooms, last room id): the rooms still open at the end of the log at path, by id,
+    and the highest room id it has opened, with the log compacted to them.
+
+    Replay stops at the first record that is torn or doesn't follow from
+    the ones before it, and everything from there on is dropped. A room
+    comes back with the tokens of the seats that were taken; the server
+    holds those seats (Room.hold_seats) for their players to resume.
+    """
+    rooms = {}
+    if not os.path.exists(path):
+        return rooms, 0
+    key = load_key(path)
+    replayed = last_room_id = 0
+    for record in read_records(path):
+        if not apply_record(rooms, key, *record):
+            print(f"Match log {path}: stopped replaying at bad record {replayed}")
+            break
+        replayed += 1
+        last_room_id = max(last_room_id, record[0])
+
+    # rewrite the log with only the open rooms' records, then swap it in
+    temp = path + ".compact"
+    with open(temp, "wb") as out:
+        if last_room_id:
+            out.write(RECORD.pack(last_room_id, LAST_ROOM, 0, 0, 0))
+        for count, record in enumerate(read_records(path)):
+            if count == replayed:
+                break
+            if record[0] in rooms:
+                out.write(RECORD.pack(*record))
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(temp, path)
+    # and make the rename itself durable
+    directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+    return rooms, last_room_id
@@ -0,0 +1,204 @@
+"""Monte Carlo tree search for k-in-a-row boards.
+
+Where alpha-beta runs out of depth (wide boards, long games), MCTS only
+needs to play random games to the end quickly. Each iteration walks the
+tree by UCT, adds one node, finishes the game with random moves and feeds
+the result back up. Playouts work on the two bit masks directly, and a win
+is checked only through the cell just played, as in KBoard.
+
+Search can be split over a process pool (root parallelisation): every
+worker grows its own tree from the same position with its own random seed,
+and their visit counts per root move are summed when the budget runs out.
+
+MCTSPlayer has the same choose_cell / choose_move interface as
+ai.AIPlayer, so it can stand in wherever that is used, and it also plays
+the server's bigger k-in-a-row boards (grid_state.GridState).
+"""
+import math
+import multiprocessing
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from grid_state import GridState
+from kboard import KBoard, get_geometry
+
+DEFAULT_TIME_BUDGET = 0.5
+EXPLORATION = math.sqrt(2)
+
+# playout results, as an index into (X, O) or a draw
+X_WINS, O_WINS, DRAW = 0, 1, 2
+
+MCTSResult = namedtuple("MCTSResult", ["move", "visits", "playouts", "elapsed", "workers"])
+
+
+class Node:
+    """One position in the tree, reached by ``player`` marking ``move``"""
+    __slots__ = ("move", "player", "parent", "children", "untried", "wins", "visits", "result")
+
+    def __init__(self, move, player, parent, untried, result=None):
+        self.move = move
+        self.player = player
+        self.parent = parent
+        self.children = []
+        self.untried = untried
+        # from the point of view of player: 1 per win, 0.5 per draw
+        self.wins = 0.0
+        self.visits = 0
+        # X_WINS, O_WINS or DRAW if the game is over here
+        self.result = result
+
+
+def playout(lines_through, masks, player, free, rng):
+    """Random moves until someone wins or the board fills up"""
+    rng.shuffle(free)
+    for cell in free:
+        mask = masks[player] | 1 << cell
+        masks[player] = mask
+        for line in lines_through[cell]:
+            if mask & line == line:
+                return player
+        player ^= 1
+    return DRAW
+
+
+def run_search(size, k, x_mask, o_mask, time_budget, exploration=EXPLORATION, seed=None):
+    """Grow one tree for time_budget seconds; returns ({move: visits}, playouts).
+
+    Module level, and taking plain values, so a process pool can run it.
+    """
+    geometry = get_geometry(size, k)
+    lines_through = geometry.lines_through
+    cells = geometry.cells
+    rng = random.Random(seed)
+    root_player = 0 if bin(x_mask).count("1") == bin(o_mask).count("1") else 1
+
+    def free_cells(occupied):
+        return [cell for cell in range(cells) if not occupied >> cell & 1]
+
+    root = Node(None, root_player ^ 1, None, free_cells(x_mask | o_mask))
+    deadline = time.perf_counter() + time_budget
+    playouts = 0
+    while time.perf_counter() < deadline:
+        node = root
+        masks = [x_mask, o_mask]
+
+        # selection: follow UCT while every move here has been tried
+        while not node.untried and node.children:
+            log_visits = math.log(node.visits)
+            best_score = -1.0
+            for child in node.children:
+                score = child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits)
+                if score > best_score:
+                    best_score, node = score, child
+            masks[node.player] |= 1 << node.move
+
+        # expansion: add one untried move
+        if node.untried and node.result is None:
+            untried = node.untried
+            move = untried.pop(rng.randrange(len(untried)))
+            player = node.player ^ 1
+            mask = masks[player] | 1 << move
+            masks[player] = mask
+            result = None
+            for line in lines_through[move]:
+                if mask & line == line:
+                    result = player
+                    break
+            free = free_cells(masks[0] | masks[1]) if result is None else []
+            if result is None and not free:
+                result = DRAW
+            child = Node(move, player, node, free, result)
+            node.children.append(child)
+            node = child
+
+        # simulation
+        if node.result is not None:
+            result = node.result
+        else:
+            result = playout(lines_through, masks, node.player ^ 1, list(node.untried), rng)
+
+        # backpropagation
+        while node is not None:
+            node.visits += 1
+            if result == node.player:
+                node.wins += 1.0
+            elif result == DRAW:
+                node.wins += 0.5
+            node = node.parent
+        playouts += 1
+
+    return {child.move: child.visits for child in root.children}, playouts
+
+
+class MCTSEngine:
+    """Runs run_search in this process, or across a pool of workers"""
+
+    def __init__(self, workers=1, time_budget=DEFAULT_TIME_BUDGET, exploration=EXPLORATION, seed=None):
+        self.workers = workers
+        self.time_budget = time_budget
+        self.exploration = exploration
+        self.rng = random.Random(seed)
+        self.pool = None
+
+    def search(self, board, time_budget=None):
+        """Most visited move for the side to move on a KBoard"""
+        if board.is_full():
+            raise ValueError("no moves left to search")
+        budget = self.time_budget if time_budget is None else time_budget
+        args = (board.size, board.k, board.x_mask, board.o_mask, budget, self.exploration)
+        start = time.perf_counter()
+        if self.workers == 1:
+            runs = [run_search(*args, self.rng.getrandbits(32))]
+        else:
+            if self.pool is None:
+                # spawned, not forked, so workers don't inherit a bot's or server's sockets
+                self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            futures = [self.pool.submit(run_search, *args, self.rng.getrandbits(32))
+                       for _ in range(self.workers)]
+            runs = [future.result() for future in futures]
+
+        visits = {}
+        playouts = 0
+        for run_visits, run_playouts in runs:
+            for move, count in run_visits.items():
+                visits[move] = visits.get(move, 0) + count
+            playouts += run_playouts
+        move = max(visits, key=visits.get) if visits else board.free_cells()[0]
+        return MCTSResult(move, visits, playouts, time.perf_counter() - start, self.workers)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+
+class MCTSPlayer:
+    """Picks moves for one side by MCTS, on a GameState, GridState or KBoard"""
+
+    def __init__(self, symbol="O", time_budget=DEFAULT_TIME_BUDGET, workers=1, k=3, seed=None):
+        self.symbol = symbol
+        # only used for GameState positions, which don't carry their own k
+        self.k = k
+        self.engine = MCTSEngine(workers, time_budget, seed=seed)
+
+    def board_for(self, state):
+        if isinstance(state, KBoard):
+            return state
+        if isinstance(state, GridState):
+            return KBoard(state.size, state.k, state.x_mask, state.o_mask)
+        return KBoard(3, self.k, state.x_mask, state.o_mask)
+
+    def choose_cell(self, state):
+        """Bit index of the cell to play in state"""
+        return self.engine.search(self.board_for(state)).move
+
+    def choose_move(self, state):
+        """(x, y) of the cell to play in state"""
+        board = self.board_for(state)
+        cell = self.engine.search(board).move
+        return cell % board.size, cell // board.size
+
+    def close(self):
+        self.engine.close()
@@ -0,0 +1,59 @@
+"""Per-connection outbound queues.
+
+Rooms never write to a socket themselves. Each connection queues encoded
+frames and its own writer (a thread or an asyncio task) sends everything
+waiting in one call, so one state change goes out as one TCP write and
+a slow reader only ever holds up itself.
+
+When a client falls ``limit`` frames behind, its connection applies one of
+these policies:
+
+* ``drop`` - discard the new frame. Its seq gap makes the client resync.
+* ``disconnect`` - close the connection.
+* ``snapshot`` - throw the backlog away and queue one snapshot of the room.
+"""
+from collections import deque
+
+DROP = "drop"
+DISCONNECT = "disconnect"
+SNAPSHOT = "snapshot"
+POLICIES = (DROP, DISCONNECT, SNAPSHOT)
+
+DEFAULT_LIMIT = 256
+
+
+class OutboundQueue:
+    """Bounded FIFO of encoded frames waiting to go out on one socket"""
+
+    def __init__(self, limit=DEFAULT_LIMIT, policy=SNAPSHOT):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown slow client policy {policy!r}, expected one of {POLICIES}")
+        self.limit = limit
+        self.policy = policy
+        self.frames = deque()
+        self.overflows = 0
+
+    def __len__(self):
+        return len(self.frames)
+
+    def push(self, frame):
+        """Queue a frame; False if the reader is already too far behind"""
+        if len(self.frames) >= self.limit:
+            self.overflows += 1
+            return False
+        self.frames.append(frame)
+        return True
+
+    def replace(self, frame):
+        """Drop everything queued in favour of one frame"""
+        self.frames.clear()
+        self.frames.append(frame)
+
+    def drain(self):
+        """Take every queued frame as one buffer for a single write"""
+        if len(self.frames) == 1:
+            data = self.frames[0]
+        else:
+            data = b"".join(self.frames)
+        self.frames.clear()
+        return data
@@ -0,0 +1,80 @@
+"""Wire framing shared by the servers and the client.
+
+Every message on the socket is a 4-byte big-endian payload length followed
+by the payload itself, so a reader never has to guess where one message
+ends and the next begins, however TCP splits or coalesces the bytes.
+"""
+import struct
+
+from codec import JSON, decode_payload
+
+HEADER = struct.Struct("!I")
+HEADER_SIZE = HEADER.size
+MAX_FRAME_SIZE = 64 * 1024
+
+
+class ProtocolError(ValueError):
+    """Raised when the peer sends bytes that cannot be a valid frame"""
+
+
+def encode_frame(payload):
+    """Prefix payload with its length"""
+    return HEADER.pack(len(payload)) + payload
+
+
+def encode_message(message, codec=JSON):
+    """Serialize a message dict into a ready-to-send frame"""
+    return encode_frame(codec.encode(message))
+
+
+def decode_message(frame):
+    """Parse the payload of one frame back into a message dict"""
+    return decode_payload(frame)
+
+
+class FrameDecoder:
+    """Incremental decoder for a stream of length-prefixed frames.
+
+    Bytes are appended to one growing bytearray and frames are handed out as
+    memoryview slices of it, so nothing is copied until the caller decides to.
+    Consumed bytes are dropped once per ``feed`` call, which keeps the total
+    work linear in the number of bytes received.
+    """
+
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray()
+
+    def pending(self):
+        """Number of buffered bytes that are not yet a complete frame"""
+        return len(self._buffer)
+
+    def feed(self, data):
+        """Add received bytes and yield every frame that is now complete.
+
+        Each yielded memoryview is only valid until the next iteration; copy
+        it (``bytes(frame)``) if it has to outlive the loop body.
+        """
+        buffer = self._buffer
+        buffer += data
+        end = len(buffer)
+        pos = 0
+        view = memoryview(buffer)
+        try:
+            while end - pos >= HEADER_SIZE:
+                (length,) = HEADER.unpack_from(buffer, pos)
+                if length > self.max_frame_size:
+                    raise ProtocolError(f"frame of {length} bytes exceeds {self.max_frame_size}")
+                frame_end = pos + HEADER_SIZE + length
+                if frame_end > end:
+                    break
+                frame = view[pos + HEADER_SIZE:frame_end]
+                pos = frame_end
+                try:
+                    yield frame
+                finally:
+                    frame.release()
+        finally:
+            view.release()
+            if pos:
+                del buffer[:pos]
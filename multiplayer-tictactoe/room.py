@@ -0,0 +1,491 @@
+import hmac
+import secrets
+import time
+from collections import deque
+
+from codec import SUPPORTED_CODECS
+from game_state import SIZE, GameState
+from grid_state import board_kind, new_board
+from hints import get_hint_service
+from lobby import GAME_MODES
+from ultimate import UltimateState
+from protocol import MAX_FRAME_SIZE, encode_message
+
+# protocol features a client can rely on, announced in every welcome
+FEATURES = ["deltas", "resync", "spectate", "resume"]
+
+# seconds a dropped player's seat is held for them by default
+DEFAULT_GRACE_PERIOD = 30
+# published messages kept per room for catching up a player who comes back
+RESUME_HISTORY = 64
+# seconds a player waits between hint requests
+HINT_INTERVAL = 1.0
+
+
+def room_of_token(token):
+    """Room id a resume token was issued in, or None if it isn't one"""
+    room_id, _, _ = str(token).partition(".")
+    return int(room_id) if room_id.isdigit() else None
+
+
+class Room:
+    """A single game: board, turn, score and the players seated in it.
+
+    The room does no I/O of its own. Players and spectators are connection
+    objects that expose ``send(message)``, ``send_frame(frame)`` and the
+    ``codec`` they speak, so the same game rules can be driven by any server
+    front end.
+
+    Every message that changes what a client should show carries ``seq``,
+    which goes up by one per message. Clients apply these as deltas on top
+    of the last ``snapshot`` they got, and ask for a ``resync`` if a number
+    is skipped.
+
+    A room given a ``log`` (a match_log.MatchLog) reports every move,
+    restart, reset and mode change to it, so the game can be rebuilt after
+    a restart. One given an ``archive`` (a game_archive.ArchiveWriter)
+    appends each finished 3x3 game to it.
+
+    Each seated player gets a resume token in their welcome. With a
+    ``grace_period`` set, a player whose connection drops mid-match has
+    their seat held (suspend_player) instead of freed, and the game waits.
+    Coming back with the token (resume) catches them up with the messages
+    they missed, or with a snapshot if those are no longer kept. The server
+    calls expire_seat once the grace period is up.
+    """
+
+    def __init__(self, room_id, game_mode="single_game"):
+        self.room_id = room_id
+        self.current_player = "X"
+        self.board = new_board(game_mode)
+        self.game_mode = game_mode
+        # for best of 3 game mode variables
+        self.player1_wins = 0
+        self.player2_wins = 0
+        self.rounds_needed = 2
+        self.round_num = 1
+        self.game_over = False
+        self.winner = None
+        self.seq = 0
+        # set once start_game has gone out for the current pair of players
+        self.started = False
+        # symbol -> connection and connection -> symbol for the seated players
+        self.players = {}
+        self.player_symbols = {}
+        # read-only watchers; they never take a seat
+        self.spectators = set()
+        # symbol -> resume token; symbol -> seq when its seat was held for
+        # a dropped player; and how long the server holds seats (0: not at all)
+        self.tokens = {}
+        self.held = {}
+        self.grace_period = 0
+        # seats handed out so far, which tokens are derived from with a match log
+        self.seatings = 0
+        # (seq, message) of the latest published messages
+        self.recent = deque(maxlen=RESUME_HISTORY)
+        # write-ahead log of state changes, if the server keeps one
+        self.log = None
+        # where finished games go, and the cells of this one in play order
+        self.archive = None
+        self.history = []
+        # the server's schedule(delay, callback), for hints searched off its
+        # thread, and when each symbol last asked for one
+        self.schedule = None
+        self.hinted = {}
+
+    def is_full(self):
+        """Check if both seats are taken"""
+        return len(self.players) == 2
+
+    def has_free_seat(self):
+        """Whether a new player can sit down: seats held for dropped players are taken"""
+        return len(self.players) + len(self.held) < 2
+
+    def is_empty(self):
+        """Check if nobody is seated"""
+        return not self.players
+
+    def broadcast(self, message):
+        """Send message to every player and spectator in the room
+
+        The message is encoded once per codec in use and the same bytes are
+        queued for every recipient, so watchers cost a queue append each.
+        """
+        frames = {}
+        for conn in [*self.players.values(), *self.spectators]:
+            frame = frames.get(conn.codec)
+            if frame is None:
+                frame = frames[conn.codec] = encode_message(message, conn.codec)
+            conn.send_frame(frame)
+
+    def publish(self, message):
+        """Broadcast a state change under the next sequence number"""
+        self.seq += 1
+        message["seq"] = self.seq
+        self.recent.append((self.seq, message))
+        self.broadcast(message)
+
+    def snapshot(self):
+        """Full room state, for joins and resyncs"""
+        snapshot = {
+            "type": "snapshot",
+            "board": self.board.to_rows(),
+            "current_player": self.current_player,
+            "game_mode": self.game_mode,
+            "round_num": self.round_num,
+            "player1_wins": self.player1_wins,
+            "player2_wins": self.player2_wins,
+            "game_over": self.game_over,
+            "winner": self.winner,
+            "seq": self.seq,
+        }
+        if isinstance(self.board, UltimateState):
+            # the last move decides which small board is played next
+            snapshot["last_move"] = self.board.last_move
+        return snapshot
+
+    def welcome(self, conn, symbol=None):
+        """Everything a client needs on joining, in one message"""
+        return {
+            "type": "welcome",
+            "symbol": symbol,
+            "room": self.room_id,
+            "game_mode": self.game_mode,
+            "state": self.snapshot(),
+            "resume_token": self.tokens.get(symbol),
+            "capabilities": {
+                "codec": conn.codec.name,
+                "codecs": SUPPORTED_CODECS,
+                "max_frame_size": MAX_FRAME_SIZE,
+                "features": FEATURES,
+                "resume_grace": self.grace_period,
+            },
+        }
+
+    def seat(self, conn):
+        """Put a connection in the first free slot and return its symbol"""
+        player = "X" if "X" not in self.players and "X" not in self.held else "O"
+        self.players[player] = conn
+        self.player_symbols[conn] = player
+        self.seatings += 1
+        if self.log is not None:
+            # derived from the log's key, so it still works after a restart
+            self.tokens[player] = self.log.seat(self.room_id, player, self.seatings)
+        else:
+            self.tokens[player] = f"{self.room_id}.{secrets.token_urlsafe(16)}"
+        return player
+
+    def start_if_full(self):
+        """Start the game once both seats are taken"""
+        if self.is_full() and not self.started:
+            self.started = True
+            self.publish({"type": "start_game", "current_player": self.current_player})
+
+    def add_player(self, conn):
+        """Seat a connection, catch it up on the room and start if ready"""
+        player = self.seat(conn)
+        conn.send(self.welcome(conn, player))
+        self.start_if_full()
+        return player
+
+    def add_spectator(self, conn):
+        """Let a connection watch the room without taking a seat"""
+        self.spectators.add(conn)
+        conn.send(self.welcome(conn))
+
+    def remove_spectator(self, conn):
+        self.spectators.discard(conn)
+
+    def remove_player(self, conn):
+        """Free the seat held by conn and tell the opponent"""
+        player = self.player_symbols.pop(conn, None)
+        if player is None:
+            return
+        del self.players[player]
+        self.free_seat(player)
+
+    def free_seat(self, player):
+        """Give up player's seat for good: the game starts over for whoever is next"""
+        self.tokens.pop(player, None)
+        if self.log is not None:
+            self.log.leave(self.room_id, player)
+        self.started = False
+        # Don't reset the board if the game is over in best-of-3 mode
+        if not (self.game_mode == "best_of_3" and self.game_over):
+            self.reset_board()
+            if self.log is not None:
+                self.log.reset(self.room_id)
+        self.publish({"type": "opponent_disconnected"})
+
+    def suspend_player(self, conn):
+        """Hold conn's seat for it to come back to.
+
+        Returns the hold, (symbol, seq), for expire_seat, or None if conn
+        wasn't seated.
+        """
+        player = self.player_symbols.pop(conn, None)
+        if player is None:
+            return None
+        del self.players[player]
+        # no moves until both players are back
+        self.started = False
+        self.publish({"type": "opponent_reconnecting", "player": player, "grace": self.grace_period})
+        self.held[player] = self.seq
+        return player, self.seq
+
+    def hold_seats(self):
+        """Hold every seat that has a token but no one in it, as in a room restored from the log.
+
+        Returns the holds, for expire_seat.
+        """
+        holds = []
+        for player in self.tokens:
+            if player not in self.players and player not in self.held:
+                self.held[player] = self.seq
+                holds.append((player, self.seq))
+        return holds
+
+    def expire_seat(self, hold):
+        """Free a held seat whose player didn't come back; False if they did, even if they dropped again since"""
+        player, since = hold
+        if self.held.get(player) != since:
+            return False
+        del self.held[player]
+        self.free_seat(player)
+        return True
+
+    def messages_since(self, seq):
+        """Published messages after seq, or None if some of them are no longer kept"""
+        if not isinstance(seq, int) or seq > self.seq:
+            return None
+        if seq == self.seq:
+            return []
+        if not self.recent or self.recent[0][0] > seq + 1:
+            return None
+        return [message for message_seq, message in self.recent if message_seq > seq]
+
+    def resume(self, conn, token, last_seq=None):
+        """Put conn back in the held seat token was issued for; its symbol, or None.
+
+        The welcome leaves out the snapshot when the messages published
+        since last_seq, the last one the client applied, are still kept;
+        those follow it instead.
+        """
+        token = str(token).encode()
+        player = next((symbol for symbol in self.held
+                       if hmac.compare_digest(self.tokens[symbol].encode(), token)), None)
+        if player is None:
+            return None
+        del self.held[player]
+        self.players[player] = conn
+        self.player_symbols[conn] = player
+        welcome = self.welcome(conn, player)
+        missed = self.messages_since(last_seq)
+        if missed is not None:
+            del welcome["state"]
+        conn.send(welcome)
+        for message in missed or ():
+            conn.send(message)
+        self.start_if_full()
+        return player
+
+    def reset_board(self):
+        """Clear the board for a new round"""
+        self.board.clear()
+        self.history = []
+        self.current_player = "X"
+        self.game_over = False
+        self.winner = None
+
+    def can_play(self, game_mode):
+        """Whether the room can switch to game_mode: one the server plays, and 3x3 while a bot is seated"""
+        if game_mode not in GAME_MODES:
+            return False
+        # the bots' AI only knows the 3x3 game
+        return board_kind(game_mode) is None or not any(
+            getattr(conn, "is_bot", False) for conn in self.players.values())
+
+    def set_game_mode(self, game_mode):
+        """Switch modes, starting over on an empty board if the new mode plays on a different one"""
+        # checked before anything changes, so the room and its log never disagree
+        if game_mode not in GAME_MODES:
+            raise ValueError(f"unknown game mode {game_mode!r}")
+        if board_kind(game_mode) != board_kind(self.game_mode):
+            self.board = new_board(game_mode)
+            self.reset_board()
+        self.game_mode = game_mode
+        if self.log is not None:
+            self.log.game_mode(self.room_id, game_mode)
+
+    def reset_best_of_3(self):
+        """Reset the best-of-3 game state"""
+        self.player1_wins = 0
+        self.player2_wins = 0
+        self.round_num = 1
+
+    def is_valid_move(self, x, y):
+        """Check if move is valid"""
+        return self.board.is_free(x, y)
+
+    def check_winner(self, player):
+        """Check if current player has won"""
+        return self.board.has_won(player)
+
+    def is_board_full(self):
+        """Check if board is full (draw)"""
+        return self.board.is_full()
+
+    def handle_message(self, conn, data):
+        """Apply one client message to the room"""
+        msg_type = data.get("type")
+        player = self.player_symbols.get(conn)
+        if player is None:
+            # spectators may only ask to be caught up
+            if msg_type == "resync" and conn in self.spectators:
+                conn.send(self.snapshot())
+            return
+
+        if msg_type == "move":
+            # A move made against an old board means the client missed updates
+            if data.get("seq", self.seq) != self.seq:
+                conn.send(self.snapshot())
+                return
+            self.handle_move(player, data)
+        elif msg_type == "resync":
+            conn.send(self.snapshot())
+        elif msg_type == "hint_request":
+            self.hint(conn, player)
+        elif msg_type == "restart":
+            self.handle_restart()
+        elif msg_type == "current_score":
+            self.broadcast({
+                "type": "current_score",
+                "player1_wins": self.player1_wins,
+                "player2_wins": self.player2_wins,
+                "round_num": self.round_num
+            })
+        elif msg_type == "game_mode":
+            # Only accept game mode changes from Player X (the host), and only
+            # to a mode the room can play; anyone else is told the current one
+            if player == "X" and self.can_play(data.get("game_mode")):
+                self.set_game_mode(data["game_mode"])
+                self.publish({"type": "update_game_mode", "game_mode": self.game_mode})
+            else:
+                conn.send({"type": "update_game_mode", "game_mode": self.game_mode})
+        elif msg_type == "chat_message":
+            self.broadcast({"type": "chat_message", "player": player, "text": data["text"]})
+
+        # if someone wins the best of 3 game, announce it once so the players can decide to go again
+        if self.player1_wins >= self.rounds_needed or self.player2_wins >= self.rounds_needed:
+            if not self.game_over:
+                self.publish({
+                    "type": "restart_game_of_3",
+                    "round_num": self.round_num,
+                    "player1_wins": self.player1_wins,
+                    "player2_wins": self.player2_wins,
+                })
+                self.game_over = True
+
+    def hint(self, conn, player):
+        """Send conn the best moves and score for the side to move.
+
+        Answered from the cache shared by all rooms when it can be; a search
+        on a big board runs in the hint service's pool and is sent when done.
+        A player gets one hint per HINT_INTERVAL, and a request that is too
+        soon, or that the pool has no room for, gets a reply marked busy.
+        """
+        now = time.monotonic()
+        if now - self.hinted.get(player, now - HINT_INTERVAL) < HINT_INTERVAL:
+            conn.send(self.hint_message(None, self.current_player, self.seq, busy=True))
+            return
+        self.hinted[player] = now
+        to_move, seq = self.current_player, self.seq
+        if not self.started or self.game_over:
+            conn.send(self.hint_message(None, to_move, seq))
+            return
+        if not get_hint_service().request(self.board, lambda analysis: conn.send(
+                self.hint_message(analysis, to_move, seq)), self.schedule):
+            conn.send(self.hint_message(None, to_move, seq, busy=True))
+
+    def hint_message(self, analysis, to_move, seq, busy=False):
+        score, moves = analysis if analysis is not None else (None, [])
+        message = {
+            "type": "hint",
+            "player": to_move,
+            "moves": [list(move) for move in moves],
+            "score": score,
+            # the position the hint is for; not "seq", since a hint changes
+            # nothing and clients would drop it as an old update
+            "for_seq": seq,
+        }
+        if busy:
+            message["busy"] = True
+        return message
+
+    def handle_move(self, player, data):
+        """Place a mark for player if it is their turn and the cell is free"""
+        if self.game_over or self.current_player != player or not self.is_full():
+            return
+        x, y = data["position"]
+        if not self.is_valid_move(x, y):
+            return
+        self.apply_move(x, y, player)
+
+    def apply_move(self, x, y, player):
+        """Play a move already checked to be legal, and settle the game"""
+        self.board.place(x, y, player)
+        self.history.append((x, y))
+        if self.log is not None:
+            self.log.move(self.room_id, x, y, player)
+        # Only the changed cell goes out; clients already hold the rest
+        self.publish({"type": "update_board", "position": [x, y], "player": player})
+
+        if self.check_winner(player):
+            self.game_over = True
+            self.winner = player
+            if self.game_mode == "best_of_3":
+                if player == "X":
+                    self.player1_wins += 1
+                else:
+                    self.player2_wins += 1
+                self.publish({
+                    "type": "game_of_3_over",
+                    "winner": player,
+                    "round_num": self.round_num,
+                    "player1_wins": self.player1_wins,
+                    "player2_wins": self.player2_wins,
+                })
+            else:
+                self.publish({"type": "game_over", "winner": player})
+            self.archive_game()
+        elif self.is_board_full():
+            self.game_over = True
+            self.winner = "Draw"
+            self.publish({"type": "game_over", "winner": "Draw"})
+            self.archive_game()
+        else:
+            self.current_player = "O" if self.current_player == "X" else "X"
+            self.publish({"type": "next_turn", "player": self.current_player})
+
+    def archive_game(self):
+        """Hand the game that just ended to the archive; only 3x3 games are kept"""
+        if self.archive is None or not isinstance(self.board, GameState):
+            return
+        self.archive.record([y * SIZE + x for x, y in self.history], self.winner, self.game_mode,
+                            self.round_num, self.player1_wins, self.player2_wins)
+
+    def handle_restart(self):
+        """Start the next round, or a fresh match after a best-of-3 is decided"""
+        self.reset_board()
+        if self.log is not None:
+            self.log.restart(self.room_id)
+        if self.game_mode == "best_of_3":
+            if self.player1_wins >= self.rounds_needed or self.player2_wins >= self.rounds_needed:
+                self.reset_best_of_3()
+            else:
+                self.round_num += 1
+        self.publish({
+            "type": "restart_game",
+            "current_player": self.current_player,
+            "round_num": self.round_num
+        })
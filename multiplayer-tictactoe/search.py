@@ -0,0 +1,261 @@
+"""Game-tree search for k-in-a-row on boards too big to tabulate.
+
+Negamax with alpha-beta pruning, run by iterative deepening under a time
+budget: each pass goes one ply deeper, and when the budget runs out the
+move from the last finished pass is played, so a caller never waits longer
+than it asked to.
+
+Positions are cached in a fixed-size transposition table keyed by the
+canonical Zobrist hash from kboard, so all 8 symmetric copies of a position
+share one entry. Moves are tried best-guess first: the table's move for
+the position, then moves that caused cutoffs before (history heuristic),
+then cells nearest the centre.
+"""
+import time
+from collections import namedtuple
+
+from kboard import KBoard
+
+# a win found n plies from the root scores WIN - n, so faster wins rank higher
+WIN = 1_000_000
+MATE_BOUND = WIN - 10_000
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+DEFAULT_TT_SIZE = 1 << 18
+DEFAULT_TIME_BUDGET = 1.0
+# a node costs roughly one unit per board cell (move ordering, hashing,
+# evaluation), so the clock is read about every this many units: every 128
+# nodes on 3x3, every 4 on 19x19, and never more than ~1 ms late
+CLOCK_CHECK_WORK = 2048
+
+SearchResult = namedtuple("SearchResult", ["move", "score", "depth", "nodes", "elapsed", "solved", "depth_times"])
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time budget is used up.
+
+    Leaving the root, it carries the best (move, score) of the unfinished
+    pass in ``best``, or None if no root move was searched to the end.
+    """
+    best = None
+
+
+class TranspositionTable:
+    """Fixed number of slots, indexed by the low bits of the position key.
+
+    A slot keeps its entry unless the new one is for a different position
+    or was searched at least as deep, so memory never grows past the size
+    given.
+    """
+
+    def __init__(self, size=DEFAULT_TT_SIZE):
+        if size & (size - 1):
+            raise ValueError("transposition table size must be a power of two")
+        self.mask = size - 1
+        self.keys = [None] * size
+        self.entries = [None] * size
+        self.probes = 0
+        self.hits = 0
+
+    def probe(self, key):
+        """(depth, score, flag, move) stored for key, or None"""
+        self.probes += 1
+        slot = key & self.mask
+        if self.keys[slot] == key:
+            self.hits += 1
+            return self.entries[slot]
+        return None
+
+    def store(self, key, depth, score, flag, move):
+        slot = key & self.mask
+        if self.keys[slot] == key and self.entries[slot][0] > depth:
+            return
+        self.keys[slot] = key
+        self.entries[slot] = (depth, score, flag, move)
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+
+class SearchEngine:
+    """Finds a move for the side to move on a KBoard"""
+
+    def __init__(self, tt_size=DEFAULT_TT_SIZE, time_budget=DEFAULT_TIME_BUDGET):
+        self.table = TranspositionTable(tt_size)
+        self.time_budget = time_budget
+        self.nodes = 0
+        self.deadline = None
+        self.history = None
+        # nodes between clock reads, less one: a power of two, scaled to the board
+        self.check_mask = 0
+
+    def search(self, board, max_depth=None, time_budget=None):
+        """Deepen until max_depth, a proven result, or the time budget"""
+        geometry = board.geometry
+        free = len(board.free_cells())
+        if free == 0:
+            raise ValueError("no moves left to search")
+        if max_depth is None:
+            max_depth = free
+        budget = self.time_budget if time_budget is None else time_budget
+        start = time.perf_counter()
+        self.deadline = start + budget
+        self.nodes = 0
+        self.history = [0] * geometry.cells
+        self.check_mask = (1 << max(0, (CLOCK_CHECK_WORK // geometry.cells).bit_length() - 1)) - 1
+
+        move, score, depth, solved = None, 0, 0, False
+        depth_times = []
+        for target in range(1, min(max_depth, free) + 1):
+            try:
+                move, score = self.root(board, target)
+            except SearchTimeout as timeout:
+                if move is None and timeout.best is not None:
+                    # no pass finished: the unfinished first one beats a guess
+                    move, score = timeout.best
+                break
+            depth = target
+            depth_times.append((target, time.perf_counter() - start, self.nodes))
+            # a forced win or loss, or a full-depth search, can't change with more depth
+            if abs(score) >= MATE_BOUND or target == free:
+                solved = True
+                break
+        if move is None:
+            # not even one ply finished: fall back on the move ordering
+            move = self.ordered_moves(board, None)[0]
+        return SearchResult(move, score, depth, self.nodes, time.perf_counter() - start, solved, depth_times)
+
+    def best_move(self, board, time_budget=None):
+        return self.search(board, time_budget=time_budget).move
+
+    def root(self, board, depth):
+        """One full-width pass at the root; restores the board on timeout"""
+        moves_played = len(board.history)
+        try:
+            return self.negamax_root(board, depth)
+        except SearchTimeout:
+            while len(board.history) > moves_played:
+                board.undo()
+            raise
+
+    def negamax_root(self, board, depth):
+        key, symmetry = board.canonical()
+        entry = self.table.probe(key)
+        tt_move = board.geometry.inverses[symmetry][entry[3]] if entry else None
+        alpha, beta = -WIN - 1, WIN + 1
+        best_move, best_score = None, -WIN - 1
+        try:
+            for move in self.ordered_moves(board, tt_move):
+                board.play(move)
+                score = -self.negamax(board, depth - 1, -beta, -alpha, 1)
+                board.undo()
+                if score > best_score:
+                    best_move, best_score = move, score
+                alpha = max(alpha, score)
+        except SearchTimeout as timeout:
+            if best_move is not None:
+                timeout.best = (best_move, best_score)
+            raise
+        self.table.store(key, depth, best_score, EXACT, board.geometry.permutations[symmetry][best_move])
+        return best_move, best_score
+
+    def negamax(self, board, depth, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes & self.check_mask and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        # the side that just moved may have won
+        if board.wins_at(board.history[-1]):
+            return -(WIN - ply)
+        if board.is_full():
+            return 0
+        if depth == 0:
+            return self.evaluate(board)
+
+        geometry = board.geometry
+        alpha_start = alpha
+        key, symmetry = board.canonical()
+        entry = self.table.probe(key)
+        tt_move = None
+        if entry is not None:
+            stored_depth, stored_score, flag, stored_move = entry
+            tt_move = geometry.inverses[symmetry][stored_move]
+            if stored_depth >= depth:
+                score = from_table(stored_score, ply)
+                if flag == EXACT:
+                    return score
+                if flag == LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+
+        best_move, best_score = None, -WIN - 1
+        for move in self.ordered_moves(board, tt_move):
+            board.play(move)
+            score = -self.negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            board.undo()
+            if score > best_score:
+                best_move, best_score = move, score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        self.history[move] += depth * depth
+                        break
+
+        if best_score <= alpha_start:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table.store(key, depth, to_table(best_score, ply), flag, geometry.permutations[symmetry][best_move])
+        return best_score
+
+    def ordered_moves(self, board, tt_move):
+        """Free cells, most promising first"""
+        free = set(board.free_cells())
+        history = self.history
+        moves = sorted((cell for cell in board.geometry.centre_order if cell in free),
+                       key=lambda cell: -history[cell])
+        if tt_move is not None and tt_move in free:
+            moves.remove(tt_move)
+            moves.insert(0, tt_move)
+        return moves
+
+    def evaluate(self, board):
+        """Static score for the side to move: open lines, weighted by marks"""
+        x_mask, o_mask = board.x_mask, board.o_mask
+        score = 0
+        for line in board.geometry.lines:
+            xs = x_mask & line
+            os = o_mask & line
+            if xs and not os:
+                score += 10 ** (bin(xs).count("1") - 1)
+            elif os and not xs:
+                score -= 10 ** (bin(os).count("1") - 1)
+        return score if board.to_move() == "X" else -score
+
+
+def to_table(score, ply):
+    """Win/loss scores are stored relative to the node, not the root"""
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def from_table(score, ply):
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+def board_from_state(state, k=3):
+    """KBoard for a 3x3 GameState, such as the singleplayer board's"""
+    return KBoard(3, k, state.x_mask, state.o_mask)
@@ -1,269 +1,366 @@
+import os
 import socket
 import threading
-import json
 import sys
 import time
+from ai import DIFFICULTIES
+from bots import DEFAULT_DIFFICULTY, DEFAULT_THINK_DELAY, BotPool, BotSeat
+from codec import JSON, choose_codec
+from game_archive import ArchiveWriter
+from grid_state import board_kind
+from heartbeat import DEFAULT_PING_INTERVAL, DEFAULT_PING_TIMEOUT, DEFAULT_TICK, HEARTBEAT_TYPES, PONG, Heartbeats
+from hints import get_hint_service
+from match_log import DEFAULT_FSYNC_INTERVAL, DEFAULT_RESTORE_TIMEOUT, MatchLog, recover
+from outbound import DEFAULT_LIMIT, DISCONNECT, SNAPSHOT, OutboundQueue
+from protocol import FrameDecoder, decode_message, encode_message
+from room import DEFAULT_GRACE_PERIOD, Room
+
+class ClientConnection:
+    """A player's socket: read by its handler thread, written by its own writer thread"""
+    def __init__(self, sock, address, queue_limit=DEFAULT_LIMIT, policy=SNAPSHOT):
+        self.sock = sock
+        self.address = address
+        self.codec = JSON
+        self.room = None
+        self.outbox = OutboundQueue(queue_limit, policy)
+        self.ready = threading.Condition()
+        self.closing = False
+        # time.monotonic() of the last data received, for heartbeats
+        self.last_seen = 0.0
+        self.writer = threading.Thread(target=self.write_loop)
+        self.writer.daemon = True
+        self.writer.start()
+
+    def send(self, message):
+        """Queue message for the writer thread; never blocks on the socket"""
+        self.send_frame(encode_message(message, self.codec))
+
+    def send_frame(self, frame):
+        """Queue a frame that is already encoded in this connection's codec"""
+        with self.ready:
+            if self.closing:
+                return
+            if not self.outbox.push(frame):
+                self.fall_behind()
+            self.ready.notify()
+
+    def fall_behind(self):
+        """Apply the slow client policy once the outbox is full"""
+        policy = self.outbox.policy
+        if policy == DISCONNECT:
+            self.abort()
+        elif policy == SNAPSHOT and self.room is not None:
+            # the room's current state supersedes everything still queued
+            self.outbox.replace(encode_message(self.room.snapshot(), self.codec))
+        # DROP: the frame is simply not queued
+
+    def write_loop(self):
+        """Send everything queued in one sendall per wakeup"""
+        while True:
+            with self.ready:
+                while not self.outbox and not self.closing:
+                    self.ready.wait()
+                if not self.outbox:
+                    break
+                data = self.outbox.drain()
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                # the handler thread sees the dead socket and cleans up
+                break
+        self.sock.close()
+
+    def negotiate(self, data):
+        """Switch to the best codec both sides know; the welcome names it"""
+        self.codec = choose_codec(data.get("codecs", []))
+
+    def close(self):
+        """Send whatever is still queued, then close"""
+        with self.ready:
+            self.closing = True
+            self.ready.notify()
+
+    def abort(self):
+        """Close at once, discarding the backlog"""
+        with self.ready:
+            self.closing = True
+            self.outbox.frames.clear()
+            try:
+                # wakes the handler thread, which removes the client
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                # already closed by the writer
+                pass
+            self.ready.notify()
 
 class TicTacToeServer:
-    def __init__(self, host='0.0.0.0', port=5555):
+    def __init__(self, host='0.0.0.0', port=5555, queue_limit=DEFAULT_LIMIT, slow_client_policy=SNAPSHOT,
+                 bot_workers=None, think_delay=DEFAULT_THINK_DELAY, match_log=None,
+                 fsync_interval=DEFAULT_FSYNC_INTERVAL, archive=None, grace_period=DEFAULT_GRACE_PERIOD,
+                 ping_interval=DEFAULT_PING_INTERVAL, ping_timeout=DEFAULT_PING_TIMEOUT,
+                 restore_timeout=DEFAULT_RESTORE_TIMEOUT):
         self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server.bind((host, port))
-        self.server.listen(2)
+        self.server.listen(128)
         self.clients = []
         self.addresses = []
-        self.current_player = "X"
-        self.board = [['' for _ in range(3)] for _ in range(3)]
-        self.game_mode = "single_game"  # default game mode
-        # for best of 3 game mode variables
-        self.player1_wins = 0
-        self.player2_wins = 0
-        self.rounds_needed = 2
-        self.round_num = 1
-        self.game_over = False
-        # Dictionary to keep track of which client is which player
-        self.player_symbols = {}
+        # watchers don't count toward the two player slots
+        self.spectators = []
+        # The board, turn and best-of-3 score all live in the room
+        self.room = Room(1)
+        # with a match log, the board and score carry over a server restart
+        self.match_log = None
+        if match_log is not None:
+            restored = recover(match_log)[0].get(1)
+            self.match_log = MatchLog(match_log, fsync_interval)
+            if restored is not None:
+                self.room = restored
+            else:
+                self.match_log.open_room(1, self.room.game_mode)
+            self.room.log = self.match_log
+        # finished 3x3 games are appended here
+        self.archive = ArchiveWriter(archive) if archive is not None else None
+        self.room.archive = self.archive
+        # hint searches hand their results back through here
+        self.room.schedule = self.schedule
+        # a dropped player's seat is held this long for them to resume
+        self.room.grace_period = grace_period
+        # Handler threads take turns applying messages to the room
+        self.lock = threading.Lock()
+        # seats taken when the server stopped wait restore_timeout for their players to resume
+        for hold in self.room.hold_seats():
+            timer = threading.Timer(restore_timeout, self.expire_seat, args=(hold,))
+            timer.daemon = True
+            timer.start()
+        # how far a client may fall behind, and what happens when it does
+        self.queue_limit = queue_limit
+        self.slow_client_policy = slow_client_policy
+        # a lone player can ask for a bot opponent; its moves are worked out in this pool
+        self.bot_workers = bot_workers
+        self.think_delay = think_delay
+        self.bot_pool = None
+        self.bot = None
+        # silent clients are pinged, then cut off so their thread and seat are freed;
+        # the wheel is kept under self.lock. None turns this off
+        self.heartbeats = None
+        if ping_interval is not None:
+            self.heartbeats = Heartbeats(ping_interval, ping_timeout, DEFAULT_TICK, time.monotonic())
         print(f"Server started on {host}:{port}")
         print(f"Your IP address is: {socket.gethostbyname(socket.gethostname())}")
 
-    def broadcast(self, message):
-        """Send message to all connected clients"""
-        for client in self.clients:
-            try:
-                client.send(json.dumps(message).encode())
-            except:
-                self.remove_client(client)
+    def serve_client(self, client, address):
+        """Run handle_client with the client watched by the heartbeat reaper"""
+        if self.heartbeats is not None:
+            with self.lock:
+                self.heartbeats.watch(client, time.monotonic())
+        try:
+            self.handle_client(client, address)
+        finally:
+            if self.heartbeats is not None:
+                with self.lock:
+                    self.heartbeats.forget(client)
 
     def handle_client(self, client, address):
         """Handle individual client connection"""
-        # Assign player symbol (X or O)
-        player = "X" if len(self.clients) == 1 else "O"
-        self.player_symbols[client] = player  # Store which client is which player
-        client.send(json.dumps({"type": "symbol", "symbol": player}).encode())
-        
-        # Add a small delay between messages
-        time.sleep(0.1)
-        
-        # If this client is player O, notify them of the current game mode
-        if player == "O":
-            client.send(json.dumps({"type": "update_game_mode", "game_mode": self.game_mode}).encode())
-            # Add a small delay between messages
-            time.sleep(0.1)
+        decoder = FrameDecoder()
+        # The first message (normally hello) says whether to seat or spectate
+        first = self.read_first_message(client, decoder)
+        if first is None:
+            client.close()
+            return
+        if first.get("type") == "hello":
+            client.negotiate(first)
+            if first.get("role") == "spectator":
+                self.handle_spectator(client, decoder)
+                return
 
-        # If we have two players, start the game
-        if len(self.clients) == 2:
-            self.broadcast({"type": "start_game", "current_player": self.current_player})
+        with self.lock:
+            # a player coming back for a held seat gets it even if no other is free
+            token = first.get("resume")
+            if token is not None and self.room.resume(client, token, first.get("last_seq")) is not None:
+                self.clients.append(client)
+                self.addresses.append(address)
+            elif not self.room.has_free_seat():
+                client.send({"type": "server_full"})
+                client.close()
+                return
+            else:
+                self.clients.append(client)
+                self.addresses.append(address)
+                # One welcome with the symbol, board, game mode and score, then
+                # start_game if this was the second player
+                self.room.add_player(client)
+                # the AI only plays 3x3, so on other boards a bot request waits for a person
+                if (first.get("opponent") == "bot" and not self.room.is_full()
+                        and board_kind(self.room.game_mode) is None):
+                    self.add_bot(client, first.get("difficulty", DEFAULT_DIFFICULTY))
+
+        if first.get("type") != "hello":
+            self.handle_message(client, first)
 
         # this condition is always true unless we are in best of 3 game mode and it is over
         while True:
             try:
-                message = client.recv(1024).decode()
-                if not message:
+                chunk = client.sock.recv(4096)
+                if not chunk:
                     break
+                client.last_seen = time.monotonic()
+                for frame in decoder.feed(chunk):
+                    self.handle_message(client, decode_message(frame))
+            except Exception as e:
+                print(f"Error in client handler: {e}")
+                break
 
-                data = json.loads(message)
-                if data["type"] == "move":
-                    if self.current_player == player:
-                        x, y = data["position"]
-                        if self.is_valid_move(x, y):
-                            self.board[y][x] = player
-                            self.broadcast({
-                                "type": "update_board",
-                                "board": self.board,
-                                "position": [x, y],
-                                "player": player
-                            })
-
-                            if self.check_winner(player):
-                                # checks game mode
-                                if self.game_mode == "single_game":
-                                    self.broadcast({
-                                        "type": "game_over",
-                                        "winner": player
-                                    })
-                                elif self.game_mode == "best_of_3":
-                                    if player == "X":
-                                        self.player1_wins += 1
-                                        print(f"Player X won round {self.round_num}, total wins: {self.player1_wins}")
-                                    elif player == "O":
-                                        self.player2_wins += 1
-                                        print(f"Player O won round {self.round_num}, total wins: {self.player2_wins}")
-                                    self.broadcast({
-                                        "type": "game_of_3_over",
-                                        "winner": player,
-                                        "round_num": self.round_num,
-                                        "player1_wins": self.player1_wins,
-                                        "player2_wins": self.player2_wins,
-                                    })
-                                self.game_over = True
-                                
-                            elif self.is_board_full():
-                                self.broadcast({
-                                    "type": "game_over",
-                                    "winner": "Draw"
-                                })
-                                self.game_over = True
-                            else:
-                                self.current_player = "O" if self.current_player == "X" else "X"
-                                self.broadcast({
-                                    "type": "next_turn",
-                                    "player": self.current_player
-                                })
-
-                elif data["type"] == "restart":
-                    self.board = [['' for _ in range(3)] for _ in range(3)]
-                    self.current_player = "X"
-                    self.game_over = False
-                    
-                    if self.game_mode == "best_of_3":
-                        # Check if we're restarting after a final win
-                        if self.player1_wins >= self.rounds_needed or self.player2_wins >= self.rounds_needed:
-                            # Reset for a completely new best-of-3 match
-                            self.reset_best_of_3()
-                            print("Starting a new best-of-3 match")
-                        # Only increment round number when restarting within an ongoing match
-                        elif self.player1_wins < self.rounds_needed and self.player2_wins < self.rounds_needed:
-                            self.round_num += 1
-                            print(f"Starting round {self.round_num} of best-of-3")
-                    
-                    self.broadcast({
-                        "type": "restart_game",
-                        "current_player": self.current_player,
-                        "round_num": self.round_num  # Send round number to clients
-                    })
-
-                # this will only happen if the game mode is best of 3
-                elif data["type"] == "current_score":
-                    self.broadcast({
-                        "type": "current_score",
-                        "player1_wins": self.player1_wins,
-                        "player2_wins": self.player2_wins,
-                        "round_num": self.round_num
-                    })
-
-                # Handle game mode selection from client
-                elif data["type"] == "game_mode":
-                    # Only accept game mode changes from Player X (the host)
-                    if self.player_symbols[client] == "X":
-                        self.game_mode = data["game_mode"]
-                        print(f"Game mode set to: {self.game_mode}")
-                        # Broadcast the game mode to all clients
-                        self.broadcast({
-                            "type": "update_game_mode",
-                            "game_mode": self.game_mode
-                        })
-                    else:
-                        # Send the current game mode back to the client that tried to change it
-                        client.send(json.dumps({
-                            "type": "update_game_mode",
-                            "game_mode": self.game_mode
-                        }).encode())
-
-                # Handle chat messages
-                elif data["type"] == "chat_message":
-                    # Get the player symbol for this client
-                    player = self.player_symbols[client]
-                    # Broadcast the chat message to all clients
-                    self.broadcast({
-                        "type": "chat_message",
-                        "player": player,
-                        "text": data["text"]
-                    })
+        self.remove_client(client)
 
-                # if someone wins the best of 3 game, we send a message to show the winner and let them decide to do another game or not
-                if self.player1_wins >= self.rounds_needed or self.player2_wins >= self.rounds_needed:
-                    final_winner = "X" if self.player1_wins >= self.rounds_needed else "O"
-                    print(f"Player {final_winner} has won the best-of-3 match!")
-                    
-                    # Only send this message once when a player reaches the win threshold
-                    # and only if we haven't already flagged the game as over
-                    if not self.game_over:
-                        self.broadcast({
-                            "type": "restart_game_of_3",
-                            "round_num": self.round_num,
-                            "player1_wins": self.player1_wins,
-                            "player2_wins": self.player2_wins,
-                        })
-                        
-                        # Set game_over flag to true to prevent repeated broadcasts
-                        self.game_over = True
+    def read_first_message(self, client, decoder):
+        """Block until the client's first message arrives; None if it hangs up"""
+        while True:
+            try:
+                chunk = client.sock.recv(4096)
+                if not chunk:
+                    return None
+                client.last_seen = time.monotonic()
+                for frame in decoder.feed(chunk):
+                    message = decode_message(frame)
+                    if message.get("type") in HEARTBEAT_TYPES:
+                        self.handle_message(client, message)
+                        continue
+                    # anything after the first frame stays buffered in the decoder
+                    return message
             except Exception as e:
                 print(f"Error in client handler: {e}")
+                return None
+
+    def handle_spectator(self, client, decoder):
+        """Stream the room to a read-only watcher until it leaves"""
+        with self.lock:
+            self.spectators.append(client)
+            self.room.add_spectator(client)
+        print(f"Spectator joined. {len(self.spectators)} watching.")
+        while True:
+            try:
+                chunk = client.sock.recv(4096)
+                if not chunk:
+                    break
+                client.last_seen = time.monotonic()
+                for frame in decoder.feed(chunk):
+                    self.handle_message(client, decode_message(frame))
+            except Exception:
                 break
-        
+        with self.lock:
+            self.spectators.remove(client)
+            self.room.remove_spectator(client)
+        client.close()
 
-        self.remove_client(client)
+    def add_bot(self, client, difficulty):
+        """Seat a bot opposite client; the game starts at once"""
+        if self.bot_pool is None:
+            self.bot_pool = BotPool(self.bot_workers)
+        if difficulty not in DIFFICULTIES:
+            difficulty = DEFAULT_DIFFICULTY
+        self.bot = BotSeat(self.bot_pool, self.schedule, difficulty, self.think_delay, client.codec)
+        self.bot.room = self.room
+        self.room.add_player(self.bot)
+        print(f"Bot ({self.bot.difficulty}) joined.")
+
+    def schedule(self, delay, callback):
+        """Run a bot's or hint search's callback after delay, holding the lock like a handler thread"""
+        def run():
+            with self.lock:
+                callback()
+        timer = threading.Timer(delay, run)
+        timer.daemon = True
+        timer.start()
+
+    def handle_message(self, client, data):
+        """Apply one decoded client message to the game"""
+        if data.get("type") in HEARTBEAT_TYPES:
+            # only seen for last_seen; a ping is answered at once
+            if data["type"] == "ping":
+                client.send(PONG)
+            return
+        with self.lock:
+            if data.get("type") == "hint_stats":
+                client.send({"type": "hint_stats", **get_hint_service().stats()})
+                return
+            self.room.handle_message(client, data)
 
     def remove_client(self, client):
         """Remove client and clean up"""
-        if client in self.clients:
+        with self.lock:
+            if client not in self.clients:
+                return
             index = self.clients.index(client)
             self.clients.remove(client)
             self.addresses.pop(index)
             client.close()
             print(f"Client disconnected. {len(self.clients)} clients remaining.")
-            if len(self.clients) < 2:
-                # Don't reset the board if the game is over in best-of-3 mode
-                if not (self.game_mode == "best_of_3" and self.game_over):
-                    self.board = [['' for _ in range(3)] for _ in range(3)]
-                    self.current_player = "X"
-                    self.game_over = False
-                if self.clients:
-                    self.clients[0].send(json.dumps({"type": "opponent_disconnected"}).encode())
-
-    def is_valid_move(self, x, y):
-        """Check if move is valid"""
-        return 0 <= x < 3 and 0 <= y < 3 and self.board[y][x] == ''
+            if self.room.grace_period and not self.room.has_free_seat():
+                # mid-game: keep the seat and the board for them to resume
+                hold = self.room.suspend_player(client)
+                timer = threading.Timer(self.room.grace_period, self.expire_seat, args=(hold,))
+                timer.daemon = True
+                timer.start()
+                return
+            # The room resets the board (unless a best-of-3 is over) and tells the opponent
+            self.room.remove_player(client)
+            self.remove_bot()
 
-    def check_winner(self, player):
-        """Check if current player has won"""
-        # Check rows
-        for row in self.board:
-            if all(cell == player for cell in row):
-                return True
+    def expire_seat(self, hold):
+        """Free a held seat once its grace period is up, unless its player came back"""
+        with self.lock:
+            if self.room.expire_seat(hold):
+                print(f"Seat {hold[0]} given up.")
+                self.remove_bot()
 
-        # Check columns
-        for col in range(3):
-            if all(self.board[row][col] == player for row in range(3)):
-                return True
+    def remove_bot(self):
+        # a bot only plays the client that asked for it
+        if self.bot is not None:
+            self.room.remove_player(self.bot)
+            self.bot.close()
+            self.bot = None
 
-        # Check diagonals
-        if all(self.board[i][i] == player for i in range(3)):
-            return True
-        if all(self.board[i][2-i] == player for i in range(3)):
-            return True
-
-        return False
-
-    def is_board_full(self):
-        """Check if board is full (draw)"""
-        return all(cell != '' for row in self.board for cell in row)
+    def reap_loop(self):
+        """Each tick, ping clients that went quiet and cut off the ones that never answered"""
+        while True:
+            time.sleep(self.heartbeats.wheel.tick)
+            with self.lock:
+                dead = self.heartbeats.check(time.monotonic())
+            for client in dead:
+                print(f"No heartbeat from {client.address}, closing.")
+                client.abort()
 
     def start(self):
         """Start the server and accept connections"""
-        while True:
-            client, address = self.server.accept()
-            if len(self.clients) < 2:
+        if self.heartbeats is not None:
+            reaper = threading.Thread(target=self.reap_loop)
+            reaper.daemon = True
+            reaper.start()
+        try:
+            while True:
+                sock, address = self.server.accept()
                 print(f"Connection from {address}")
-                self.clients.append(client)
-                self.addresses.append(address)
-                thread = threading.Thread(target=self.handle_client, args=(client, address))
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                client = ClientConnection(sock, address, self.queue_limit, self.slow_client_policy)
+                client.room = self.room
+                # players and spectators are told apart by their hello, so the
+                # two-player limit is enforced in handle_client
+                thread = threading.Thread(target=self.serve_client, args=(client, address))
                 thread.daemon = True
                 thread.start()
-            else:
-                client.send(json.dumps({"type": "server_full"}).encode())
-                client.close()
-
-    def reset_best_of_3(self):
-        """Reset the best-of-3 game state"""
-        self.player1_wins = 0
-        self.player2_wins = 0
-        self.round_num = 1
-        print("Best-of-3 game has been reset")
+        finally:
+            get_hint_service().close()
+            if self.match_log is not None:
+                self.match_log.close()
+            if self.archive is not None:
+                self.archive.close()
 
 if __name__ == "__main__":
     try:
-        server = TicTacToeServer()
+        server = TicTacToeServer(match_log=os.environ.get("TICTACTOE_MATCH_LOG"),
+                                 archive=os.environ.get("TICTACTOE_ARCHIVE"))
         server.start()
     except Exception as e:
         print(f"Error: {e}")
-        sys.exit(1) 
\ No newline at end of file
+        sys.exit(1)
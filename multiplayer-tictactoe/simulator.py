@@ -0,0 +1,236 @@
+"""Batch self-play: many 3x3 games at once with NumPy.
+
+A board is a row of 9 digits, cell y * 3 + x holding 0 for empty, 1 for X
+and 2 for O; read as a base-3 number that is the tablebase index. Every
+one of the 3**9 positions is laid out once as a (3**9, 9) array, and the
+rules are worked out for all of them together: a matrix product against
+the 8 win lines says who has won where, and each policy's candidate moves
+(a 9-bit mask per position) are compiled into a flat table of successors:
+the position after the side to move plays its r-th candidate, with a flag
+bit set if that move ends the game.
+
+A batch of games is then just a vector of positions. A turn is two gathers
+and a random number per game: how many candidates there are, a uniform
+pick among them, and the successor it leads to. Finished games drop out
+with a boolean mask, so nothing loops over games in Python. boards()
+turns indices back into a (B, 9) array.
+
+Policies:
+
+* random: any empty cell;
+* greedy: win now if possible, else block, else the centre, a corner or an
+  edge, ties broken at random;
+* tablebase: a random best move from the solved tablebase.
+"""
+import argparse
+import json
+
+import numpy as np
+
+from game_state import CELLS, POPCOUNT, WIN_LINES
+from tablebase import POSITIONS, Tablebase
+
+EMPTY, X, O = 0, 1, 2
+
+# LINE_MATRIX[cell, line] is 1 when cell is on line
+LINE_MATRIX = np.array([[line >> cell & 1 for line in WIN_LINES] for cell in range(CELLS)], dtype=np.int16)
+
+POWERS = 3 ** np.arange(CELLS, dtype=np.int32)
+BITS = 1 << np.arange(CELLS, dtype=np.int32)
+
+# DIGITS[index] is the (9,) board for a tablebase index
+DIGITS = (np.arange(POSITIONS, dtype=np.int32)[:, None] // POWERS % 3).astype(np.int8)
+
+# how much marking a cell adds to the index, per player
+PLACE = np.stack([np.zeros(CELLS, dtype=np.int32), POWERS, 2 * POWERS])
+
+POPCOUNTS = np.frombuffer(POPCOUNT, dtype=np.uint8)
+
+# NTH_BIT[mask, r] is the r-th set bit of a 9-bit mask
+NTH_BIT = np.zeros((1 << CELLS, CELLS), dtype=np.int8)
+for _mask in range(1 << CELLS):
+    _bits = [cell for cell in range(CELLS) if _mask >> cell & 1]
+    NTH_BIT[_mask, :len(_bits)] = _bits
+
+# greedy's fallback preference: centre, corners, edges
+CELL_PREFERENCE = np.array([1, 0, 1, 0, 2, 0, 1, 0, 1], dtype=np.int16)
+
+DEFAULT_BATCH = 1 << 16
+
+
+def line_counts(player):
+    """(3**9, 8) number of player's marks on each win line, for every position"""
+    return (DIGITS == player).astype(np.int16) @ LINE_MATRIX
+
+
+def winners():
+    """WINNER[index]: X or O if that player has a full line, else EMPTY"""
+    winner = np.zeros(POSITIONS, dtype=np.int8)
+    winner[(line_counts(X) == 3).any(axis=1)] = X
+    winner[(line_counts(O) == 3).any(axis=1)] = O
+    return winner
+
+
+WINNER = winners()
+
+# FIRST_CELL[index] is the cell of the only mark, for one-mark positions
+FIRST_CELL = np.zeros(POSITIONS, dtype=np.int8)
+FIRST_CELL[POWERS] = np.arange(CELLS)
+
+# set in a successor when the move wins or fills the board
+GAME_OVER = 1 << 20
+
+
+def to_mask(cells):
+    """(N, 9) booleans -> (N,) 9-bit masks"""
+    return (cells.astype(np.int32) @ BITS).astype(np.uint16)
+
+
+def random_table():
+    return to_mask(DIGITS == EMPTY)
+
+
+def greedy_table():
+    empty = DIGITS == EMPTY
+    x_lines, o_lines = line_counts(X), line_counts(O)
+    x_to_move = (DIGITS == X).sum(axis=1) == (DIGITS == O).sum(axis=1)
+    own = np.where(x_to_move[:, None], x_lines, o_lines)
+    other = np.where(x_to_move[:, None], o_lines, x_lines)
+
+    def completing(mine, theirs):
+        open_pairs = ((mine == 2) & (theirs == 0)).astype(np.int16)
+        return empty & (open_pairs @ LINE_MATRIX.T > 0)
+
+    scores = empty * (1 + CELL_PREFERENCE) + completing(other, own) * 10 + completing(own, other) * 100
+    return to_mask(empty & (scores == scores.max(axis=1, keepdims=True)))
+
+
+def tablebase_table(tablebase=None):
+    # needs the dense in-memory table: every position is read
+    return np.frombuffer((tablebase or Tablebase.build()).best, dtype=np.uint16)
+
+
+POLICIES = {
+    "random": random_table,
+    "greedy": greedy_table,
+    "tablebase": tablebase_table,
+}
+
+
+def compile_policy(candidates):
+    """(counts, successors) for a table of candidate-move masks.
+
+    Both are flat and indexed by position * 9, the start of a position's
+    row, so a game's state is that offset: counts[p] is how many candidates
+    there are, and successors[p + r] is the offset after the r-th one.
+    """
+    index = np.arange(POSITIONS, dtype=np.int32)
+    mover = np.where((DIGITS == X).sum(axis=1) == (DIGITS == O).sum(axis=1), X, O)
+    counts = np.zeros((POSITIONS, CELLS), dtype=np.int32)
+    counts[:, 0] = POPCOUNTS[candidates]
+    successors = np.zeros((POSITIONS, CELLS), dtype=np.int32)
+    for r in range(CELLS):
+        # positions with fewer candidates keep their own index; it is never picked
+        after = np.where(r < counts[:, 0], index + PLACE[mover, NTH_BIT[candidates, r]], index)
+        over = (WINNER[after] != EMPTY) | (DIGITS[after] != EMPTY).all(axis=1)
+        successors[:, r] = after * CELLS | over * GAME_OVER
+    return counts.ravel(), successors.ravel()
+
+
+def get_policy(name):
+    """Compiled (counts, successors) tables for the named policy"""
+    if name not in POLICIES:
+        raise ValueError(f"unknown policy {name!r}, expected one of {list(POLICIES)}")
+    return compile_policy(POLICIES[name]())
+
+
+def boards(offsets):
+    """(B, 9) boards for a vector of position offsets"""
+    return DIGITS[(offsets & (GAME_OVER - 1)) // CELLS]
+
+
+def play_batch(count, x_policy, o_policy, rng):
+    """Play count games to the end, each side moving by its compiled policy.
+
+    Returns (winners, lengths, openings): the winner of each game (X, O, or
+    EMPTY for a draw), its number of moves, and X's first cell.
+    """
+    offsets = np.zeros(count, dtype=np.int32)
+    running = np.arange(count)
+    results = np.zeros(count, dtype=np.int8)
+    lengths = np.full(count, CELLS, dtype=np.int8)
+    openings = None
+    # 16 random bits per game per turn, drawn in one go
+    noise = rng.bit_generator.random_raw(-(-count * CELLS // 4)).view(np.uint16)
+
+    for turn in range(CELLS):
+        player = X if turn % 2 == 0 else O
+        counts, successors = x_policy if player == X else o_policy
+        # uniform pick among the candidates: the random bits scaled by their count
+        picks = noise[turn * count:turn * count + len(offsets)] * counts.take(offsets) >> 16
+        offsets = successors.take(offsets + picks)
+        if turn == 0:
+            openings = FIRST_CELL[offsets // CELLS]
+
+        over = offsets >= GAME_OVER
+        if over.any():
+            finished = running[over]
+            # the game ends on a win for the mover or a full board
+            positions = (offsets[over] - GAME_OVER) // CELLS
+            results[finished] = np.where(WINNER[positions] == player, player, EMPTY)
+            lengths[finished] = turn + 1
+            still = ~over
+            offsets = offsets[still]
+            running = running[still]
+            if not len(running):
+                break
+    return results, lengths, openings
+
+
+def simulate(games, x_policy="random", o_policy="random", batch=DEFAULT_BATCH, seed=None):
+    """Play games games in batches of batch; returns aggregate statistics"""
+    rng = np.random.default_rng(seed)
+    tables = {name: get_policy(name) for name in {x_policy, o_policy}}
+    outcomes = np.zeros(O + 1, dtype=np.int64)
+    length_counts = np.zeros(CELLS + 1, dtype=np.int64)
+    opening_games = np.zeros(CELLS, dtype=np.int64)
+    opening_x_wins = np.zeros(CELLS, dtype=np.int64)
+
+    remaining = games
+    while remaining > 0:
+        count = min(batch, remaining)
+        results, lengths, openings = play_batch(count, tables[x_policy], tables[o_policy], rng)
+        outcomes += np.bincount(results, minlength=O + 1)
+        length_counts += np.bincount(lengths, minlength=CELLS + 1)
+        opening_games += np.bincount(openings, minlength=CELLS)
+        opening_x_wins += np.bincount(openings[results == X], minlength=CELLS)
+        remaining -= count
+
+    return {
+        "games": games,
+        "x_policy": x_policy,
+        "o_policy": o_policy,
+        "x_wins": int(outcomes[X]),
+        "o_wins": int(outcomes[O]),
+        "draws": int(outcomes[EMPTY]),
+        "mean_length": float(length_counts @ np.arange(CELLS + 1)) / games if games else 0.0,
+        "lengths": {length: int(n) for length, n in enumerate(length_counts) if n},
+        # X's win rate after opening on each cell
+        "opening_x_win_rate": {cell: round(int(wins) / int(n), 4)
+                               for cell, (wins, n) in enumerate(zip(opening_x_wins, opening_games)) if n},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate many games and print outcome statistics as JSON")
+    parser.add_argument("--games", type=int, default=1_000_000)
+    parser.add_argument("--x-policy", choices=list(POLICIES), default="random")
+    parser.add_argument("--o-policy", choices=list(POLICIES), default="random")
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    print(json.dumps(simulate(args.games, args.x_policy, args.o_policy, args.batch, args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,10 @@
 
 
 import pygame
-from board import Board
+# run as a module from the project directory (python -m singleplayer.tictactoe_v3),
+# so the shared modules import like they do everywhere else
+from singleplayer.board import Board
+from ai import AIPlayer
 import sys
 import random
 import math
@@ -61,6 +64,9 @@ DRAW_TEXT = (100, 100, 100)   # Gray for draw
 WINNING_LINE_X = (255, 80, 80, 200)  # Semi-transparent red for X winning line
 WINNING_LINE_O = (80, 80, 255, 200)  # Semi-transparent blue for O winning line
 
+# how long the computer waits before playing, so its move can be seen
+AI_DELAY_MS = 400
+
 # Font setup
 title_font = pygame.font.SysFont('comicsans', 72, bold=True)
 button_font = pygame.font.SysFont('comicsans', 48)
@@ -98,8 +104,8 @@ class ModifiedBoard(Board):
             pygame.draw.line(surface, BLACK, adjusted_start, adjusted_end, 2)
         
         # Draw pieces with offset
-        for y in range(len(self.grid_matrix)):
-            for x in range(len(self.grid_matrix[y])):
+        for y in range(3):
+            for x in range(3):
                 cell_val = self.get_cell_val(x, y)
                 if cell_val == "X" or cell_val == "O":
                     # Check if this cell is part of the winning line
@@ -170,27 +176,7 @@ class ModifiedBoard(Board):
     
     def find_winning_line(self, last_x, last_y, user):
         """Find the winning line based on the last move"""
-        self.winning_cells = []
-        
-        # Check horizonal
-        if all(self.get_cell_val(col, last_y) == user for col in range(3)):
-            self.winning_cells = [(col, last_y) for col in range(3)]
-            return
-            
-        # Check vertical
-        if all(self.get_cell_val(last_x, row) == user for row in range(3)):
-            self.winning_cells = [(last_x, row) for row in range(3)]
-            return
-            
-        # Check diagonal from top-left to bottom-right
-        if last_x == last_y and all(self.get_cell_val(i, i) == user for i in range(3)):
-            self.winning_cells = [(i, i) for i in range(3)]
-            return
-            
-        # Check diagonal from top-right to bottom-left
-        if last_x + last_y == 2 and all(self.get_cell_val(i, 2-i) == user for i in range(3)):
-            self.winning_cells = [(i, 2-i) for i in range(3)]
-            return
+        self.winning_cells = self.state.winning_cells(user)
     
     def clear_board(self):
         super().clear_board()
@@ -255,7 +241,8 @@ def main_menu():
     # Create buttons
     play_button = Button(200, 200, 200, 60, "PLAY", BUTTON_TEXT, BUTTON_BG, BUTTON_HOVER, BUTTON_SHADOW)
     best_of_3_button = Button(150, 280, 300, 60, "BEST OF 3", BUTTON_TEXT, BUTTON_BG, BUTTON_HOVER, BUTTON_SHADOW)
-    exit_button = Button(200, 400, 200, 60, "EXIT", BUTTON_TEXT, EXIT_BG, EXIT_HOVER, EXIT_SHADOW)
+    ai_button = Button(200, 360, 200, 60, "VS AI", BUTTON_TEXT, BUTTON_BG, BUTTON_HOVER, BUTTON_SHADOW)
+    exit_button = Button(200, 440, 200, 60, "EXIT", BUTTON_TEXT, EXIT_BG, EXIT_HOVER, EXIT_SHADOW)
     
     menu_running = True
     selected_mode = None  # Track what mode the player picks
@@ -271,6 +258,7 @@ def main_menu():
         # Draw buttons
         play_hover = play_button.draw(surface)
         best3_hover = best_of_3_button.draw(surface)
+        ai_hover = ai_button.draw(surface)
         exit_hover = exit_button.draw(surface)
 
         # Handle Events
@@ -284,6 +272,8 @@ def main_menu():
                     play_button.check_click(pygame.mouse.get_pos(), True)
                 elif best3_hover and event.button == 1:
                     best_of_3_button.check_click(pygame.mouse.get_pos(), True)
+                elif ai_hover and event.button == 1:
+                    ai_button.check_click(pygame.mouse.get_pos(), True)
                 elif exit_hover and event.button == 1:
                     exit_button.check_click(pygame.mouse.get_pos(), True)
 
@@ -294,19 +284,62 @@ def main_menu():
                 elif best_of_3_button.pressed and best3_hover:
                     selected_mode = "best_of_3"
                     menu_running = False
+                elif ai_button.pressed and ai_hover:
+                    selected_mode = "ai"
+                    menu_running = False
                 elif exit_button.pressed and exit_hover:
                     pygame.quit()
                     sys.exit()
 
                 play_button.pressed = False
                 best_of_3_button.pressed = False
+                ai_button.pressed = False
                 exit_button.pressed = False
 
         pygame.display.flip()
 
     return selected_mode
 
-def game():
+def difficulty_menu():
+    # One button per difficulty, easiest first
+    buttons = [
+        (Button(200, 180, 200, 60, "EASY", BUTTON_TEXT, BUTTON_BG, BUTTON_HOVER, BUTTON_SHADOW), "easy"),
+        (Button(175, 260, 250, 60, "MEDIUM", BUTTON_TEXT, BUTTON_BG, BUTTON_HOVER, BUTTON_SHADOW), "medium"),
+        (Button(200, 340, 200, 60, "HARD", BUTTON_TEXT, BUTTON_BG, BUTTON_HOVER, BUTTON_SHADOW), "hard"),
+        (Button(150, 420, 300, 60, "PERFECT", BUTTON_TEXT, EXIT_BG, EXIT_HOVER, EXIT_SHADOW), "perfect"),
+    ]
+
+    while True:
+        surface.fill(CREAM_BG)
+
+        title_text = title_font.render("DIFFICULTY", True, BLACK)
+        title_rect = title_text.get_rect(center=(300, 100))
+        surface.blit(title_text, title_rect)
+
+        hovering = [button.draw(surface) for button, _ in buttons]
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                for (button, _), hover in zip(buttons, hovering):
+                    if hover:
+                        button.check_click(pygame.mouse.get_pos(), True)
+
+            if event.type == pygame.MOUSEBUTTONUP:
+                for (button, difficulty), hover in zip(buttons, hovering):
+                    if button.pressed and hover:
+                        return difficulty
+                    button.pressed = False
+
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                return None
+
+        pygame.display.flip()
+
+def game(ai=None):
     board = ModifiedBoard()  # Use our modified board class
     user = "X"
     game_running = True
@@ -315,6 +348,7 @@ def game():
     clock = pygame.time.Clock()
     move_sound_played = False
     animation_timer = 0  # Add animation timer
+    ai_move_at = None  # when the computer will play its next move
 
     while game_running:
         clock.tick(60)
@@ -325,7 +359,9 @@ def game():
                 pygame.quit()
                 sys.exit()
 
-            if event.type == pygame.MOUSEBUTTONDOWN and not board.gameover:
+            # clicks are ignored while the computer is thinking
+            human_turn = ai is None or user != ai.symbol
+            if event.type == pygame.MOUSEBUTTONDOWN and not board.gameover and human_turn:
                 if pygame.mouse.get_pressed()[0]:
                     position = pygame.mouse.get_pos()
                     old_board_state = [row[:] for row in board.grid_matrix]
@@ -360,10 +396,33 @@ def game():
                     user = "X"
                     board.current_player = "X"
                     animation_timer = 0  # Reset animation timer
+                    ai_move_at = None
                 elif event.key == pygame.K_ESCAPE:
                     play_sound(button_sound)
                     return "Exit"
 
+        # the computer plays its move once the delay has passed
+        if ai is not None and user == ai.symbol and not board.gameover:
+            if ai_move_at is None:
+                ai_move_at = pygame.time.get_ticks() + AI_DELAY_MS
+            elif pygame.time.get_ticks() >= ai_move_at:
+                ai_move_at = None
+                x, y = ai.choose_move(board.state)
+                board.get_mouse_input(x, y, user)
+                play_sound(x_sound if user == "X" else o_sound)
+
+                if board.gameover:
+                    if board.state.has_won(user):
+                        winner = user
+                        play_sound(victory_sound)
+                    else:
+                        is_draw = True
+                        play_sound(draw_sound)
+
+                if board.switch_user:
+                    user = "O" if user == "X" else "X"
+                    board.current_player = user
+
         surface.fill(CREAM_BG)
         
         # Draw turn indicator at the top of screen
@@ -483,6 +542,14 @@ while running:
         if result == "Exit":
             running = False
 
+    elif mode == "ai":
+        difficulty = difficulty_menu()  # Pick how well the computer plays
+        if difficulty is not None:
+            # the player is X and moves first; the computer answers as O
+            result = game(AIPlayer("O", difficulty))
+            if result == "Exit":
+                running = False
+
     else:
         running = False  # If player clicks Exit or somehow no mode is chosen
 
@@ -0,0 +1,134 @@
+"""Perfect-play tablebase: every 3x3 position solved once.
+
+A position is indexed by its base-3 hash, sum(cell * 3**i) over the nine
+cells with 0 for empty, 1 for X and 2 for O. That gives a flat table of
+3**9 = 19683 slots, of which 5478 are reachable from the empty board.
+For each reachable position the table holds:
+
+* the minimax value for the side to move (stored as value + 1, so a loss,
+  draw and win are 0, 1 and 2, and UNREACHABLE marks the rest), and
+* a 9-bit mask of the moves that achieve that value.
+
+The hash is two lookups in 512-entry tables, one per player mask, so any
+query is O(1). Solving from scratch takes a few tens of milliseconds; to
+skip even that, tablebase_file.py writes a file that opens with mmap.
+"""
+import os
+from array import array
+
+from game_state import CELLS, FULL_MASK, WINNING_LINE
+
+POSITIONS = 3 ** CELLS
+UNREACHABLE = 255
+
+LOSS, DRAW, WIN = -1, 0, 1
+
+# base-3 digits contributed by each possible X mask; O marks count double
+X_DIGITS = tuple(sum(3 ** i for i in range(CELLS) if mask >> i & 1) for mask in range(1 << CELLS))
+O_DIGITS = tuple(2 * digits for digits in X_DIGITS)
+
+
+def position_index(x_mask, o_mask):
+    """Base-3 hash of a position"""
+    return X_DIGITS[x_mask] + O_DIGITS[o_mask]
+
+
+class Tablebase:
+    """Minimax value and best moves for every reachable position"""
+
+    def __init__(self, values=None, best=None):
+        self.values = values if values is not None else bytearray([UNREACHABLE]) * POSITIONS
+        self.best = best if best is not None else array("H", bytes(2 * POSITIONS))
+
+    @classmethod
+    def build(cls):
+        """Solve the game from the empty board"""
+        table = cls()
+        table.solve(0, 0, True)
+        return table
+
+    def solve(self, x_mask, o_mask, x_to_move):
+        """Negamax value for the side to move, filling in the table on the way"""
+        index = X_DIGITS[x_mask] + O_DIGITS[o_mask]
+        stored = self.values[index]
+        if stored != UNREACHABLE:
+            return stored - 1
+
+        best = 0
+        if WINNING_LINE[o_mask if x_to_move else x_mask]:
+            # the previous move won
+            value = LOSS
+        elif x_mask | o_mask == FULL_MASK:
+            value = DRAW
+        else:
+            value = LOSS - 1
+            free = FULL_MASK ^ (x_mask | o_mask)
+            for i in range(CELLS):
+                bit = 1 << i
+                if not free & bit:
+                    continue
+                if x_to_move:
+                    score = -self.solve(x_mask | bit, o_mask, False)
+                else:
+                    score = -self.solve(x_mask, o_mask | bit, True)
+                if score > value:
+                    value, best = score, bit
+                elif score == value:
+                    best |= bit
+
+        self.values[index] = value + 1
+        self.best[index] = best
+        return value
+
+    def reachable(self):
+        """Number of positions that can occur in a game"""
+        return POSITIONS - self.values.count(UNREACHABLE)
+
+    def value(self, state):
+        """WIN, DRAW or LOSS for the side to move in state; None if unreachable"""
+        stored = self.values[X_DIGITS[state.x_mask] + O_DIGITS[state.o_mask]]
+        return None if stored == UNREACHABLE else stored - 1
+
+    def best_moves(self, state):
+        """Cells (as bit indices) that keep the best achievable result"""
+        mask = self.best[X_DIGITS[state.x_mask] + O_DIGITS[state.o_mask]]
+        return [i for i in range(CELLS) if mask >> i & 1]
+
+    def move_values(self, state):
+        """Value of every legal move for the side to move, keyed by bit index"""
+        x_mask, o_mask = state.x_mask, state.o_mask
+        x_to_move = state.to_move() == "X"
+        free = FULL_MASK ^ (x_mask | o_mask)
+        values = {}
+        for i in range(CELLS):
+            bit = 1 << i
+            if free & bit:
+                if x_to_move:
+                    child = self.values[X_DIGITS[x_mask | bit] + O_DIGITS[o_mask]]
+                else:
+                    child = self.values[X_DIGITS[x_mask] + O_DIGITS[o_mask | bit]]
+                # past the end of a game, as in MappedTablebase
+                if child != UNREACHABLE:
+                    values[i] = -(child - 1)
+        return values
+
+
+_shared = None
+
+
+def get_tablebase(path=None):
+    """The process-wide tablebase.
+
+    Mapped from the file at path, or at $TICTACTOE_TABLEBASE, if either is
+    set (see tablebase_file.open_3x3 for files that don't check out);
+    otherwise solved on first use.
+    """
+    global _shared
+    if _shared is None:
+        path = path or os.environ.get("TICTACTOE_TABLEBASE")
+        if path:
+            from tablebase_file import open_3x3
+            _shared = open_3x3(path)
+        else:
+            _shared = Tablebase.build()
+    return _shared
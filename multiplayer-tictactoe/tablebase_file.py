@@ -0,0 +1,299 @@
+"""On-disk tablebase that is memory-mapped instead of solved at start-up.
+
+A file holds only one position out of each group of symmetric ones (the one
+with the smallest base-3 index of its 8 rotations and reflections), so a
+3x3 table is 765 entries instead of 5478. All integers are little-endian:
+
+    header   16 bytes: magic b"TTTB", format version (u16), board size (u8),
+             k in a row (u8), entry count (u32), 4 bytes reserved
+    keys     count x u32: canonical base-3 indices, sorted
+    best     count x u16: mask of the best moves, in the canonical position's cells
+    values   count x u8: minimax value for the side to move, plus 1
+
+Opening a file is an mmap and a header check, and lookups read straight
+from the mapping: a binary search over the keys, then the best-move mask
+is turned back through the symmetry that made the position canonical.
+Read-only mappings of one file share their pages, so any number of server
+processes hold a single copy.
+
+Build one with:
+
+    python tablebase_file.py tablebase.ttb
+    python tablebase_file.py tablebase-4x4.ttb --size 4 --k 3 --plies 3
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left
+
+from kboard import SYMMETRIES
+from tablebase import DRAW, LOSS, UNREACHABLE, WIN, Tablebase
+
+MAGIC = b"TTTB"
+# version 1 was a dense dump of every index with no header fields
+VERSION = 2
+HEADER = struct.Struct("<4sHBBI4x")
+# entries in a complete 3x3 file: the reachable positions, one per symmetry group
+ENTRIES_3X3 = 765
+
+
+class SymmetricIndexer:
+    """Base-3 index of a position under each of the 8 symmetries.
+
+    The index of a mask is summed a byte at a time from per-symmetry tables,
+    so a lookup is a handful of list reads whatever the board size.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.cells = size * size
+        self.permutations = []
+        for symmetry in SYMMETRIES:
+            permutation = []
+            for cell in range(self.cells):
+                x, y = symmetry(cell % size, cell // size, size)
+                permutation.append(y * size + x)
+            self.permutations.append(permutation)
+        # tables[s][chunk][byte] is the base-3 index of those X marks under symmetry s
+        self.tables = []
+        for permutation in self.permutations:
+            powers = [3 ** image for image in permutation]
+            powers += [0] * (-len(powers) % 8)
+            chunks = []
+            for chunk in range(len(powers) // 8):
+                digits = [0] * 256
+                for byte in range(1, 256):
+                    # the byte's lowest bit on top of the entry without it
+                    low = byte & -byte
+                    digits[byte] = digits[byte ^ low] + powers[chunk * 8 + low.bit_length() - 1]
+                chunks.append(digits)
+            self.tables.append(chunks)
+
+    def canonical(self, x_mask, o_mask):
+        """(key, symmetry): the smallest symmetric index and a symmetry giving it"""
+        best_key, best_symmetry = None, 0
+        for symmetry, table in enumerate(self.tables):
+            key = 0
+            for chunk, digits in enumerate(table):
+                shift = chunk * 8
+                key += digits[x_mask >> shift & 255] + 2 * digits[o_mask >> shift & 255]
+            if best_key is None or key < best_key:
+                best_key, best_symmetry = key, symmetry
+        return best_key, best_symmetry
+
+    def masks(self, index):
+        """(x_mask, o_mask) of a base-3 index"""
+        x_mask = o_mask = 0
+        for cell in range(self.cells):
+            index, digit = divmod(index, 3)
+            if digit == 1:
+                x_mask |= 1 << cell
+            elif digit == 2:
+                o_mask |= 1 << cell
+        return x_mask, o_mask
+
+
+def write_tablebase_file(path, size, k, entries):
+    """Write (canonical key, value, best mask) entries to path"""
+    if 3 ** (size * size) > 1 << 32 or size * size > 16:
+        raise ValueError(f"a {size}x{size} board does not fit the u32 keys and u16 move masks")
+    entries = sorted(entries)
+    keys = array("I", (key for key, _, _ in entries))
+    best = array("H", (mask for _, _, mask in entries))
+    values = bytes(value + 1 for _, value, _ in entries)
+    if sys.byteorder != "little":
+        keys.byteswap()
+        best.byteswap()
+    # write under a temporary name so a process opening the file never sees half of it
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, size, k, len(entries)))
+        f.write(keys.tobytes())
+        f.write(best.tobytes())
+        f.write(values)
+    os.replace(tmp_path, path)
+
+
+def open_3x3(path):
+    """The 3x3 tablebase in the file at path, which is rewritten if it is missing, damaged or out of date.
+
+    A valid file for another board is left alone, and the table is solved
+    in memory instead.
+    """
+    try:
+        table = MappedTablebase.open(path)
+    except (OSError, ValueError) as e:
+        print(f"Rebuilding tablebase file: {e}")
+        write_tablebase_file(path, 3, 3, tablebase_entries(Tablebase.build()))
+        return MappedTablebase.open(path)
+    if (table.size, table.k, table.count) == (3, 3, ENTRIES_3X3):
+        return table
+    table.close()
+    if (table.size, table.k) != (3, 3):
+        print(f"{path} holds a {table.size}x{table.size} table with k={table.k}, not 3x3; solving in memory")
+        return Tablebase.build()
+    print(f"Rebuilding tablebase file: {path} has {table.count} positions, expected {ENTRIES_3X3}")
+    write_tablebase_file(path, 3, 3, tablebase_entries(Tablebase.build()))
+    return MappedTablebase.open(path)
+
+
+def tablebase_entries(table):
+    """Canonical entries of a solved 3x3 Tablebase"""
+    indexer = SymmetricIndexer(3)
+    for index, stored in enumerate(table.values):
+        if stored == UNREACHABLE:
+            continue
+        if indexer.canonical(*indexer.masks(index))[0] == index:
+            yield index, stored - 1, table.best[index]
+
+
+def search_entries(size, k, plies, time_budget):
+    """Canonical positions up to plies moves deep that the search engine can solve"""
+    from kboard import KBoard
+    from search import SearchEngine
+
+    indexer = SymmetricIndexer(size)
+    engine = SearchEngine(time_budget=time_budget)
+    seen = set()
+    frontier = [KBoard(size, k)]
+    for ply in range(plies + 1):
+        next_frontier = []
+        for board in frontier:
+            key, _ = indexer.canonical(board.x_mask, board.o_mask)
+            if key in seen:
+                continue
+            seen.add(key)
+            if (board.history and board.wins_at(board.history[-1])) or board.is_full():
+                continue
+            # search the canonical position itself, so its move is in canonical cells
+            result = engine.search(KBoard(size, k, *indexer.masks(key)))
+            if result.solved:
+                value = WIN if result.score > 0 else LOSS if result.score < 0 else DRAW
+                yield key, value, 1 << result.move
+            if ply < plies:
+                for cell in board.free_cells():
+                    child = board.copy()
+                    child.play(cell)
+                    next_frontier.append(child)
+        frontier = next_frontier
+
+
+class MappedTablebase:
+    """A tablebase file, looked up in place through mmap"""
+
+    def __init__(self, path, size, k, count, buffer):
+        self.path = path
+        self.size = size
+        self.k = k
+        self.count = count
+        self.buffer = buffer
+        view = memoryview(buffer)
+        start = HEADER.size
+        if sys.byteorder == "little":
+            self.keys = view[start:start + 4 * count].cast("I")
+            self.best = view[start + 4 * count:start + 6 * count].cast("H")
+        else:
+            self.keys = array("I", view[start:start + 4 * count])
+            self.best = array("H", view[start + 4 * count:start + 6 * count])
+            self.keys.byteswap()
+            self.best.byteswap()
+        self.values = view[start + 6 * count:start + 7 * count]
+        self.indexer = SymmetricIndexer(size)
+
+    @classmethod
+    def open(cls, path):
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(buffer) < HEADER.size:
+                raise ValueError(f"{path} is not a tablebase file")
+            magic, version, size, k, count = HEADER.unpack_from(buffer)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a tablebase file")
+            if version != VERSION:
+                raise ValueError(f"{path} is tablebase format version {version}, expected {VERSION}; rebuild it")
+            if len(buffer) != HEADER.size + 7 * count:
+                raise ValueError(f"{path} is truncated")
+            return cls(path, size, k, count, buffer)
+        except Exception:
+            # don't leave a mapping behind for a file we won't use
+            buffer.close()
+            raise
+
+    def find(self, x_mask, o_mask):
+        """(entry number, symmetry) of a position; entry is None if not in the file"""
+        key, symmetry = self.indexer.canonical(x_mask, o_mask)
+        entry = bisect_left(self.keys, key)
+        if entry < self.count and self.keys[entry] == key:
+            return entry, symmetry
+        return None, symmetry
+
+    def value(self, state):
+        """WIN, DRAW or LOSS for the side to move in state; None if not in the file"""
+        entry, _ = self.find(state.x_mask, state.o_mask)
+        return None if entry is None else self.values[entry] - 1
+
+    def best_moves(self, state):
+        """Cells (as bit indices) that keep the best achievable result"""
+        entry, symmetry = self.find(state.x_mask, state.o_mask)
+        if entry is None:
+            return []
+        mask = self.best[entry]
+        permutation = self.indexer.permutations[symmetry]
+        return [cell for cell in range(self.indexer.cells) if mask >> permutation[cell] & 1]
+
+    def move_values(self, state):
+        """Value of every legal move for the side to move, keyed by bit index"""
+        x_mask, o_mask = state.x_mask, state.o_mask
+        x_to_move = bin(x_mask).count("1") == bin(o_mask).count("1")
+        occupied = x_mask | o_mask
+        values = {}
+        for cell in range(self.indexer.cells):
+            bit = 1 << cell
+            if occupied & bit:
+                continue
+            if x_to_move:
+                entry, _ = self.find(x_mask | bit, o_mask)
+            else:
+                entry, _ = self.find(x_mask, o_mask | bit)
+            if entry is not None:
+                values[cell] = -(self.values[entry] - 1)
+        return values
+
+    def reachable(self):
+        """Number of canonical positions in the file"""
+        return self.count
+
+    def close(self):
+        # drop our views first; mmap refuses to close while they exist
+        self.keys = self.best = self.values = None
+        self.buffer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a memory-mapped tablebase file")
+    parser.add_argument("path")
+    parser.add_argument("--size", type=int, default=3)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--plies", type=int, default=2,
+                        help="for boards other than 3x3: solve positions up to this many moves in")
+    parser.add_argument("--budget", type=float, default=1.0,
+                        help="for boards other than 3x3: seconds of search per position")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if (args.size, args.k) == (3, 3):
+        entries = list(tablebase_entries(Tablebase.build()))
+    else:
+        entries = list(search_entries(args.size, args.k, args.plies, args.budget))
+    write_tablebase_file(args.path, args.size, args.k, entries)
+    print(f"wrote {len(entries)} positions to {args.path} "
+          f"({os.path.getsize(args.path)} bytes) in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
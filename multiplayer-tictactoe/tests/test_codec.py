@@ -0,0 +1,44 @@
+import pytest
+
+from codec import BINARY, JSON, JSON_FALLBACK, choose_codec, decode_payload
+
+MESSAGES = [
+    {"type": "move", "position": [2, 0], "seq": 7},
+    {"type": "update_board", "position": [1, 1], "player": "O", "seq": 12},
+    {"type": "game_over", "winner": "Draw", "seq": 30},
+    {"type": "chat_message", "player": "X", "text": "gl hf ☺"},
+    {"type": "update_game_mode", "game_mode": "ultimate", "seq": 3},
+]
+
+
+@pytest.mark.parametrize("message", MESSAGES)
+def test_round_trip(message):
+    for codec in (JSON, BINARY):
+        assert decode_payload(codec.encode(message)) == message
+
+
+def test_binary_layouts_are_compact():
+    assert len(BINARY.encode({"type": "move", "position": [2, 0], "seq": 7})) == 7
+
+
+@pytest.mark.parametrize("message", [
+    # an extra field, a value the layout can't hold, and text that isn't a string
+    {"type": "move", "position": [2, 0], "seq": 7, "note": "x"},
+    {"type": "move", "position": [300, 0], "seq": 7},
+    {"type": "chat_message", "player": "X", "text": 123},
+])
+def test_json_fallback(message):
+    payload = BINARY.encode(message)
+    assert payload[0] == JSON_FALLBACK
+    assert decode_payload(payload) == message
+
+
+@pytest.mark.parametrize("payload", [b"", bytes([6, 1]), bytes([250])])
+def test_bad_binary_payloads_raise_value_error(payload):
+    with pytest.raises(ValueError):
+        decode_payload(payload)
+
+
+def test_choose_codec():
+    assert choose_codec(["binary", "json"]) is BINARY
+    assert choose_codec(["msgpack"]) is JSON
@@ -0,0 +1,79 @@
+import os
+
+# no window or sound card needed to drive the client's message handling
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from client import NetworkGame
+from codec import JSON
+from protocol import HEADER_SIZE, decode_message
+from room import Room
+
+
+class RecordingConnection:
+    codec = JSON
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+    def send_frame(self, frame):
+        self.sent.append(decode_message(frame[HEADER_SIZE:]))
+
+
+def seated_room():
+    room = Room(1)
+    x, o = RecordingConnection(), RecordingConnection()
+    room.add_player(x)
+    room.add_player(o)
+    return room, x, o
+
+
+def test_updates_are_numbered_deltas():
+    room, x, o = seated_room()
+    start = room.seq
+    o.sent.clear()
+    room.handle_message(x, {"type": "move", "position": [2, 1], "seq": room.seq})
+    update = o.sent[0]
+    assert update == {"type": "update_board", "position": [2, 1], "player": "X", "seq": start + 1}
+    assert [message["seq"] for message in o.sent] == list(range(start + 1, room.seq + 1))
+
+
+def test_move_from_a_stale_board_gets_a_snapshot():
+    room, x, o = seated_room()
+    stale = room.seq
+    room.handle_message(x, {"type": "move", "position": [0, 0], "seq": stale})
+    o.sent.clear()
+    room.handle_message(o, {"type": "move", "position": [1, 1], "seq": stale})
+    [reply] = o.sent
+    assert reply["type"] == "snapshot" and reply["seq"] == room.seq
+    assert room.board.is_free(1, 1)
+
+
+def test_resync_gets_a_snapshot():
+    room, x, _ = seated_room()
+    room.handle_message(x, {"type": "move", "position": [0, 0], "seq": room.seq})
+    x.sent.clear()
+    room.handle_message(x, {"type": "resync"})
+    [reply] = x.sent
+    assert reply["type"] == "snapshot" and reply["board"][0][0] == "X"
+
+
+def test_client_resyncs_on_a_gap(monkeypatch):
+    game = NetworkGame()
+    sent = []
+    monkeypatch.setattr(game, "send_message", sent.append)
+    game.process_message({"type": "snapshot", "board": [["", "", ""]] * 3, "current_player": "X",
+                          "game_mode": "single_game", "round_num": 1, "player1_wins": 0,
+                          "player2_wins": 0, "game_over": False, "winner": None, "seq": 5})
+    # a duplicate is dropped, the next one applies
+    assert not game.check_sequence({"type": "next_turn", "seq": 5})
+    assert game.check_sequence({"type": "next_turn", "seq": 6})
+    # a gap asks for the full state once, and drops everything until it comes
+    assert not game.check_sequence({"type": "next_turn", "seq": 8})
+    assert not game.check_sequence({"type": "next_turn", "seq": 9})
+    assert sent == [{"type": "resync"}]
+    assert game.check_sequence({"type": "snapshot", "seq": 9})
+    assert game.check_sequence({"type": "next_turn", "seq": 10})
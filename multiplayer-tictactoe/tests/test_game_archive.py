@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+from game_archive import ENTRY, ArchiveWriter, GameArchive
+
+GAMES = [
+    # (moves, winner, game_mode, round_num, player1_wins, player2_wins, ended_at)
+    ([4, 0, 2, 6, 3, 5, 1, 7, 8], "Draw", "single_game", 1, 0, 0, 1000),
+    ([0, 3, 1, 4, 2], "X", "best_of_3", 2, 1, 0, 1005),
+    ([], "Draw", "single_game", 1, 0, 0, 1005),
+    ([8, 0, 7, 1, 5, 2], "O", "best_of_3", 3, 1, 2, 1020),
+]
+
+
+def write(path, games):
+    writer = ArchiveWriter(path)
+    for moves, winner, game_mode, round_num, wins1, wins2, ended_at in games:
+        writer.record(moves, winner, game_mode, round_num, wins1, wins2, ended_at=ended_at)
+    writer.close()
+
+
+def read(path):
+    archive = GameArchive(path)
+    try:
+        return [(g.moves, g.winner, g.game_mode, g.round_num, g.player1_wins, g.player2_wins, g.ended_at)
+                for g in archive]
+    finally:
+        archive.close()
+
+
+def test_games_round_trip(tmp_path):
+    path = str(tmp_path / "games.ttta")
+    write(path, GAMES[:2])
+    # a second writer appends to the same archive
+    write(path, GAMES[2:])
+    assert read(path) == GAMES
+    archive = GameArchive(path)
+    assert len(archive) == 4 and archive[3].number == 3
+    assert [g.number for g in archive.between(1005, 1020)] == [1, 2]
+    with pytest.raises(IndexError):
+        archive.game(4)
+    archive.close()
+
+
+def test_index_stays_sorted_if_the_clock_steps_back(tmp_path):
+    path = str(tmp_path / "games.ttta")
+    write(path, [GAMES[1], GAMES[0]])
+    assert [game[-1] for game in read(path)] == [1005, 1005]
+
+
+def test_torn_tail_is_trimmed(tmp_path):
+    path = str(tmp_path / "games.ttta")
+    write(path, GAMES[:2])
+    sizes = os.path.getsize(path), os.path.getsize(path + ".idx")
+    # a record written without its entry, then half an entry
+    with open(path, "ab") as f:
+        f.write(bytes([9, 1, 2, 3]))
+    with open(path + ".idx", "ab") as f:
+        f.write(ENTRY.pack(2000, sizes[0])[:5])
+    # readers ignore the torn entry
+    assert read(path) == GAMES[:2]
+    ArchiveWriter(path).close()
+    assert (os.path.getsize(path), os.path.getsize(path + ".idx")) == sizes
+    write(path, GAMES[2:])
+    assert read(path) == GAMES
+
+
+def test_other_files_are_refused(tmp_path):
+    path = str(tmp_path / "games.ttta")
+    with open(path, "wb") as f:
+        f.write(b"not an archive")
+    with open(path + ".idx", "wb") as f:
+        f.write(b"")
+    with pytest.raises(ValueError):
+        ArchiveWriter(path)
@@ -0,0 +1,69 @@
+import random
+
+import pytest
+
+from grid_state import GridState, new_board
+
+
+def brute_force_winner(state):
+    """First player with k in a row anywhere, by scanning every line"""
+    size, k = state.size, state.k
+    for player in ("X", "O"):
+        mask = state.mask(player)
+        for y in range(size):
+            for x in range(size):
+                for dx, dy in ((1, 0), (0, 1), (1, 1), (-1, 1)):
+                    end_x, end_y = x + (k - 1) * dx, y + (k - 1) * dy
+                    if not (0 <= end_x < size and 0 <= end_y < size):
+                        continue
+                    if all(mask >> ((y + i * dy) * size + x + i * dx) & 1 for i in range(k)):
+                        return player
+    return None
+
+
+@pytest.mark.parametrize("cells", [
+    [(3, 7), (4, 7), (5, 7), (6, 7), (7, 7)],
+    [(0, 10), (0, 11), (0, 12), (0, 13), (0, 14)],
+    [(10, 10), (11, 11), (12, 12), (13, 13), (14, 14)],
+    [(14, 0), (13, 1), (12, 2), (11, 3), (10, 4)],
+])
+def test_five_in_a_row_wins_in_every_direction(cells):
+    board = new_board("gomoku")
+    # placed out of order, so the last mark joins two runs
+    for x, y in cells[:2] + cells[3:]:
+        board.place(x, y, "X")
+    assert board.winner() is None
+    board.place(*cells[2], "X")
+    assert board.has_won("X") and board.winning_cells("X") == sorted(cells, key=lambda cell: (cell[1], cell[0]))
+
+
+def test_four_or_a_broken_five_is_not_a_win():
+    board = GridState(15, 5)
+    for x in (0, 1, 2, 3, 5):
+        board.place(x, 0, "X")
+    board.place(4, 0, "O")
+    assert board.winner() is None
+
+
+def test_taken_and_off_board_cells_are_refused():
+    board = GridState(15, 5)
+    assert board.place(0, 0, "X")
+    assert not board.place(0, 0, "O")
+    assert not board.place(15, 0, "O")
+    assert board.move_count() == 1
+
+
+@pytest.mark.parametrize("size, k", [(15, 5), (7, 4), (3, 3)])
+def test_matches_a_full_scan_on_random_games(size, k):
+    rng = random.Random(size * 100 + k)
+    for _ in range(30):
+        board = GridState(size, k)
+        cells = [(x, y) for y in range(size) for x in range(size)]
+        rng.shuffle(cells)
+        player = "X"
+        for x, y in cells:
+            board.place(x, y, player)
+            assert board.winner() == brute_force_winner(board)
+            if board.winner():
+                break
+            player = "O" if player == "X" else "X"
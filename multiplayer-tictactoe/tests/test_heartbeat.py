@@ -0,0 +1,71 @@
+from heartbeat import PING, Heartbeats, TimingWheel
+
+
+class Conn:
+    def __init__(self):
+        self.sent = []
+        self.last_seen = 0.0
+
+    def send(self, message):
+        self.sent.append(message)
+
+
+def test_keys_expire_once_their_tick_has_passed():
+    wheel = TimingWheel(0.5, 5)
+    wheel.schedule("a", 1.2)
+    wheel.schedule("b", 3.0)
+    assert wheel.expire(1.4) == []
+    assert wheel.expire(1.5) == ["a"]
+    assert "a" not in wheel and len(wheel) == 1
+    assert wheel.expire(3.4) == []
+    assert wheel.expire(3.5) == ["b"]
+    assert len(wheel) == 0
+
+
+def test_cancel_and_reschedule():
+    wheel = TimingWheel(0.5, 5)
+    wheel.schedule("a", 1.0)
+    wheel.schedule("b", 1.0)
+    wheel.cancel("a")
+    wheel.cancel("missing")
+    wheel.schedule("b", 4.0)
+    assert wheel.expire(2.0) == []
+    assert wheel.expire(4.5) == ["b"]
+    # a deadline already past is due on the next expire
+    wheel.schedule("c", 1.0)
+    assert wheel.expire(5.0) == ["c"]
+
+
+def test_deadlines_past_the_span_wait_their_turn():
+    wheel = TimingWheel(1, 4)
+    wheel.schedule("far", 12)
+    for now in range(1, 13):
+        assert wheel.expire(now) == [], now
+    assert wheel.expire(13) == ["far"]
+
+
+def test_a_long_stall_expires_everything_due():
+    wheel = TimingWheel(1, 4)
+    for deadline in range(20):
+        wheel.schedule(deadline, deadline)
+    wheel.schedule("later", 100)
+    assert sorted(wheel.expire(50)) == list(range(20))
+    assert list(wheel.where) == ["later"]
+
+
+def test_quiet_connections_are_pinged_then_dropped():
+    heartbeats = Heartbeats(interval=10, timeout=5, tick=1)
+    busy, quiet, answers = Conn(), Conn(), Conn()
+    for conn in (busy, quiet, answers):
+        heartbeats.watch(conn, 0)
+    busy.last_seen = 8
+    assert heartbeats.check(11) == []
+    assert busy.sent == [] and quiet.sent == [PING] and answers.sent == [PING]
+    answers.last_seen = 12
+    assert heartbeats.check(17) == [quiet]
+    assert heartbeats.stats()["reaped"] == 1
+    heartbeats.forget(quiet)
+    # busy is pinged once it too has been quiet for an interval
+    assert heartbeats.check(19) == []
+    assert busy.sent == [PING]
+    assert answers.sent == [PING]
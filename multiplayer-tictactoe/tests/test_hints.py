@@ -0,0 +1,58 @@
+import os
+
+# no window or sound card needed to drive the client's message handling
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from client import NetworkGame
+from codec import JSON
+from protocol import HEADER_SIZE, decode_message
+from room import Room
+
+
+class RecordingConnection:
+    codec = JSON
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+    def send_frame(self, frame):
+        self.sent.append(decode_message(frame[HEADER_SIZE:]))
+
+
+def test_client_receives_hint(monkeypatch, capsys):
+    room = Room(1)
+    x, o = RecordingConnection(), RecordingConnection()
+    room.add_player(x)
+    room.add_player(o)
+    room.handle_message(x, {"type": "move", "position": [1, 1], "seq": room.seq})
+
+    # the client plays O and is up to date with the room
+    game = NetworkGame()
+    monkeypatch.setattr(game, "open_chat_window", lambda: None)
+    for message in o.sent:
+        game.process_message(message)
+    assert game.seq == room.seq
+
+    o.sent.clear()
+    room.handle_message(o, {"type": "hint_request"})
+    [reply] = o.sent
+    assert reply["type"] == "hint" and reply["moves"]
+    game.process_message(reply)
+    assert "Hint for O: play" in capsys.readouterr().out
+
+
+def test_hint_requests_are_throttled():
+    room = Room(1)
+    x, o = RecordingConnection(), RecordingConnection()
+    room.add_player(x)
+    room.add_player(o)
+    x.sent.clear()
+    room.handle_message(x, {"type": "hint_request"})
+    room.handle_message(x, {"type": "hint_request"})
+    first, second = x.sent
+    assert first["moves"] and not first.get("busy")
+    assert second["busy"] and not second["moves"]
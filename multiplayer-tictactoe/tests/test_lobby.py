@@ -0,0 +1,67 @@
+import pytest
+
+from async_server import AsyncTicTacToeServer
+from codec import JSON
+from lobby import Lobby
+
+
+class Connection:
+    codec = JSON
+
+    def __init__(self):
+        self.room = None
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+    def send_frame(self, frame):
+        pass
+
+
+def test_fifo_and_modes_dont_mix():
+    lobby = Lobby()
+    assert lobby.enqueue("a", "single_game") is None
+    assert lobby.enqueue("b", "gomoku") is None
+    assert lobby.enqueue("c", "single_game") == "a"
+    assert lobby.enqueue("d", "single_game") is None
+    assert lobby.enqueue("e", "gomoku") == "b"
+    assert lobby.stats()["queue_depth"]["single_game"] == 1
+    with pytest.raises(ValueError):
+        lobby.enqueue("f", "chess")
+
+
+def test_players_who_left_are_skipped():
+    lobby = Lobby()
+    lobby.enqueue("a", "best_of_3")
+    assert lobby.remove("a")
+    assert not lobby.remove("a")
+    assert lobby.enqueue("c", "best_of_3") is None
+    assert lobby.enqueue("d", "best_of_3") == "c"
+
+
+def test_rating_window():
+    lobby = Lobby(rating_window=100)
+    lobby.enqueue("low", "single_game", 1000)
+    lobby.enqueue("high", "single_game", 1500)
+    # too far from 1000, and 1500 is in reach
+    assert lobby.enqueue("mid", "single_game", 1420) == "high"
+    assert lobby.enqueue("new", "single_game", 1600) is None
+    assert lobby.enqueue("near", "single_game", 1050) == "low"
+
+
+def test_remaining_player_is_requeued_when_a_room_closes():
+    server = AsyncTicTacToeServer(grace_period=0)
+    a, b, c = Connection(), Connection(), Connection()
+    server.queue_player(a, "gomoku")
+    assert a.sent[-1] == {"type": "queued", "game_mode": "gomoku"}
+    server.queue_player(b, "gomoku")
+    room = a.room
+    assert room is b.room and room.players == {"X": a, "O": b}
+
+    server.release_room(a)
+    assert room.room_id not in server.rooms
+    assert b.room is None and server.lobby.is_queued(b)
+    # and gets the next player of its mode
+    server.queue_player(c, "gomoku")
+    assert b.room is c.room and b.room.game_mode == "gomoku"
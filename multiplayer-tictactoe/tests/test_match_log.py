@@ -0,0 +1,88 @@
+import asyncio
+
+from async_server import AsyncTicTacToeServer
+from codec import JSON
+from match_log import MatchLog, recover
+from room import Room, room_of_token
+
+
+class Connection:
+    codec = JSON
+
+    def send(self, message):
+        pass
+
+    def send_frame(self, frame):
+        pass
+
+
+def play_in_new_room(path, room_id):
+    """Open room_id in the log at path, seat two players and make a move; the seat tokens"""
+    log = MatchLog(path)
+    room = Room(room_id)
+    room.log = log
+    log.open_room(room_id, room.game_mode)
+    x, o = Connection(), Connection()
+    room.add_player(x)
+    room.add_player(o)
+    room.handle_message(x, {"type": "move", "position": [1, 1], "seq": room.seq})
+    return log, room, dict(room.tokens)
+
+
+def test_restored_seats_resume_by_token(tmp_path):
+    path = str(tmp_path / "matches.log")
+    log, _, tokens = play_in_new_room(path, 1)
+    log.close()
+
+    rooms, last_room_id = recover(path)
+    restored = rooms[1]
+    assert last_room_id == 1
+    assert sorted(hold[0] for hold in restored.hold_seats()) == ["O", "X"]
+    # a newcomer can't take a held seat; its player can, with the old token
+    assert not restored.has_free_seat()
+    assert restored.resume(Connection(), "1.not-the-token") is None
+    assert restored.resume(Connection(), tokens["X"]) == "X"
+    assert restored.board.to_rows()[1][1] == "X"
+
+
+def test_old_tokens_dont_resume_after_a_restart(tmp_path):
+    path = str(tmp_path / "matches.log")
+    log, room, old_tokens = play_in_new_room(path, 1)
+    log.close_room(room.room_id)
+    log.close()
+
+    # room 1 is gone, but its id isn't handed out again
+    rooms, last_room_id = recover(path)
+    assert rooms == {} and last_room_id == 1
+    log, _, tokens = play_in_new_room(path, last_room_id + 1)
+    log.close()
+
+    rooms, last_room_id = recover(path)
+    assert last_room_id == 2
+    restored = rooms[2]
+    restored.hold_seats()
+    for token in old_tokens.values():
+        assert rooms.get(room_of_token(token)) is None
+        assert restored.resume(Connection(), token) is None
+    assert restored.resume(Connection(), tokens["O"]) == "O"
+
+
+def test_restored_rooms_outlast_a_zero_grace_period(tmp_path):
+    path = str(tmp_path / "matches.log")
+    play_in_new_room(path, 1)[0].close()
+    server = AsyncTicTacToeServer(host="127.0.0.1", port=0, grace_period=0, ping_interval=None,
+                                  match_log=path, restore_timeout=0.2)
+
+    async def run():
+        serving = asyncio.ensure_future(server.serve())
+        await asyncio.sleep(0.05)
+        # the seats wait for their players, not for the grace period
+        assert 1 in server.rooms and not server.rooms[1].has_free_seat()
+        await asyncio.sleep(0.3)
+        assert 1 not in server.rooms
+        serving.cancel()
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.match_log.close()
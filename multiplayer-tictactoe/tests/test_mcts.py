@@ -0,0 +1,25 @@
+from grid_state import GridState
+from mcts import MCTSPlayer
+
+
+def test_mcts_plays_grid_states():
+    # X to move, with three in a row on a 7x7 board where four wins
+    board = GridState(7, 4)
+    for x in range(3):
+        board.place(x + 1, 3, "X")
+        board.place(x + 1, 5, "O")
+    player = MCTSPlayer("X", time_budget=0.5, seed=1)
+    try:
+        assert player.choose_move(board) in ((0, 3), (4, 3))
+    finally:
+        player.close()
+
+
+def test_mcts_workers_share_the_search():
+    player = MCTSPlayer("X", time_budget=0.2, workers=2, seed=1)
+    try:
+        result = player.engine.search(player.board_for(GridState(7, 4)))
+        assert result.workers == 2 and result.playouts > 0
+        assert 0 <= result.move < 49
+    finally:
+        player.close()
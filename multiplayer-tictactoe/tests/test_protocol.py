@@ -0,0 +1,48 @@
+import pytest
+
+from codec import BINARY
+from protocol import FrameDecoder, ProtocolError, decode_message, encode_message
+
+MESSAGES = [
+    {"type": "hello", "codecs": ["binary", "json"]},
+    {"type": "move", "position": [0, 2], "seq": 4},
+    {"type": "chat_message", "text": "x" * 3000},
+]
+
+
+def decode_all(decoder, chunks):
+    messages = []
+    for chunk in chunks:
+        # frames are only valid during the iteration, so decode them there
+        messages.extend(decode_message(frame) for frame in decoder.feed(chunk))
+    return messages
+
+
+def test_coalesced_frames():
+    stream = b"".join(encode_message(message) for message in MESSAGES)
+    decoder = FrameDecoder()
+    assert decode_all(decoder, [stream]) == MESSAGES
+    assert decoder.pending() == 0
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 1000])
+def test_split_frames(size):
+    stream = b"".join(encode_message(message, BINARY) for message in MESSAGES)
+    chunks = [stream[i:i + size] for i in range(0, len(stream), size)]
+    decoder = FrameDecoder()
+    assert decode_all(decoder, chunks) == MESSAGES
+    assert decoder.pending() == 0
+
+
+def test_partial_frame_stays_buffered():
+    frame = encode_message(MESSAGES[1])
+    decoder = FrameDecoder()
+    assert decode_all(decoder, [frame + frame[:3]]) == [MESSAGES[1]]
+    assert decoder.pending() == 3
+    assert decode_all(decoder, [frame[3:]]) == [MESSAGES[1]]
+
+
+def test_oversized_frame_is_refused():
+    decoder = FrameDecoder(max_frame_size=16)
+    with pytest.raises(ProtocolError):
+        decode_all(decoder, [encode_message(MESSAGES[2])])
@@ -0,0 +1,79 @@
+from codec import JSON
+from protocol import HEADER_SIZE, decode_message
+from room import RESUME_HISTORY, Room
+
+
+class RecordingConnection:
+    codec = JSON
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+    def send_frame(self, frame):
+        self.sent.append(decode_message(frame[HEADER_SIZE:]))
+
+
+def seated_room():
+    room = Room(1)
+    room.grace_period = 30
+    x, o = RecordingConnection(), RecordingConnection()
+    room.add_player(x)
+    room.add_player(o)
+    return room, x, o
+
+
+def test_a_dropped_seat_is_held_and_resumed_with_its_token():
+    room, x, o = seated_room()
+    token = x.sent[0]["resume_token"]
+    room.handle_message(x, {"type": "move", "position": [0, 0], "seq": room.seq})
+    last_seq = room.seq
+    hold = room.suspend_player(x)
+    assert hold == ("X", room.seq) and not room.has_free_seat()
+    assert o.sent[-1]["type"] == "opponent_reconnecting"
+    # the game waits for X
+    room.handle_message(o, {"type": "move", "position": [1, 1], "seq": room.seq})
+    assert room.board.is_free(1, 1)
+
+    back = RecordingConnection()
+    assert room.resume(back, "1.wrong", last_seq) is None
+    assert room.resume(back, token, last_seq) == "X"
+    welcome, *missed = back.sent
+    # caught up with what it missed instead of a snapshot
+    assert "state" not in welcome and welcome["symbol"] == "X"
+    assert [m["type"] for m in missed] == ["opponent_reconnecting", "start_game"]
+    room.handle_message(o, {"type": "move", "position": [1, 1], "seq": room.seq})
+    assert not room.board.is_free(1, 1)
+    # the timer for the old hold finds the player back
+    assert not room.expire_seat(hold)
+    assert room.players["X"] is back
+
+
+def test_a_resume_too_far_behind_gets_a_snapshot():
+    room, x, o = seated_room()
+    token = x.sent[0]["resume_token"]
+    for _ in range(RESUME_HISTORY):
+        room.publish({"type": "chat", "text": "hi"})
+    room.suspend_player(x)
+    back = RecordingConnection()
+    assert room.resume(back, token, 0) == "X"
+    welcome, start = back.sent
+    assert welcome["state"]["seq"] == start["seq"] - 1 and start["type"] == "start_game"
+    assert room.messages_since(room.seq + 1) is None
+
+
+def test_an_expired_seat_is_freed():
+    room, x, o = seated_room()
+    token = x.sent[0]["resume_token"]
+    room.handle_message(x, {"type": "move", "position": [0, 0], "seq": room.seq})
+    hold = room.suspend_player(x)
+    assert room.expire_seat(hold)
+    assert o.sent[-1]["type"] == "opponent_disconnected"
+    assert room.has_free_seat() and room.board.is_free(0, 0)
+    assert room.resume(RecordingConnection(), token, room.seq) is None
+    # a new player gets the seat and a new token
+    newcomer = RecordingConnection()
+    assert room.add_player(newcomer) == "X"
+    assert newcomer.sent[0]["resume_token"] != token
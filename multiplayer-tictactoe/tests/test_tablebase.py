@@ -0,0 +1,58 @@
+import pytest
+
+import tablebase_file
+from game_state import GameState
+from tablebase import UNREACHABLE, Tablebase
+from tablebase_file import MappedTablebase, open_3x3, tablebase_entries, write_tablebase_file
+
+
+def test_solved_and_mapped_tables_agree(tmp_path):
+    table = Tablebase.build()
+    path = str(tmp_path / "tablebase.ttb")
+    write_tablebase_file(path, 3, 3, tablebase_entries(table))
+    mapped = MappedTablebase.open(path)
+    try:
+        assert table.reachable() == 5478 and mapped.reachable() == 765
+        for index, stored in enumerate(table.values):
+            if stored == UNREACHABLE:
+                continue
+            x_mask = o_mask = 0
+            for cell in range(9):
+                index, digit = divmod(index, 3)
+                x_mask |= (digit == 1) << cell
+                o_mask |= (digit == 2) << cell
+            state = GameState(x_mask, o_mask)
+            assert table.value(state) == mapped.value(state)
+            assert sorted(table.best_moves(state)) == sorted(mapped.best_moves(state))
+            # including positions already won, whose moves lead nowhere
+            assert table.move_values(state) == mapped.move_values(state)
+    finally:
+        mapped.close()
+
+
+def test_bad_files_are_rebuilt(tmp_path):
+    path = tmp_path / "tablebase.ttb"
+    path.write_bytes(b"TTTB" + bytes(20))
+    table = open_3x3(str(path))
+    try:
+        assert table.reachable() == 765
+        # the empty board is a draw
+        assert table.value(GameState()) == 0
+    finally:
+        table.close()
+
+
+def test_rejected_files_are_unmapped(tmp_path, monkeypatch):
+    path = tmp_path / "tablebase.ttb"
+    path.write_bytes(b"TTTB" + bytes(20))
+    mappings = []
+    real_mmap = tablebase_file.mmap.mmap
+
+    def recording_mmap(*args, **kwargs):
+        mappings.append(real_mmap(*args, **kwargs))
+        return mappings[-1]
+
+    monkeypatch.setattr(tablebase_file.mmap, "mmap", recording_mmap)
+    with pytest.raises(ValueError):
+        MappedTablebase.open(str(path))
+    assert mappings and all(mapping.closed for mapping in mappings)
@@ -0,0 +1,60 @@
+import random
+
+from game_state import WINNING_LINE
+from ultimate import CELLS, POSITIONS, UltimateState, playout
+
+
+def play(state, *moves):
+    for board, cell in moves:
+        assert state.play(board * CELLS + cell, state.to_move())
+
+
+def test_a_small_board_win_claims_its_square():
+    state = UltimateState()
+    # X takes the top row of board 4 while O is sent back there each time
+    play(state, (4, 0), (0, 4), (4, 1), (1, 4), (4, 2))
+    assert state.won_boards[0] == 1 << 4
+    # the board is closed, so a move sent there frees the next player
+    assert state.closed >> 4 & 1
+    assert state.winner() is None
+
+
+def test_next_board_is_forced_by_the_last_cell():
+    state = UltimateState()
+    play(state, (4, 2))
+    assert {move // CELLS for move in state.legal_moves()} == {2}
+    assert not state.is_legal(5 * CELLS)
+
+
+def test_three_claimed_squares_in_a_row_win():
+    state = UltimateState()
+    for board in (0, 1, 2):
+        for cell in (0, 1, 2):
+            state.mark(board * CELLS + cell, 0)
+    assert state.has_won("X") and state.won_boards[0] == 0b111
+
+
+def test_random_games_agree_with_the_won_boards():
+    rng = random.Random(7)
+    for _ in range(200):
+        state = UltimateState()
+        while state.winner() is None and not state.is_full():
+            move = rng.choice(state.legal_moves())
+            x, y = POSITIONS[move]
+            assert state.place(x, y, state.to_move())
+        for p, player in enumerate(("X", "O")):
+            for board in range(CELLS):
+                won = bool(WINNING_LINE[state.boards[p][board]])
+                if won:
+                    # a board is claimed by whoever completed a line on it first
+                    assert state.won_boards[p] >> board & 1 or state.won_boards[p ^ 1] >> board & 1
+            assert state.has_won(player) == (state.winner() == player)
+        if state.winner() is not None:
+            p = ("X", "O").index(state.winner())
+            assert WINNING_LINE[state.won_boards[p]]
+
+
+def test_playout_finishes_the_game():
+    rng = random.Random(1)
+    for _ in range(50):
+        assert playout(UltimateState(), rng) in ("X", "O", None)
@@ -0,0 +1,202 @@
+"""Ultimate tic-tac-toe: a 3x3 grid of 3x3 boards.
+
+Winning a small board claims its square on the big board, and three
+claimed squares in a row win the game. The cell you play in decides which
+small board your opponent must play in next; if that board is already won
+or full they may play in any open one.
+
+Each player's marks are kept as 9 small-board masks, with the same 9-bit
+layout as GameState, so a small board is won when game_state's 512-entry
+WINNING_LINE table says so. The boards each player has won form a 9-bit
+mask of their own, checked against the same table. Legal moves come from
+MOVES_OF[board][free mask], a precomputed tuple of move numbers. When the
+next board is forced, generating its moves is a single lookup.
+
+A move number is ``board * 9 + cell``, with board and cell both counted
+like GameState bits (``y * 3 + x``). On the 9x9 grid that the room and the
+clients use, board b's cell c is at x = (b % 3) * 3 + c % 3 and
+y = (b // 3) * 3 + c // 3.
+"""
+from game_state import CELLS, WINNING_LINE
+
+ULTIMATE_MODE = "ultimate"
+SIZE = 9
+MOVES = CELLS * CELLS
+FULL = (1 << CELLS) - 1
+PLAYERS = ("X", "O")
+
+IS_WIN = bytes(WINNING_LINE[mask] != 0 for mask in range(1 << CELLS))
+CELLS_OF = tuple(tuple(cell for cell in range(CELLS) if mask >> cell & 1) for mask in range(1 << CELLS))
+# MOVES_OF[board][free] is every move in board, given the mask of its free cells
+MOVES_OF = tuple(tuple(tuple(board * CELLS + cell for cell in cells) for cells in CELLS_OF)
+                 for board in range(CELLS))
+# grid position of each move number, and back
+POSITIONS = tuple(((move // CELLS) % 3 * 3 + move % CELLS % 3, (move // CELLS) // 3 * 3 + move % CELLS // 3)
+                  for move in range(MOVES))
+MOVE_AT = {position: move for move, position in enumerate(POSITIONS)}
+
+
+class UltimateState:
+    """Both players' marks, won boards and the board the next move must go in"""
+    __slots__ = ("boards", "won_boards", "closed", "next_board", "moves", "won", "last_move")
+
+    def __init__(self):
+        self.clear()
+
+    @classmethod
+    def from_rows(cls, rows, last_move=None, empty=''):
+        """Rebuild a state from a snapshot's 9x9 board and the move played last"""
+        state = cls()
+        for y, row in enumerate(rows):
+            for x, cell in enumerate(row):
+                if cell != empty:
+                    state.mark(MOVE_AT[x, y], PLAYERS.index(cell))
+        if last_move is not None:
+            state.last_move = tuple(last_move)
+            cell = MOVE_AT[state.last_move] % CELLS
+            state.next_board = None if state.closed >> cell & 1 else cell
+        return state
+
+    def clear(self):
+        # boards[player][board] is the 9-bit mask of player's marks on that board
+        self.boards = ([0] * CELLS, [0] * CELLS)
+        # boards each player has won, and boards nobody can play in any more
+        self.won_boards = [0, 0]
+        self.closed = 0
+        # board the side to move must play in, or None for any open board
+        self.next_board = None
+        self.moves = 0
+        self.won = None
+        self.last_move = None
+
+    def copy(self):
+        state = UltimateState.__new__(UltimateState)
+        state.boards = (list(self.boards[0]), list(self.boards[1]))
+        state.won_boards = list(self.won_boards)
+        state.closed, state.next_board, state.moves = self.closed, self.next_board, self.moves
+        state.won, state.last_move = self.won, self.last_move
+        return state
+
+    def legal_moves(self):
+        """Move numbers the side to move may play"""
+        x_boards, o_boards = self.boards
+        board = self.next_board
+        if board is not None:
+            return MOVES_OF[board][FULL ^ (x_boards[board] | o_boards[board])]
+        moves = ()
+        for board in CELLS_OF[FULL ^ self.closed]:
+            moves += MOVES_OF[board][FULL ^ (x_boards[board] | o_boards[board])]
+        return moves
+
+    def is_legal(self, move):
+        board, cell = divmod(move, CELLS)
+        if self.won is not None or self.closed >> board & 1:
+            return False
+        if self.next_board is not None and board != self.next_board:
+            return False
+        return not (self.boards[0][board] | self.boards[1][board]) >> cell & 1
+
+    def mark(self, move, p):
+        """Put player p's mark on move and settle its board; no legality check"""
+        board, cell = divmod(move, CELLS)
+        mine = self.boards[p]
+        sub = mine[board] = mine[board] | 1 << cell
+        if IS_WIN[sub]:
+            won = self.won_boards[p] = self.won_boards[p] | 1 << board
+            self.closed |= 1 << board
+            if IS_WIN[won] and self.won is None:
+                self.won = PLAYERS[p]
+        elif sub | self.boards[p ^ 1][board] == FULL:
+            self.closed |= 1 << board
+        self.moves += 1
+        return cell
+
+    def play(self, move, player):
+        """Make a legal move for player; False if it is not legal"""
+        if not self.is_legal(move):
+            return False
+        cell = self.mark(move, 0 if player == "X" else 1)
+        self.next_board = None if self.closed >> cell & 1 else cell
+        self.last_move = POSITIONS[move]
+        return True
+
+    # the GameState interface the room uses, on 9x9 grid positions
+
+    def get(self, x, y, empty=''):
+        """Symbol at (x, y), or empty"""
+        board, cell = divmod(MOVE_AT[x, y], CELLS)
+        if self.boards[0][board] >> cell & 1:
+            return "X"
+        if self.boards[1][board] >> cell & 1:
+            return "O"
+        return empty
+
+    def is_free(self, x, y):
+        """Whether (x, y) is a legal move right now"""
+        move = MOVE_AT.get((x, y))
+        return move is not None and self.is_legal(move)
+
+    def place(self, x, y, player):
+        move = MOVE_AT.get((x, y))
+        return move is not None and self.play(move, player)
+
+    def has_won(self, player):
+        return self.won == player
+
+    def winner(self):
+        """'X', 'O' or None"""
+        return self.won
+
+    def is_full(self):
+        """No board left to play in"""
+        return self.closed == FULL
+
+    def move_count(self):
+        return self.moves
+
+    def to_move(self):
+        """Whose turn it is, assuming X always opens"""
+        return "X" if self.moves % 2 == 0 else "O"
+
+    def to_rows(self, empty=''):
+        """Nested 9x9 list, as sent in snapshots"""
+        return [[self.get(x, y, empty) for x in range(SIZE)] for y in range(SIZE)]
+
+    def __repr__(self):
+        return f"UltimateState(moves={self.moves}, next_board={self.next_board}, won={self.won!r})"
+
+
+def playout(state, rng):
+    """Random legal moves from state to the end of the game: 'X', 'O' or None for a draw.
+
+    The same rules as UltimateState.play, inlined on local copies of the
+    masks, since this is the inner loop of any search on this game.
+    """
+    if state.won is not None:
+        return state.won
+    boards = (list(state.boards[0]), list(state.boards[1]))
+    won_boards = list(state.won_boards)
+    closed = state.closed
+    board = state.next_board
+    p = state.moves & 1
+    random = rng.random
+    while closed != FULL:
+        mine, theirs = boards[p], boards[p ^ 1]
+        if board is None:
+            moves = ()
+            for open_board in CELLS_OF[FULL ^ closed]:
+                moves += MOVES_OF[open_board][FULL ^ (mine[open_board] | theirs[open_board])]
+        else:
+            moves = MOVES_OF[board][FULL ^ (mine[board] | theirs[board])]
+        board, cell = divmod(moves[int(random() * len(moves))], CELLS)
+        sub = mine[board] = mine[board] | 1 << cell
+        if IS_WIN[sub]:
+            won = won_boards[p] = won_boards[p] | 1 << board
+            if IS_WIN[won]:
+                return PLAYERS[p]
+            closed |= 1 << board
+        elif sub | theirs[board] == FULL:
+            closed |= 1 << board
+        board = None if closed >> cell & 1 else cell
+        p ^= 1
+    return None